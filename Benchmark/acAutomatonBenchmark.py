@@ -0,0 +1,73 @@
+"""敏感词AC自动机对比：ACAutomaton与ArrayACAutomaton的构建耗时、内存占用与匹配吞吐
+用法: python -m Benchmark.acAutomatonBenchmark [--words 30000] [--queries 20000] [--query-length 50] [--seed 0] [--repeat 3]
+词表为sensitiveWords表中的词加上随机生成的中文词，查询为随机中文文本，并混入部分词表中的词。"""
+import argparse
+import random
+import time
+import tracemalloc
+from typing import List, Dict, Any
+from Common.DBCommon.sqlLiteCom import initSqlite
+from Common.sensitiveWordStore import loadSensitiveWords
+from Common.utils import ACAutomaton, ArrayACAutomaton, printTable
+
+#常用汉字区间，随机词与查询都从中取字
+CJK_START = 0x4e00
+CJK_SIZE = 3000
+
+
+def randomText(rng:random.Random,length:int) -> str:
+    return "".join(chr(CJK_START + rng.randrange(CJK_SIZE)) for _ in range(length))
+
+def benchmarkEngine(engineClass,words:List[str],queries:List[str],longText:str,repeat:int = 3) -> Dict[str, Any]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    automaton = engineClass()
+    for word in words:
+        automaton.add_sensitive_word(word)
+    automaton.build_fail_pointer()
+    buildCost = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    #匹配耗时取repeat次中最快的一次，减少机器抖动的影响
+    queryCost = longCost = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        queryMatches = [sorted(automaton.match(query)) for query in queries]
+        queryCost = min(queryCost, time.perf_counter() - start)
+        start = time.perf_counter()
+        longMatches = sorted(automaton.match(longText))
+        longCost = min(longCost, time.perf_counter() - start)
+    return {"engine": engineClass.__name__, "build(s)": buildCost, "memory(MB)": memory / 1024 / 1024,
+            "queries/s": len(queries) / queryCost, "longText(Mchar/s)": len(longText) / longCost / 1e6,
+            "matches": (queryMatches, longMatches)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ACAutomaton and ArrayACAutomaton")
+    parser.add_argument("--words", type=int, default=30000, help="random words added to the sensitive word table")
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--query-length", type=int, default=50)
+    parser.add_argument("--long-text", type=int, default=1000000, help="length of the long text")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="match timings take the fastest of this many runs")
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    initSqlite()
+    words = [word for word in loadSensitiveWords() if word]
+    words += [randomText(rng, rng.randint(2, 6)) for _ in range(args.words)]
+    #约十分之一的查询包含词表中的词
+    queries = []
+    for _ in range(args.queries):
+        query = randomText(rng, args.query_length)
+        if rng.random() < 0.1:
+            position = rng.randrange(len(query))
+            query = query[:position] + rng.choice(words) + query[position:]
+        queries.append(query)
+    longText = randomText(rng, args.long_text)
+    print(f"Words:{len(words)},Queries:{len(queries)},QueryLength:{args.query_length},LongText:{len(longText)}")
+    results = [benchmarkEngine(engineClass, words, queries, longText, args.repeat) for engineClass in (ACAutomaton, ArrayACAutomaton)]
+    matches = [result.pop("matches") for result in results]
+    printTable(results, ".2f")
+    print(f"Same matches: {matches[0] == matches[1]}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""向量化后端吞吐对比：用意图数据集的文本，分别统计各后端在不同批大小下的每秒文本数与单批延迟
+用法: python -m Benchmark.embeddingBenchmark [--backends sentence_transformers,onnx] [--batch-sizes 1,8,32]
+      [--threads 1,4] [--texts 2000]
+--threads只作用于onnx后端，对应embedding.onnx.intra_op_threads。"""
+import argparse
+import time
+from typing import Dict, Any, List, Optional
+import numpy as np
+from Common.utils import getAbsolutePath, loadYmlFile, printTable
+from Rag.embeddingEngine import loadEmbeddingModel
+from Rag.onnxEmbedding import loadDatasetTexts
+
+
+def benchmarkModel(model,texts:List[str],batchSize:int) -> Dict[str, Any]:
+    #预热一批，排除首次推理的初始化耗时
+    model.encode(texts[:batchSize], batch_size=batchSize)
+    latencies = []
+    start = time.perf_counter()
+    for offset in range(0, len(texts), batchSize):
+        batchStart = time.perf_counter()
+        model.encode(texts[offset:offset + batchSize], batch_size=batchSize)
+        latencies.append((time.perf_counter() - batchStart) * 1000)
+    cost = time.perf_counter() - start
+    return {"batchSize": batchSize, "texts/s": len(texts) / cost,
+            "p50(ms)": float(np.percentile(latencies, 50)), "p99(ms)": float(np.percentile(latencies, 99))}
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding backend throughput")
+    parser.add_argument("--backends", default="sentence_transformers,onnx")
+    parser.add_argument("--batch-sizes", default="1,8,32")
+    parser.add_argument("--threads", default="", help="comma separated intra-op thread counts for the onnx backend")
+    parser.add_argument("--texts", type=int, default=2000, help="number of texts, the intent dataset is repeated if shorter")
+    args = parser.parse_args()
+    config = loadYmlFile(getAbsolutePath("../Config/config.yml")).get("embedding", {})
+    modelPath = getAbsolutePath(config.get("model_path", "../Rag/EmbeddingModel/"))
+    texts = loadDatasetTexts()
+    texts = (texts * (args.texts // len(texts) + 1))[:args.texts]
+    print(f"Texts:{len(texts)},AvgLength:{np.mean([len(text) for text in texts]):.1f}")
+    results = []
+    for backend in args.backends.split(","):
+        threadCounts: List[Optional[int]] = [int(threads) for threads in args.threads.split(",") if threads] or [None]
+        for threads in (threadCounts if backend == "onnx" else [None]):
+            onnxConfig = dict(config.get("onnx") or {})
+            if threads is not None:
+                onnxConfig["intra_op_threads"] = threads
+            model = loadEmbeddingModel(modelPath, backend, config.get("device"), onnxConfig)
+            for batchSize in [int(size) for size in args.batch_sizes.split(",")]:
+                result = {"backend": backend if threads is None else f"{backend}(threads={threads})"}
+                result.update(benchmarkModel(model, texts, batchSize))
+                results.append(result)
+                print(result)
+    printTable(results, ".2f")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""工作流图的单次请求开销对比：每次请求重新编译LangGraph图与复用进程级别编译好的图
+用法: python -m Benchmark.graphCompileBenchmark [--iterations 200] [--threads 8]
+只统计获取图对象的耗时，不调用大模型；--threads模拟并发请求同时获取图。"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List
+import numpy as np
+from Common.utils import printTable
+import WorkFlow.inputDetection as inputDetection
+import WorkFlow.intenRecognition as intenRecognition
+import WorkFlow.decisionAgent as decisionAgent
+
+WORKFLOWS = {"inputDetection": inputDetection, "intenRecognition": intenRecognition, "decisionAgent": decisionAgent}
+
+
+def timeCalls(getAgent:Callable,iterations:int,threads:int) -> List[float]:
+    def timeOnce(_) -> float:
+        start = time.perf_counter()
+        getAgent()
+        return (time.perf_counter() - start) * 1000
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(timeOnce, range(iterations)))
+
+def benchmarkWorkflow(name:str,module,iterations:int,threads:int) -> List[Dict[str, Any]]:
+    results = []
+    for mode, getAgent in (("compile", getattr(module, "__buildConditionalAgent")),
+                           ("cached", getattr(module, "__getConditionalAgent"))):
+        #预热一次，缓存模式的第一次调用包含编译
+        getAgent()
+        latencies = timeCalls(getAgent, iterations, threads)
+        results.append({"workflow": name, "mode": mode, "mean(ms)": float(np.mean(latencies)),
+                        "p99(ms)": float(np.percentile(latencies, 99))})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-request graph compilation with the shared compiled graph")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+    print(f"Iterations:{args.iterations},Threads:{args.threads}")
+    results = []
+    for name, module in WORKFLOWS.items():
+        results.extend(benchmarkWorkflow(name, module, args.iterations, args.threads))
+    printTable(results, ".4f")
+
+if __name__ == '__main__':
+    main()
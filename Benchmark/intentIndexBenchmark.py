@@ -0,0 +1,139 @@
+"""意图索引类型对比：以flat精确检索为基准，统计近似索引的recall@count、投票意图一致率、单条检索延迟与内存占用
+用法: python -m Benchmark.intentIndexBenchmark --user customer [--synthetic 1000000] [--queries 1000]
+      [--indexes "flat;hnsw:ef_search=128;ivfpq:nprobe=32,rerank=4"] [--threads 1]
+向量来自当前生效的索引版本(没有时使用意图数据集)，--synthetic按原始样本加噪声扩充到指定条数，用于评估百万级语料。"""
+import argparse
+import json
+import os
+import time
+from typing import Dict, Any, List, Tuple
+import faiss
+import numpy as np
+from Common.utils import getAbsolutePath, loadYmlFile, normalizeVectors, printTable
+from Model.Enums.intentEnum import userType
+from Rag.intentIndexStore import INTENT_DATASET, VECTOR_FILE, LABEL_FILE, IntentIndex, getIntentIds, \
+    readCurrentVersion, createFaissIndex, applySearchParams, getIndexBuildConfig
+
+#与意图识别工作流一致：检索15条，最高意图占比超过0.6视为意图清晰
+RETRIEVE_SUM = 15
+PROPOTION_THRESHOLD = 0.6
+DEFAULT_INDEXES = "flat;hnsw;hnsw:ef_search=128;ivfpq:nprobe=16;ivfpq:nprobe=16,rerank=4"
+
+
+#读取当前版本的向量与标签，没有版本时从数据集读取
+def loadCorpus(user:userType,indexRoot:str) -> Tuple[np.ndarray, np.ndarray]:
+    version = readCurrentVersion(indexRoot, user)
+    if version is not None:
+        versionDir = os.path.join(indexRoot, user.name, version)
+        return np.load(os.path.join(versionDir, VECTOR_FILE)), np.load(os.path.join(versionDir, LABEL_FILE)).astype(np.int64)
+    intentIds = getIntentIds(user)
+    embeddings = []
+    labels = []
+    with open(getAbsolutePath(INTENT_DATASET[user]), 'r', encoding='utf-8') as f:
+        for line in f:
+            jsonData = json.loads(line)
+            if jsonData["intent"] in intentIds:
+                embeddings.append(jsonData["embedding"])
+                labels.append(intentIds[jsonData["intent"]])
+    return normalizeVectors(np.asarray(embeddings, dtype=np.float32)), np.asarray(labels, dtype=np.int64)
+
+#以原始样本为中心加高斯噪声扩充语料，标签沿用原样本
+def expandCorpus(vectors:np.ndarray,labels:np.ndarray,total:int,noise:float,seed:int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    expandedVectors = np.empty((total, vectors.shape[1]), dtype=np.float32)
+    expandedLabels = np.empty(total, dtype=np.int64)
+    for start in range(0, total, 100000):
+        end = min(start + 100000, total)
+        rows = rng.integers(0, len(labels), end - start)
+        chunk = vectors[rows] + rng.normal(0, noise / np.sqrt(vectors.shape[1]), (end - start, vectors.shape[1])).astype(np.float32)
+        expandedVectors[start:end] = normalizeVectors(chunk)
+        expandedLabels[start:end] = labels[rows]
+    return expandedVectors, expandedLabels
+
+#解析"hnsw:m=32,ef_search=128"形式的索引配置
+def parseIndexConfig(text:str) -> Dict[str, Any]:
+    indexType, _, params = text.strip().partition(":")
+    indexConfig: Dict[str, Any] = {"type": indexType}
+    for param in filter(None, params.split(",")):
+        key, value = param.split("=")
+        indexConfig[key.strip()] = int(value)
+    return indexConfig
+
+def percentile(values:List[float],percent:float) -> float:
+    return float(np.percentile(np.asarray(values), percent))
+
+def benchmarkIndex(user:userType,indexConfig:Dict[str, Any],vectors:np.ndarray,labels:np.ndarray,
+                   queries:np.ndarray,truthIds:np.ndarray,count:int) -> Dict[str, Any]:
+    buildStart = time.monotonic()
+    index, builtConfig = createFaissIndex(vectors, indexConfig)
+    buildCost = time.monotonic() - buildStart
+    applySearchParams(index, indexConfig)
+    rerank = 1 if isinstance(index, faiss.IndexFlat) else indexConfig.get("rerank", 1)
+    intentIndex = IntentIndex(user, index, vectors, labels, rerank=rerank)
+    #与线上一致，逐条检索统计延迟
+    latencies = []
+    resultIds = np.empty((len(queries), count), dtype=np.int64)
+    for row in range(len(queries)):
+        start = time.perf_counter()
+        _, indices = intentIndex.searchIds(queries[row:row + 1], count)
+        latencies.append((time.perf_counter() - start) * 1000)
+        resultIds[row] = indices[0]
+    recall = np.mean([len(np.intersect1d(resultIds[row][resultIds[row] >= 0], truthIds[row])) / count
+                      for row in range(len(queries))])
+    resultLabels = np.where(resultIds >= 0, labels[np.maximum(resultIds, 0)], -1)
+    truthLabels = labels[truthIds]
+    #与线上相同的投票方式，不加权
+    resultVotes = intentIndex.voteProportions(None, resultLabels)
+    truthVotes = intentIndex.voteProportions(None, truthLabels)
+    resultIntents, resultPropotions = resultVotes.argmax(axis=1), resultVotes.max(axis=1)
+    truthIntents, truthPropotions = truthVotes.argmax(axis=1), truthVotes.max(axis=1)
+    #重排需要读取候选样本的原始向量，内存占用计入向量矩阵
+    memory = faiss.serialize_index(index).nbytes + (vectors.nbytes if rerank > 1 else 0)
+    return {"index": ",".join(f"{key}={value}" for key, value in indexConfig.items()),
+            "built": builtConfig["type"],
+            "build(s)": buildCost,
+            f"recall@{count}": recall,
+            "intentAgree": float(np.mean(resultIntents == truthIntents)),
+            "clearAgree": float(np.mean((resultPropotions > PROPOTION_THRESHOLD) == (truthPropotions > PROPOTION_THRESHOLD))),
+            "p50(ms)": percentile(latencies, 50),
+            "p99(ms)": percentile(latencies, 99),
+            "memory(MB)": memory / 1024 / 1024}
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare flat, HNSW and IVF-PQ intent indexes against exact search")
+    parser.add_argument("--user", required=True, choices=[user.name for user in userType])
+    parser.add_argument("--synthetic", type=int, default=0, help="expand the corpus to this many vectors")
+    parser.add_argument("--noise", type=float, default=0.5, help="noise norm of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=1000, help="held-out vectors used as queries")
+    parser.add_argument("--count", type=int, default=RETRIEVE_SUM)
+    parser.add_argument("--indexes", default=DEFAULT_INDEXES, help="';' separated index configs")
+    parser.add_argument("--threads", type=int, default=1, help="faiss threads, the service searches one query per request")
+    args = parser.parse_args()
+    faiss.omp_set_num_threads(args.threads)
+    ragConfig = loadYmlFile(getAbsolutePath("../Config/config.yml")).get("rag", {})
+    user = userType[args.user]
+    vectors, labels = loadCorpus(user, getAbsolutePath(ragConfig.get("index_dir", "../Rag/IntentIndex/")))
+    if args.synthetic > len(labels):
+        vectors, labels = expandCorpus(vectors, labels, args.synthetic, args.noise)
+    #留出的查询不放入索引，避免查到自身
+    rng = np.random.default_rng(1)
+    queryRows = rng.choice(len(labels), min(args.queries, len(labels) // 10 or 1), replace=False)
+    corpusMask = np.ones(len(labels), dtype=bool)
+    corpusMask[queryRows] = False
+    queries = np.ascontiguousarray(vectors[queryRows])
+    vectors = np.ascontiguousarray(vectors[corpusMask])
+    labels = labels[corpusMask]
+    print(f"UserType:{user.name},Corpus:{len(labels)},Dimension:{vectors.shape[1]},Queries:{len(queries)},Threads:{args.threads}")
+    truthIndex = faiss.IndexFlatIP(vectors.shape[1])
+    truthIndex.add(vectors)
+    _, truthIds = truthIndex.search(queries, args.count)
+    results = []
+    for text in args.indexes.split(";"):
+        indexConfig = parseIndexConfig(text)
+        getIndexBuildConfig(indexConfig)
+        results.append(benchmarkIndex(user, indexConfig, vectors, labels, queries, truthIds, args.count))
+        print(results[-1])
+    printTable(results, ".3f")
+
+if __name__ == '__main__':
+    main()
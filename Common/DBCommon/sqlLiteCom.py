@@ -2,7 +2,7 @@ import importlib
 import os
 import sys
 from typing import Dict, Tuple
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import declarative_base, sessionmaker
 from Common.utils import initLogger, getAbsolutePath, loadYmlFile
 
@@ -121,3 +121,12 @@ def getBase(db_alias: str):
         else:
             initSqlite()
     return BASE_MAP[db_alias]
+
+#表的变化指纹：行数、最大rowid与数据库文件的修改时间(纳秒)，增删行与原地更新都会改变指纹，查询只走主键索引
+def getTableSignature(dbAlias: str, tableName: str) -> Tuple[int, int, int]:
+    sqliteSession = next(getDbSession(dbAlias))
+    try:
+        rowCount, maxRowid = sqliteSession.execute(text(f'SELECT COUNT(*), MAX(rowid) FROM "{tableName}"')).one()
+    finally:
+        sqliteSession.close()
+    return rowCount, maxRowid or 0, os.stat(DB_CONFIG[dbAlias]).st_mtime_ns
@@ -0,0 +1,164 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Iterable
+from Common.LLMCommon.rateLimiter import getRateLimiter, LLMRateLimiter
+from Common.statsReporter import registerStats
+from Common.utils import getAbsolutePath, loadYmlFile, initLogger
+
+#每个接口保留的最近延迟样本数
+LATENCY_WINDOW = 200
+#延迟的指数滑动平均系数
+EWMA_ALPHA = 0.2
+#还没有延迟样本时按1秒计算路由权重
+DEFAULT_LATENCY = 1.0
+
+
+class LLMEndpoint:
+    """一个OpenAI兼容接口，以及它在内存中的健康与延迟统计，统计由EndpointRouter加锁更新"""
+    def __init__(self,name:str,baseURL:str,modelName:str,apiKey:Optional[str],weight:float,rateLimiter:LLMRateLimiter):
+        self.name = name
+        self.baseURL = baseURL
+        self.modelName = modelName
+        self.apiKey = apiKey
+        self.weight = weight
+        self.rateLimiter = rateLimiter
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.ewmaLatency: Optional[float] = None
+        self.consecutiveFailures = 0
+        self.openUntil = 0.0 #熔断到期时间，之前不参与路由
+        self.counters = {"success": 0, "failure": 0, "cancelled": 0}
+
+
+class EndpointRouter:
+    """多接口路由：按权重/延迟加权随机选择健康的接口，连续失败的接口冷却一段时间后再参与路由；
+    对冲请求的等待时间取主接口近期延迟的分位数"""
+    def __init__(self,endpoints:List[LLMEndpoint],routingConfig:Dict[str, Any],hedgeConfig:Dict[str, Any]):
+        self.logger = initLogger(__name__)
+        self.endpoints = endpoints
+        self.__failureThreshold = routingConfig.get("failure_threshold", 3)
+        self.__cooldown = routingConfig.get("cooldown", 30)
+        self.__hedgeEnable = hedgeConfig.get("enable", False) and len(endpoints) > 1
+        self.__hedgePercentile = hedgeConfig.get("percentile", 95)
+        self.__hedgeMinSamples = hedgeConfig.get("min_samples", 20)
+        self.__hedgeDefaultDelay = hedgeConfig.get("default_delay", 10)
+        self.__hedgeMinDelay = hedgeConfig.get("min_delay", 1)
+        self.__hedgeMaxDelay = hedgeConfig.get("max_delay", 30)
+        self.__lock = threading.Lock()
+        self.__counters = {"hedged": 0, "hedgeWin": 0}
+
+    @classmethod
+    def fromConfig(cls,config:Dict[str, Any]):
+        llmConfig = config["llm"]
+        #没有配置endpoints时退化为单个接口，名称用模型名以便沿用按模型名配置的限流
+        endpointConfigs = llmConfig.get("endpoints") or [{"name": llmConfig["model_name"],
+                                                           "base_url": llmConfig["base_url"],
+                                                           "model_name": llmConfig["model_name"]}]
+        rateLimitConfig = config.get("llm_rate_limit", {})
+        endpoints = []
+        for endpointConfig in endpointConfigs:
+            modelName = endpointConfig.get("model_name", llmConfig["model_name"])
+            name = endpointConfig.get("name", endpointConfig["base_url"])
+            endpoints.append(LLMEndpoint(name=name,
+                                         baseURL=endpointConfig["base_url"],
+                                         modelName=modelName,
+                                         apiKey=os.getenv(endpointConfig.get("api_key_env", "API_KEY_EXTERNAL")),
+                                         weight=endpointConfig.get("weight", 1),
+                                         rateLimiter=getRateLimiter(name, rateLimitConfig, modelName)))
+        return cls(endpoints, llmConfig.get("routing", {}), llmConfig.get("hedge", {}))
+
+    def pick(self,exclude:Iterable[LLMEndpoint] = ()) -> LLMEndpoint:
+        """选择一个接口，优先不在exclude中的；weight为0的接口只在没有其他健康接口时使用"""
+        now = time.monotonic()
+        exclude = set(exclude)
+        with self.__lock:
+            candidates = [endpoint for endpoint in self.endpoints if endpoint not in exclude] or self.endpoints
+            healthy = [endpoint for endpoint in candidates if endpoint.openUntil <= now]
+            if not healthy:
+                #全部在冷却中时选最早恢复的一个
+                return min(candidates, key=lambda endpoint: endpoint.openUntil)
+            scores = [endpoint.weight / (endpoint.ewmaLatency or DEFAULT_LATENCY) for endpoint in healthy]
+            if sum(scores) <= 0:
+                return healthy[0]
+            return random.choices(healthy, weights=scores)[0]
+
+    def hedgeDelay(self,endpoint:LLMEndpoint) -> Optional[float]:
+        """主接口超过该时间未返回就向另一个接口发对冲请求，不对冲时返回None"""
+        if not self.__hedgeEnable:
+            return None
+        with self.__lock:
+            latencies = sorted(endpoint.latencies)
+        if len(latencies) < self.__hedgeMinSamples:
+            delay = self.__hedgeDefaultDelay
+        else:
+            delay = latencies[min(len(latencies) - 1, int(len(latencies) * self.__hedgePercentile / 100))]
+        return min(max(delay, self.__hedgeMinDelay), self.__hedgeMaxDelay)
+
+    def recordSuccess(self,endpoint:LLMEndpoint,latency:float):
+        with self.__lock:
+            self.__addLatency(endpoint, latency)
+            endpoint.consecutiveFailures = 0
+            endpoint.openUntil = 0.0
+            endpoint.counters["success"] += 1
+
+    def recordFailure(self,endpoint:LLMEndpoint):
+        with self.__lock:
+            endpoint.consecutiveFailures += 1
+            endpoint.counters["failure"] += 1
+            if endpoint.consecutiveFailures >= self.__failureThreshold:
+                endpoint.openUntil = time.monotonic() + self.__cooldown
+                opened = True
+            else:
+                opened = False
+        if opened:
+            self.logger.warning(f"LLM endpoint {endpoint.name} failed {endpoint.consecutiveFailures} times in a row, cool down {self.__cooldown}s")
+
+    def recordCancelled(self,endpoint:LLMEndpoint,elapsed:float):
+        #被取消的请求至少耗时elapsed，计入样本避免慢接口的延迟分位数被低估
+        with self.__lock:
+            self.__addLatency(endpoint, elapsed)
+            endpoint.counters["cancelled"] += 1
+
+    def recordHedge(self,hedgeWin:bool):
+        with self.__lock:
+            self.__counters["hedged"] += 1
+            if hedgeWin:
+                self.__counters["hedgeWin"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """对冲计数与各接口的请求数、延迟与健康状态"""
+        now = time.monotonic()
+        with self.__lock:
+            stats = dict(self.__counters)
+            for endpoint in self.endpoints:
+                latencies = sorted(endpoint.latencies)
+                endpointStats = dict(endpoint.counters)
+                endpointStats["healthy"] = endpoint.openUntil <= now
+                endpointStats["ewmaLatency"] = endpoint.ewmaLatency
+                if latencies:
+                    endpointStats["latencyP50"] = latencies[len(latencies) // 2]
+                    endpointStats["latencyP95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+                stats[endpoint.name] = endpointStats
+        return stats
+
+    def __addLatency(self,endpoint:LLMEndpoint,latency:float):
+        #调用方持有锁
+        endpoint.latencies.append(latency)
+        endpoint.ewmaLatency = latency if endpoint.ewmaLatency is None else \
+            EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * endpoint.ewmaLatency
+
+ENDPOINT_ROUTER: Optional[EndpointRouter] = None
+ENDPOINT_ROUTER_LOCK = threading.Lock()
+
+#获取进程级别的路由器，所有ModelFactory实例共享接口的健康与延迟统计
+def getEndpointRouter() -> EndpointRouter:
+    global ENDPOINT_ROUTER
+    if ENDPOINT_ROUTER is None:
+        with ENDPOINT_ROUTER_LOCK:
+            if ENDPOINT_ROUTER is None:
+                config = loadYmlFile(getAbsolutePath("../Config/config.yml"))
+                ENDPOINT_ROUTER = EndpointRouter.fromConfig(config)
+                registerStats("llmEndpointRouter", ENDPOINT_ROUTER.stats)
+    return ENDPOINT_ROUTER
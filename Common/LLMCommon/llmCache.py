@@ -0,0 +1,152 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Any
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.sqlite import insert
+from Common.DBCommon.sqlLiteCom import getDbSession
+from Common.statsReporter import registerStats
+from Common.utils import getAbsolutePath, loadYmlFile, initLogger
+from Model.Entity.llmCacheRecord import llmCacheRecord
+
+#每写入多少次检查一次SQLite的条数上限
+EVICT_CHECK_INTERVAL = 200
+
+
+class LLMResponseCache:
+    """LLM结果缓存，内存LRU在前，SQLite持久化在后"""
+    def __init__(self,cacheConfig:Dict[str, Any]):
+        self.logger = initLogger(__name__)
+        self.enable = cacheConfig.get("enable", False)
+        self.__memorySize = cacheConfig.get("memory_size", 2048)
+        self.__maxRows = cacheConfig.get("max_rows", 100000)
+        self.__ttlMap = cacheConfig.get("ttl", {})
+        self.__memory: OrderedDict[str, tuple] = OrderedDict() #key -> (过期时间,结果)
+        self.__lock = threading.Lock()
+        self.__writeCount = 0
+        self.__counters = {"memoryHit": 0, "diskHit": 0, "miss": 0, "write": 0, "evict": 0}
+        if self.enable:
+            self.__createTable()
+
+    @staticmethod
+    def buildKey(modelName:str,query:str,decodeParams:Dict[str, Any]) -> str:
+        """缓存key:模型名 + prompt + 解码参数"""
+        raw = json.dumps([modelName, query, decodeParams], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def getTtl(self,purpose:str) -> int:
+        return self.__ttlMap.get(purpose, self.__ttlMap.get("default", 0))
+
+    def get(self,key:str) -> Optional[Dict]:
+        """查询缓存，未命中或已过期返回None"""
+        now = time.time()
+        with self.__lock:
+            item = self.__memory.get(key)
+            if item is not None:
+                if item[0] > now:
+                    self.__memory.move_to_end(key)
+                    self.__counters["memoryHit"] += 1
+                    return json.loads(item[1])
+                del self.__memory[key]
+        record = self.__loadFromDisk(key, now)
+        with self.__lock:
+            if record is None:
+                self.__counters["miss"] += 1
+                return None
+            self.__counters["diskHit"] += 1
+            self.__putMemory(key, record.expireTime, record.response)
+        return json.loads(record.response)
+
+    def set(self,key:str,purpose:str,value:Dict):
+        """写入缓存，TTL为0的用途不缓存"""
+        ttl = self.getTtl(purpose)
+        if ttl <= 0:
+            return
+        now = time.time()
+        response = json.dumps(value, ensure_ascii=False)
+        with self.__lock:
+            self.__putMemory(key, now + ttl, response)
+            self.__counters["write"] += 1
+            self.__writeCount += 1
+            needEvict = self.__writeCount % EVICT_CHECK_INTERVAL == 0
+        try:
+            sqliteSession = next(getDbSession("llmCache_db"))
+            #并发写同一个key时以最后一次为准
+            upsert = insert(llmCacheRecord).values(cacheKey=key, purpose=purpose, response=response,
+                                                   createTime=now, expireTime=now + ttl)
+            upsert = upsert.on_conflict_do_update(index_elements=[llmCacheRecord.cacheKey],
+                                                  set_={"purpose": purpose, "response": response,
+                                                        "createTime": now, "expireTime": now + ttl})
+            sqliteSession.execute(upsert)
+            sqliteSession.commit()
+            if needEvict:
+                self.__evictDisk(sqliteSession, now)
+        except Exception as e:
+            self.logger.error(f"LLM cache save failed! \n {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """命中与淘汰计数"""
+        with self.__lock:
+            stats = dict(self.__counters)
+            stats["memorySize"] = len(self.__memory)
+        return stats
+
+    def __createTable(self):
+        #缓存表可能在initSqlite建表之后才被导入，这里单独建表
+        try:
+            sqliteSession = next(getDbSession("llmCache_db"))
+            llmCacheRecord.__table__.create(bind=sqliteSession.bind, checkfirst=True)
+        except Exception as e:
+            self.logger.error(f"LLM cache table create failed! \n {e}")
+
+    def __putMemory(self,key:str,expireTime:float,response:str):
+        #调用方持有锁
+        self.__memory[key] = (expireTime, response)
+        self.__memory.move_to_end(key)
+        while len(self.__memory) > self.__memorySize:
+            self.__memory.popitem(last=False)
+            self.__counters["evict"] += 1
+
+    def __loadFromDisk(self,key:str,now:float) -> Optional[llmCacheRecord]:
+        try:
+            sqliteSession = next(getDbSession("llmCache_db"))
+            record = sqliteSession.get(llmCacheRecord, key)
+            if record is None:
+                return None
+            if record.expireTime <= now:
+                sqliteSession.delete(record)
+                sqliteSession.commit()
+                return None
+            sqliteSession.expunge(record)
+            return record
+        except Exception as e:
+            self.logger.error(f"LLM cache load failed! \n {e}")
+            return None
+
+    def __evictDisk(self,sqliteSession,now:float):
+        #先删过期的，再按写入时间删除超出上限的部分
+        sqliteSession.execute(delete(llmCacheRecord).where(llmCacheRecord.expireTime <= now))
+        rowCount = sqliteSession.execute(select(func.count()).select_from(llmCacheRecord)).scalar()
+        overflow = rowCount - self.__maxRows
+        if overflow > 0:
+            oldestKeys = select(llmCacheRecord.cacheKey).order_by(llmCacheRecord.createTime).limit(overflow)
+            sqliteSession.execute(delete(llmCacheRecord).where(llmCacheRecord.cacheKey.in_(oldestKeys)))
+            with self.__lock:
+                self.__counters["evict"] += overflow
+        sqliteSession.commit()
+
+LLM_CACHE: Optional[LLMResponseCache] = None
+LLM_CACHE_LOCK = threading.Lock()
+
+#获取进程级别的缓存实例
+def getLLMCache() -> LLMResponseCache:
+    global LLM_CACHE
+    if LLM_CACHE is None:
+        with LLM_CACHE_LOCK:
+            if LLM_CACHE is None:
+                config = loadYmlFile(getAbsolutePath("../Config/config.yml"))
+                LLM_CACHE = LLMResponseCache(config.get("llm_cache", {}))
+                registerStats("llmCache", LLM_CACHE.stats)
+    return LLM_CACHE
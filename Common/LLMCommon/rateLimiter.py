@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Any, Optional
+from Common.LLMCommon.retryPolicy import LLMDeadlineExceeded
+from Common.statsReporter import registerStats
+from Common.utils import initLogger
+
+#排队时间统计窗口大小
+QUEUE_WINDOW = 1000
+
+
+class TokenBucket:
+    """令牌桶，按分钟速率匀速补充，容量为一分钟的额度。
+    采用预约方式：先扣减令牌(允许为负)，再按欠额计算需要等待的时间，并发请求因此按到达顺序平滑放行。"""
+    def __init__(self,perMinute:float):
+        self.__rate = perMinute / 60.0
+        self.__capacity = float(perMinute)
+        self.__tokens = float(perMinute)
+        self.__last = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def reserve(self,amount:float) -> float:
+        """预约amount个令牌，返回需要等待的秒数"""
+        amount = min(amount, self.__capacity)
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.__capacity, self.__tokens + (now - self.__last) * self.__rate)
+            self.__last = now
+            self.__tokens -= amount
+            return 0.0 if self.__tokens >= 0 else -self.__tokens / self.__rate
+
+    def refund(self,amount:float):
+        """放弃预约时归还令牌"""
+        with self.__lock:
+            self.__tokens = min(self.__capacity, self.__tokens + min(amount, self.__capacity))
+
+
+class LLMRateLimiter:
+    """单个接口的客户端限流：每分钟请求数、每分钟token数与最大并发数。
+    线程模式使用threading.Semaphore，aio模式使用asyncio.Semaphore，一个进程只会运行其中一种服务模式。"""
+    def __init__(self,name:str,rpm:int,tpm:int,maxConcurrency:int,outputTokens:int):
+        self.logger = initLogger(__name__)
+        self.name = name
+        self.__requestBucket = TokenBucket(rpm)
+        self.__tokenBucket = TokenBucket(tpm)
+        self.__outputTokens = outputTokens
+        self.__maxConcurrency = maxConcurrency
+        self.__semaphore = threading.Semaphore(maxConcurrency)
+        self.__asyncSemaphore: Optional[asyncio.Semaphore] = None
+        self.__statsLock = threading.Lock()
+        self.__queueTimes = deque(maxlen=QUEUE_WINDOW)
+        self.__counters = {"requests": 0, "queued": 0, "rejected": 0, "inFlight": 0}
+
+    def estimateTokens(self,query:str) -> int:
+        #中文约一个字一个token，加上预估的输出长度
+        return len(query) + self.__outputTokens
+
+    def __reserve(self,estTokens:int,deadline:Optional[float]):
+        #返回(需要等待的秒数,剩余可用时间)，等待会超过deadline时归还令牌并抛出
+        wait = max(self.__requestBucket.reserve(1), self.__tokenBucket.reserve(estTokens))
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and wait >= remaining:
+            self.__requestBucket.refund(1)
+            self.__tokenBucket.refund(estTokens)
+            self.__record(None)
+            raise LLMDeadlineExceeded(f"Rate limit wait {wait:.2f}s exceeds the deadline")
+        return wait, remaining
+
+    @contextmanager
+    def acquire(self,query:str,deadline:Optional[float] = None):
+        """同步获取调用许可，等待期间阻塞当前线程，deadline为time.monotonic时间"""
+        start = time.monotonic()
+        wait, remaining = self.__reserve(self.estimateTokens(query),deadline)
+        if wait > 0:
+            time.sleep(wait)
+        timeout = None if remaining is None else max(remaining - wait, 0)
+        if not self.__semaphore.acquire(timeout=timeout):
+            self.__record(None)
+            raise LLMDeadlineExceeded("Waiting for LLM concurrency slot exceeded the deadline")
+        self.__record(time.monotonic() - start)
+        try:
+            yield
+        finally:
+            self.__semaphore.release()
+            self.__leave()
+
+    @asynccontextmanager
+    async def aacquire(self,query:str,deadline:Optional[float] = None):
+        """异步获取调用许可，等待期间不占用事件循环"""
+        start = time.monotonic()
+        wait, remaining = self.__reserve(self.estimateTokens(query),deadline)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        if self.__asyncSemaphore is None:
+            self.__asyncSemaphore = asyncio.Semaphore(self.__maxConcurrency)
+        timeout = None if remaining is None else max(remaining - wait, 0)
+        try:
+            await asyncio.wait_for(self.__asyncSemaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.__record(None)
+            raise LLMDeadlineExceeded("Waiting for LLM concurrency slot exceeded the deadline")
+        self.__record(time.monotonic() - start)
+        try:
+            yield
+        finally:
+            self.__asyncSemaphore.release()
+            self.__leave()
+
+    def __record(self,queueTime:Optional[float]):
+        with self.__statsLock:
+            if queueTime is None:
+                self.__counters["rejected"] += 1
+                return
+            self.__counters["requests"] += 1
+            self.__counters["inFlight"] += 1
+            if queueTime > 0.001:
+                self.__counters["queued"] += 1
+            self.__queueTimes.append(queueTime)
+        if queueTime > 1:
+            self.logger.warning(f"LLM request queued {queueTime:.2f}s by rate limiter. Endpoint:{self.name}")
+
+    def __leave(self):
+        with self.__statsLock:
+            self.__counters["inFlight"] -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """请求计数与最近QUEUE_WINDOW次请求的排队时间(秒)"""
+        with self.__statsLock:
+            stats = dict(self.__counters)
+            queueTimes = sorted(self.__queueTimes)
+        if queueTimes:
+            stats["queueTimeAvg"] = sum(queueTimes) / len(queueTimes)
+            stats["queueTimeP95"] = queueTimes[min(len(queueTimes) - 1, int(len(queueTimes) * 0.95))]
+            stats["queueTimeMax"] = queueTimes[-1]
+        return stats
+
+#进程级别的限流器，key=接口名
+RATE_LIMITER_MAP: Dict[str, LLMRateLimiter] = {}
+RATE_LIMITER_LOCK = threading.Lock()
+
+#获取接口对应的限流器，配置依次按接口名、模型名查找，都没有时使用default
+def getRateLimiter(name:str,rateLimitConfig:Dict[str, Any],modelName:Optional[str] = None) -> LLMRateLimiter:
+    limiter = RATE_LIMITER_MAP.get(name)
+    if limiter is not None:
+        return limiter
+    with RATE_LIMITER_LOCK:
+        if name not in RATE_LIMITER_MAP:
+            limitConfig = rateLimitConfig.get(name) or rateLimitConfig.get(modelName) or rateLimitConfig.get("default", {})
+            RATE_LIMITER_MAP[name] = LLMRateLimiter(name,
+                                                    rpm=limitConfig.get("rpm", 1000),
+                                                    tpm=limitConfig.get("tpm", 100000),
+                                                    maxConcurrency=limitConfig.get("max_concurrency", 50),
+                                                    outputTokens=limitConfig.get("output_tokens", 512))
+        return RATE_LIMITER_MAP[name]
+
+#所有接口限流器的请求数、限流次数与排队时间
+def rateLimiterStats() -> Dict[str, Dict[str, Any]]:
+    with RATE_LIMITER_LOCK:
+        limiters = list(RATE_LIMITER_MAP.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
+
+registerStats("llmRateLimiter", rateLimiterStats)
@@ -0,0 +1,85 @@
+import contextvars
+import json
+import random
+import time
+from typing import Optional, Dict, Any
+from openai import APIStatusError, APITimeoutError, APIConnectionError
+
+#当前请求的截止时间(time.monotonic)，由gRPC服务在每个请求开始时设置，协程与线程池任务自动继承
+REQUEST_DEADLINE: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("requestDeadline", default=None)
+
+#可重试的http状态码：超时、冲突、限流与服务端错误
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class JsonParseError(ValueError):
+    """LLM返回内容无法解析为json"""
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """重试时间预算或请求截止时间已用完"""
+
+
+#设置当前请求的剩余时间，None表示客户端没有设置deadline
+def setRequestDeadline(timeRemaining:Optional[float]):
+    REQUEST_DEADLINE.set(time.monotonic() + timeRemaining if timeRemaining is not None else None)
+
+
+class RetryPolicy:
+    """带总时间预算的重试策略：指数退避 + 随机抖动，区分可重试与不可重试的错误"""
+    RETRY = "retry"
+    RETRY_NOW = "retryNow"
+    FATAL = "fatal"
+
+    def __init__(self,maxAttempts:int = 3,totalBudget:float = 120,attemptTimeout:float = 60,
+                 baseDelay:float = 0.5,maxDelay:float = 8):
+        self.maxAttempts = maxAttempts
+        self.totalBudget = totalBudget
+        self.attemptTimeout = attemptTimeout
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+
+    @classmethod
+    def fromConfig(cls,retryConfig:Dict[str, Any]):
+        return cls(maxAttempts=retryConfig.get("max_attempts", 3),
+                   totalBudget=retryConfig.get("total_budget", 120),
+                   attemptTimeout=retryConfig.get("attempt_timeout", 60),
+                   baseDelay=retryConfig.get("base_delay", 0.5),
+                   maxDelay=retryConfig.get("max_delay", 8))
+
+    def deadline(self) -> float:
+        """本次调用的截止时间，取时间预算与请求截止时间中较早的一个"""
+        deadline = time.monotonic() + self.totalBudget
+        requestDeadline = REQUEST_DEADLINE.get()
+        if requestDeadline is not None:
+            deadline = min(deadline, requestDeadline)
+        return deadline
+
+    def attemptTimeoutFor(self,deadline:float) -> float:
+        """单次尝试的超时，不超过剩余时间"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMDeadlineExceeded("LLM call deadline exceeded")
+        return min(self.attemptTimeout, remaining)
+
+    def classify(self,error:BaseException) -> str:
+        #json解析失败是模型输出的问题，立即重试即可
+        if isinstance(error, (JsonParseError, json.JSONDecodeError)):
+            return self.RETRY_NOW
+        if isinstance(error, LLMDeadlineExceeded):
+            return self.FATAL
+        if isinstance(error, (APITimeoutError, APIConnectionError)):
+            return self.RETRY
+        if isinstance(error, APIStatusError):
+            return self.RETRY if error.status_code in RETRYABLE_STATUS else self.FATAL
+        return self.RETRY
+
+    def nextDelay(self,error:BaseException,attempt:int,deadline:float) -> Optional[float]:
+        """返回下一次重试前的等待时间，不应再重试时返回None"""
+        kind = self.classify(error)
+        if kind == self.FATAL or attempt >= self.maxAttempts:
+            return None
+        delay = 0.0 if kind == self.RETRY_NOW else random.uniform(0, min(self.maxDelay, self.baseDelay * 2 ** (attempt - 1)))
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
@@ -0,0 +1,106 @@
+import asyncio
+import copy
+import threading
+import time
+from concurrent.futures import Future, CancelledError, TimeoutError as FutureTimeoutError
+from typing import Dict, Callable, Awaitable, Any, Optional
+from Common.LLMCommon.retryPolicy import LLMDeadlineExceeded
+
+
+#执行方自身的deadline到期或被取消，不代表跟随者也会失败，这类异常不共享给跟随者
+def isPrivateFailure(error:BaseException) -> bool:
+    return isinstance(error, (LLMDeadlineExceeded, CancelledError, asyncio.CancelledError))
+
+
+class SingleFlight:
+    """相同key的并发调用只执行一次，其余调用方等待第一个调用方的结果。
+    线程与协程共用同一个concurrent.futures.Future，因此两种服务模式下的请求可以互相合并。
+    执行方因自身的deadline或取消而失败时，跟随者在各自的deadline内重新竞争执行权。"""
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__calls: Dict[str, Future] = {}
+        self.__counters = {"leader": 0, "shared": 0}
+
+    def __join(self,key:str):
+        #返回(共享的Future,当前调用方是否负责真正执行)
+        with self.__lock:
+            future = self.__calls.get(key)
+            if future is not None:
+                self.__counters["shared"] += 1
+                return future, False
+            future = Future()
+            self.__calls[key] = future
+            self.__counters["leader"] += 1
+            return future, True
+
+    def __leave(self,key:str,future:Future):
+        #只移除自己注册的Future，执行方提前退出后key可能已经属于新的执行方
+        with self.__lock:
+            if self.__calls.get(key) is future:
+                del self.__calls[key]
+
+    def __fail(self,key:str,future:Future,error:BaseException):
+        if isPrivateFailure(error):
+            #先移除再取消，被唤醒的跟随者重新竞争时拿到的是新的Future
+            self.__leave(key, future)
+            future.cancel()
+        else:
+            future.set_exception(error)
+
+    def do(self,key:str,fn:Callable[..., Any],*args,timeout:Optional[float] = None) -> Any:
+        """同步调用，跟随者拿到的是结果的深拷贝，timeout为跟随者最多等待的时间"""
+        waitUntil = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            future, isLeader = self.__join(key)
+            if isLeader:
+                try:
+                    result = fn(*args)
+                except BaseException as e:
+                    self.__fail(key, future, e)
+                    raise
+                finally:
+                    self.__leave(key, future)
+                future.set_result(result)
+                return result
+            try:
+                return copy.deepcopy(future.result(timeout=self.__remaining(waitUntil)))
+            except CancelledError:
+                #执行方被取消或自身deadline到期，重新竞争执行权
+                continue
+            except FutureTimeoutError:
+                raise LLMDeadlineExceeded("Waiting for the in-flight LLM call exceeded the deadline")
+
+    async def ado(self,key:str,fn:Callable[..., Awaitable[Any]],*args,timeout:Optional[float] = None) -> Any:
+        """异步调用，等待期间不占用事件循环"""
+        waitUntil = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            future, isLeader = self.__join(key)
+            if isLeader:
+                try:
+                    result = await fn(*args)
+                except BaseException as e:
+                    self.__fail(key, future, e)
+                    raise
+                finally:
+                    self.__leave(key, future)
+                future.set_result(result)
+                return result
+            try:
+                #shield防止跟随者自身被取消时连带取消共享的Future
+                return copy.deepcopy(await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)),self.__remaining(waitUntil)))
+            except asyncio.CancelledError:
+                if future.cancelled():
+                    continue
+                raise
+            except asyncio.TimeoutError:
+                raise LLMDeadlineExceeded("Waiting for the in-flight LLM call exceeded the deadline")
+
+    @staticmethod
+    def __remaining(waitUntil:Optional[float]) -> Optional[float]:
+        return max(waitUntil - time.monotonic(), 0) if waitUntil is not None else None
+
+    def stats(self) -> Dict[str, int]:
+        with self.__lock:
+            stats = dict(self.__counters)
+            stats["inFlight"] = len(self.__calls)
+        return stats
@@ -0,0 +1,129 @@
+import json
+from typing import Dict, Any, List, Tuple
+from json_repair import repair_json
+
+#空白字符
+WHITESPACE = " \t\r\n"
+
+
+class IncrementalJsonParser:
+    """增量解析LLM流式输出中的顶层json对象，每个字段的值一完整就返回，不必等整段输出结束。
+    对象之前的内容(如```json)会被跳过；结构无法识别时failed为True，由调用方对完整文本做repair_json兜底。"""
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.done = False
+        self.failed = False
+        self.__state = "start"
+        self.__buffer: List[str] = []
+        self.__key = None
+        self.__depth = 0
+        self.__inString = False
+        self.__escape = False
+
+    def feed(self,chunk:str) -> List[Tuple[str, Any]]:
+        """输入一段新的文本，返回本段内完整解析出的(字段名,值)"""
+        completed = []
+        for char in chunk:
+            if self.done or self.failed:
+                break
+            field = self.__step(char)
+            if field is not None:
+                completed.append(field)
+        return completed
+
+    def __step(self,char:str):
+        state = self.__state
+        if state == "start":
+            if char == "{":
+                self.__state = "beforeKey"
+        elif state == "beforeKey":
+            if char == '"':
+                self.__state = "key"
+                self.__buffer = []
+            elif char == "}":
+                self.done = True
+            elif char not in WHITESPACE and char != ",":
+                self.failed = True
+        elif state == "key":
+            if self.__escape:
+                self.__escape = False
+            elif char == "\\":
+                self.__escape = True
+            elif char == '"':
+                self.__key = json.loads('"' + "".join(self.__buffer) + '"')
+                self.__state = "colon"
+                return None
+            self.__buffer.append(char)
+        elif state == "colon":
+            if char == ":":
+                self.__state = "valueStart"
+            elif char not in WHITESPACE:
+                self.failed = True
+        elif state == "valueStart":
+            if char in WHITESPACE:
+                return None
+            self.__buffer = [char]
+            self.__state = "value"
+            self.__depth = 1 if char in "{[" else 0
+            self.__inString = char == '"'
+            if char == "}":
+                self.failed = True
+        elif state == "value":
+            return self.__stepValue(char)
+        elif state == "afterValue":
+            if char == ",":
+                self.__state = "beforeKey"
+            elif char == "}":
+                self.done = True
+            elif char not in WHITESPACE:
+                self.failed = True
+        return None
+
+    def __stepValue(self,char:str):
+        if self.__inString:
+            self.__buffer.append(char)
+            if self.__escape:
+                self.__escape = False
+            elif char == "\\":
+                self.__escape = True
+            elif char == '"':
+                self.__inString = False
+                if self.__depth == 0:
+                    self.__state = "afterValue"
+                    return self.__completeValue()
+            return None
+        if char == '"':
+            self.__inString = True
+        elif char in "{[":
+            self.__depth += 1
+        elif char in "}]":
+            if self.__depth == 0:
+                #数字、布尔等没有结束符的值后面直接跟着对象的结束
+                self.done = char == "}"
+                self.failed = char != "}"
+                return self.__completeValue()
+            self.__depth -= 1
+            self.__buffer.append(char)
+            if self.__depth == 0:
+                self.__state = "afterValue"
+                return self.__completeValue()
+            return None
+        elif char == "," and self.__depth == 0:
+            self.__state = "beforeKey"
+            return self.__completeValue()
+        self.__buffer.append(char)
+        return None
+
+    def __completeValue(self):
+        text = "".join(self.__buffer).strip()
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            #模型常输出True/False等python写法，放回对象中交给repair_json修复
+            repaired = repair_json('{"value": ' + text + '}', return_objects=True)
+            if not isinstance(repaired, dict) or "value" not in repaired:
+                self.failed = True
+                return None
+            value = repaired["value"]
+        self.fields[self.__key] = value
+        return self.__key, value
@@ -27,13 +27,15 @@ toolUsingPrompt = PromptTemplate.from_template(
 针对用户的需求，你能够调用的工具列表:{tools}
 核心目标:严格匹配工具能力与用户需求，确保工具调用的准确性和高效性，拒绝调用与需求无关的工具。选择工具时候你需要重点考虑工具列表中toolCapability字段，这个字段的意义是工具的大体功能，这个工具可以拿来干什么。
 工具匹配规则：第一优先级：工具toolCapability与用户需求类型完全匹配（如用户查订单，优先选 “代驾订单查询工具”）;第二优先级：工具toolCapability可覆盖用户核心诉求（如用户问代驾费用计算，选 “代驾费用核算工具”，而非泛化的 “信息查询工具”）;
-第三优先级：多工具协同匹配（如用户诉求为 “查询昨晚订单 + 开具电子发票”，需依次调用 “订单查询工具”+“发票开具工具”）.
+第三优先级：多工具协同匹配（如用户诉求为 “查询昨晚订单 + 开具电子发票”，需调用 “订单查询工具”+“发票开具工具”）.
+多工具调用规则：互相独立、不依赖其他工具结果的工具在本次一起输出，会被同时调用；需要用到其他工具调用结果的工具不要在本次输出，留到下一轮思考之后再调用。
 用户的输入:{cleanedInput}
 本次思考的结果:{thinkingAns}
 本次的行动规划:{action}
 输出要求如下所示，一定要严格按照JSON格式进行输出:
-1.toolName:str类型，输出你要调用的工具名称，调用的工具一定要包含在工具列表里面，不能随意创造工具。
-2.reason:str类型，输出你调用该工具的理由。
+1.toolCalls:List类型，输出本次要调用的工具，每个元素是一个Dict，包含以下两个字段:
+toolName:str类型，要调用的工具名称，调用的工具一定要包含在工具列表里面，不能随意创造工具。
+reason:str类型，调用该工具的理由。
 """
 )
 
@@ -43,11 +45,11 @@ paramSelectPrompt = PromptTemplate.from_template(
 要求:1.必须严格对照目标工具的参数列表，从用户信息（当前对话、历史记录、账号信息）中精准提取对应参数值。
 2.若用户信息中参数表述模糊（如 “我在 XX 路口附近”），保留原表述作为参数值，禁止主观补充。
 3.若用户信息、历史记录、账号绑定数据中，完全不包含工具所需的某一参数，该参数值必须返回None，严禁编造、猜测、虚构任何参数内容。
-将要调用的工具如下:{tool}
-所需要的参数要求列表如下所示:{paraNameList}
+将要调用的工具列表如下，每个工具的toolCapability是工具的功能，inputPara是所需要的参数要求列表:{tools}
 用户信息如下所示:{userInfo}
 输出要求如下所示，一定要严格按照JSON格式进行输出:
-1.paraList:Dict类型，返回你从用户信息中提取出的参数内容，Dict的键是参数的名称，值是提取出的参数的具体值。一定要和参数要求列表一一对应，若用户信息中没有提到相关的参数,在列表中对应位置赋值None即可。
+1.paraLists:Dict类型，键是工具名称toolName，值是该工具的参数内容Dict。参数内容Dict的键是参数的名称，值是你从用户信息中提取出的参数的具体值。
+每个工具的参数一定要和它的参数要求列表一一对应，若用户信息中没有提到相关的参数,在对应位置赋值None即可。
 """
 )
 
@@ -96,3 +98,12 @@ finishPrompt = PromptTemplate.from_template(
 """
 )
 
+
+finishStreamPrompt = PromptTemplate.from_template(
+"""
+任务:你是代驾软件智能客服,你已经完成了思考，行动，工具调用的整个流程了，现在要根据从思考到行动的结果以及要求的回复语气来完整地回复用户的提问。
+思考，行动，工具调用结果如下:{pipelineAns}
+要求的行动语气如下:{tone}
+输出要求:直接输出最终回复给用户的纯文本内容，一定严格按照思考与行动的结果进行回答并进行语气的适配，不要输出JSON、标题或任何额外说明。
+"""
+)
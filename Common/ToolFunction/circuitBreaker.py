@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+from Common.statsReporter import registerStats
+from Common.utils import getAbsolutePath, loadYmlFile, initLogger
+
+#熔断器状态
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "halfOpen"
+
+
+class CircuitBreaker:
+    """单个工具的熔断器(enable为False时只统计不熔断)：统计最近window_size次调用的失败率(超过slow_call_seconds的调用也算失败)，
+    失败率达到failure_rate后熔断open_seconds秒，期间调用直接返回；到期后进入半开状态，
+    放行half_open_calls次探测调用，全部成功则恢复，任意一次失败则重新熔断。"""
+    def __init__(self,name:str,breakerConfig:Dict[str, Any]):
+        self.logger = initLogger(__name__)
+        self.name = name
+        self.__enable = breakerConfig.get("enable", True)
+        self.__windowSize = breakerConfig.get("window_size", 20)
+        self.__minCalls = breakerConfig.get("min_calls", 5)
+        self.__failureRate = breakerConfig.get("failure_rate", 0.5)
+        self.__slowCallSeconds = breakerConfig.get("slow_call_seconds", 5)
+        self.__openSeconds = breakerConfig.get("open_seconds", 30)
+        self.__halfOpenCalls = breakerConfig.get("half_open_calls", 1)
+        self.__lock = threading.Lock()
+        self.__state = CLOSED
+        self.__outcomes = deque(maxlen=self.__windowSize) #True表示失败
+        self.__latencies = deque(maxlen=self.__windowSize)
+        self.__openUntil = 0.0
+        self.__probing = 0 #半开状态下已放行、还没有结果的探测数
+        self.__probeSuccess = 0
+        self.__counters = {"success": 0, "failure": 0, "slow": 0, "rejected": 0, "opened": 0}
+
+    def allow(self) -> bool:
+        """本次调用是否放行，不放行时调用方直接返回工具不可用"""
+        if not self.__enable:
+            return True
+        with self.__lock:
+            if self.__state == OPEN and time.monotonic() >= self.__openUntil:
+                self.__transit(HALF_OPEN)
+            if self.__state == CLOSED:
+                return True
+            if self.__state == HALF_OPEN and self.__probing + self.__probeSuccess < self.__halfOpenCalls:
+                self.__probing += 1
+                return True
+            self.__counters["rejected"] += 1
+            return False
+
+    def isAvailable(self) -> bool:
+        """不改变状态的检查，熔断中且未到期时返回False"""
+        with self.__lock:
+            return self.__state != OPEN or time.monotonic() >= self.__openUntil
+
+    def recordSuccess(self,latency:float):
+        #成功但耗时超过阈值的调用按失败统计，后端变慢时同样熔断
+        if latency > self.__slowCallSeconds:
+            with self.__lock:
+                self.__counters["slow"] += 1
+            self.recordFailure(latency)
+            return
+        with self.__lock:
+            self.__counters["success"] += 1
+            self.__latencies.append(latency)
+            if self.__state == HALF_OPEN:
+                self.__probing = max(self.__probing - 1, 0)
+                self.__probeSuccess += 1
+                if self.__probeSuccess >= self.__halfOpenCalls:
+                    self.__transit(CLOSED)
+                return
+            self.__outcomes.append(False)
+
+    def recordFailure(self,latency:float):
+        with self.__lock:
+            self.__counters["failure"] += 1
+            self.__latencies.append(latency)
+            if self.__state == HALF_OPEN:
+                self.__probing = max(self.__probing - 1, 0)
+                self.__transit(OPEN)
+                return
+            if self.__state == OPEN:
+                return
+            self.__outcomes.append(True)
+            if self.__enable and len(self.__outcomes) >= self.__minCalls and sum(self.__outcomes) / len(self.__outcomes) >= self.__failureRate:
+                self.__transit(OPEN)
+
+    def recordIgnored(self):
+        #调用方被取消或出错原因与后端无关，结果不计入统计，只释放半开状态的探测名额
+        with self.__lock:
+            if self.__state == HALF_OPEN:
+                self.__probing = max(self.__probing - 1, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        """状态、调用计数、窗口内失败率与延迟分位数"""
+        now = time.monotonic()
+        with self.__lock:
+            stats: Dict[str, Any] = dict(self.__counters)
+            stats["state"] = self.__state
+            stats["failureRate"] = sum(self.__outcomes) / len(self.__outcomes) if self.__outcomes else 0.0
+            if self.__state == OPEN:
+                stats["openRemaining"] = max(self.__openUntil - now, 0)
+            latencies = sorted(self.__latencies)
+        if latencies:
+            stats["latencyP50"] = latencies[len(latencies) // 2]
+            stats["latencyP95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return stats
+
+    def __transit(self,state:str):
+        #调用方持有锁
+        previous = self.__state
+        self.__state = state
+        self.__probing = 0
+        self.__probeSuccess = 0
+        if state == OPEN:
+            self.__openUntil = time.monotonic() + self.__openSeconds
+            self.__counters["opened"] += 1
+        if state == CLOSED:
+            self.__outcomes.clear()
+        self.logger.warning(f"Tool {self.name} circuit breaker {previous} -> {state}")
+
+CIRCUIT_BREAKERS: Dict[str, CircuitBreaker] = {}
+CIRCUIT_BREAKERS_LOCK = threading.Lock()
+BREAKER_CONFIG: Optional[Dict[str, Any]] = None
+
+#获取工具的熔断器，tools下按工具名配置的参数覆盖默认参数
+def getCircuitBreaker(toolName:str) -> CircuitBreaker:
+    global BREAKER_CONFIG
+    breaker = CIRCUIT_BREAKERS.get(toolName)
+    if breaker is not None:
+        return breaker
+    with CIRCUIT_BREAKERS_LOCK:
+        if toolName not in CIRCUIT_BREAKERS:
+            if BREAKER_CONFIG is None:
+                BREAKER_CONFIG = loadYmlFile(getAbsolutePath("../Config/config.yml")).get("tool_call", {}).get("circuit_breaker", {})
+            breakerConfig = {key: value for key, value in BREAKER_CONFIG.items() if key != "tools"}
+            breakerConfig.update((BREAKER_CONFIG.get("tools") or {}).get(toolName, {}))
+            CIRCUIT_BREAKERS[toolName] = CircuitBreaker(toolName, breakerConfig)
+        return CIRCUIT_BREAKERS[toolName]
+
+#各工具熔断器的状态与统计
+def circuitBreakerStats() -> Dict[str, Dict[str, Any]]:
+    with CIRCUIT_BREAKERS_LOCK:
+        breakers = list(CIRCUIT_BREAKERS.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
+
+registerStats("toolCircuitBreaker", circuitBreakerStats)
@@ -0,0 +1,109 @@
+import ast
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import MetaData, Table, select
+from Common.DBCommon.sqlLiteCom import getDbSession, getTableSignature
+from Common.ToolFunction.toolRegistery import TOOL_INDEX, normalizeToolName
+from Common.utils import getAbsolutePath, loadYmlFile, initLogger
+
+#工具注册信息所在的数据库与表
+TOOL_DB = "toolRegister_db"
+TOOL_TABLE = "toolUsingTable"
+
+
+#读取工具表的全部行，返回字典list，列名:数值
+def loadToolRows() -> List[Dict[str, Any]]:
+    sqliteSession = next(getDbSession(TOOL_DB))
+    engine = sqliteSession.bind
+    metadata = MetaData()
+    target_table = Table(
+        TOOL_TABLE,  # 表名
+        metadata,
+        autoload_with=engine  # 自动从引擎加载表结构
+    )
+    query = select(target_table)
+    result = sqliteSession.execute(query)
+    return [dict(row) for row in result.mappings().all()]
+
+#按意图整理工具，只保留在TOOL_REGISTRY中注册了实现的工具
+def buildToolCatalogue(toolRows: List[Dict[str, Any]]) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, Dict[str, Any]]]:
+    logger = initLogger(__name__)
+    intentTools: Dict[str, List[Dict[str, Any]]] = {}
+    tools: Dict[str, Dict[str, Any]] = {}
+    for toolRow in toolRows:
+        toolName = normalizeToolName(toolRow["toolName"])
+        if toolName not in TOOL_INDEX:
+            logger.warning(f"Tool {toolRow['toolName']} is not registered in TOOL_REGISTRY, skipped.")
+            continue
+        try:
+            intentList = ast.literal_eval(toolRow["intentList"]) if toolRow["intentList"] else []
+        except (ValueError, SyntaxError) as e:
+            logger.error(f"Tool {toolRow['toolName']} has invalid intentList! \n {e}")
+            continue
+        tools[toolName] = toolRow
+        for intent in intentList:
+            intentTools.setdefault(intent, []).append(toolRow)
+    return intentTools, tools
+
+
+class ToolCatalogue:
+    """进程级别的工具目录：启动时读取并解析一次工具表，预先建立意图到工具的映射；
+    后台线程定期检查工具表的指纹，有变化时重建后整体替换。返回的工具列表只读，调用方不要修改。"""
+    def __init__(self, reloadInterval: float = 10):
+        self.logger = initLogger(__name__)
+        self.__intentTools: Dict[str, List[Dict[str, Any]]] = {}
+        self.__tools: Dict[str, Dict[str, Any]] = {}
+        self.__signature: Optional[Tuple[int, int, int]] = None
+        self.__reloadLock = threading.Lock()
+        try:
+            self.reload()
+        except Exception as e:
+            self.logger.error(f"Tool List search failed! \n {e}")
+        if reloadInterval > 0:
+            threading.Thread(target=self.__watch, args=(reloadInterval,), name="toolCatalogueWatcher", daemon=True).start()
+
+    def toolsForIntent(self, intent: str) -> List[Dict[str, Any]]:
+        return self.__intentTools.get(intent, [])
+
+    def getTool(self, toolName: str) -> Optional[Dict[str, Any]]:
+        return self.__tools.get(normalizeToolName(toolName))
+
+    def reload(self, force: bool = False) -> bool:
+        """工具表的指纹变化时重建目录，返回是否发生了替换"""
+        with self.__reloadLock:
+            signature = getTableSignature(TOOL_DB, TOOL_TABLE)
+            if not force and self.__signature is not None and signature == self.__signature:
+                return False
+            start = time.monotonic()
+            toolRows = loadToolRows()
+            if len(toolRows) == 0:
+                self.logger.error("Don't find any tools in the table")
+            intentTools, tools = buildToolCatalogue(toolRows)
+            #先替换工具再替换意图映射，按意图查到的工具一定能按名字查到
+            self.__tools = tools
+            self.__intentTools = intentTools
+            self.__signature = signature
+        self.logger.info(f"Tool catalogue built. Tools:{len(tools)},Intents:{len(intentTools)},Cost:{time.monotonic() - start:.3f}s")
+        return True
+
+    def __watch(self, reloadInterval: float):
+        while True:
+            time.sleep(reloadInterval)
+            try:
+                self.reload()
+            except Exception as e:
+                self.logger.error(f"Tool catalogue reload failed! \n {e}")
+
+TOOL_CATALOGUE: Optional[ToolCatalogue] = None
+TOOL_CATALOGUE_LOCK = threading.Lock()
+
+#获取进程级别的工具目录
+def getToolCatalogue() -> ToolCatalogue:
+    global TOOL_CATALOGUE
+    if TOOL_CATALOGUE is None:
+        with TOOL_CATALOGUE_LOCK:
+            if TOOL_CATALOGUE is None:
+                config = loadYmlFile(getAbsolutePath("../Config/config.yml")).get("tool_catalogue", {})
+                TOOL_CATALOGUE = ToolCatalogue(reloadInterval=config.get("reload_interval", 10))
+    return TOOL_CATALOGUE
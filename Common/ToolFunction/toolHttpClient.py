@@ -0,0 +1,131 @@
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import httpx
+from Common.statsReporter import registerStats
+from Common.utils import getAbsolutePath, loadYmlFile, initLogger
+
+
+class ToolHttpError(Exception):
+    """工具后端返回了HTTP错误或业务错误码"""
+
+
+#是否为后端服务的故障：连接失败、超时、5xx以及业务错误码，4xx与解析、参数错误不算
+def isServiceFailure(error:Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, (httpx.TransportError, ToolHttpError))
+
+
+class ToolResultCache:
+    """工具结果的内存缓存，key为工具名+请求参数，各工具的过期时间单独配置，0表示不缓存"""
+    def __init__(self,ttlMap:Dict[str, float],maxSize:int = 1024):
+        self.__ttlMap = ttlMap
+        self.__maxSize = maxSize
+        self.__memory: OrderedDict[str, tuple] = OrderedDict() #key -> (过期时间,结果)
+        self.__lock = threading.Lock()
+        self.__counters = {"hit": 0, "miss": 0, "write": 0}
+
+    @staticmethod
+    def buildKey(toolName:str,path:str,params:Optional[Dict[str, Any]]) -> str:
+        return json.dumps([toolName, path, params or {}], ensure_ascii=False, sort_keys=True, default=str)
+
+    def getTtl(self,toolName:str) -> float:
+        return self.__ttlMap.get(toolName, self.__ttlMap.get("default", 0))
+
+    def get(self,key:str) -> Optional[Any]:
+        """查询缓存，未命中或已过期返回None；返回深拷贝，调用方修改结果不影响缓存"""
+        now = time.monotonic()
+        with self.__lock:
+            item = self.__memory.get(key)
+            if item is not None and item[0] > now:
+                self.__memory.move_to_end(key)
+                self.__counters["hit"] += 1
+                return copy.deepcopy(item[1])
+            if item is not None:
+                del self.__memory[key]
+            self.__counters["miss"] += 1
+        return None
+
+    def set(self,key:str,toolName:str,value:Any):
+        ttl = self.getTtl(toolName)
+        if ttl <= 0:
+            return
+        with self.__lock:
+            self.__memory[key] = (time.monotonic() + ttl, copy.deepcopy(value))
+            self.__memory.move_to_end(key)
+            while len(self.__memory) > self.__maxSize:
+                self.__memory.popitem(last=False)
+            self.__counters["write"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self.__lock:
+            stats = dict(self.__counters)
+            stats["size"] = len(self.__memory)
+        return stats
+
+
+class ToolHttpClient:
+    """工具调用后端服务的共享http客户端：同步与异步客户端各自带连接池并保持长连接，
+    超时按工具名配置；后端统一返回{"code":200,"data":...}，code不为200时抛出ToolHttpError。"""
+    def __init__(self,httpConfig:Dict[str, Any]):
+        self.logger = initLogger(__name__)
+        self.baseUrl = httpConfig.get("base_url", "http://localhost:8511").rstrip("/")
+        self.__connectTimeout = httpConfig.get("connect_timeout", 3)
+        self.__timeoutMap = httpConfig.get("timeout", {})
+        limits = httpx.Limits(max_connections=httpConfig.get("max_connections", 50),
+                              max_keepalive_connections=httpConfig.get("max_keepalive_connections", 20),
+                              keepalive_expiry=httpConfig.get("keepalive_expiry", 60))
+        self.__client = httpx.Client(base_url=self.baseUrl, limits=limits)
+        self.__asyncClient = httpx.AsyncClient(base_url=self.baseUrl, limits=limits)
+        self.cache = ToolResultCache(httpConfig.get("cache_ttl", {}), httpConfig.get("cache_size", 1024))
+
+    def getTimeout(self,toolName:str) -> httpx.Timeout:
+        return httpx.Timeout(self.__timeoutMap.get(toolName, self.__timeoutMap.get("default", 10)), connect=self.__connectTimeout)
+
+    def getData(self,toolName:str,path:str,params:Optional[Dict[str, Any]] = None) -> Any:
+        """GET请求后端接口，返回响应中的data字段，开启缓存的工具先查缓存"""
+        cacheKey = ToolResultCache.buildKey(toolName, path, params)
+        data = self.cache.get(cacheKey)
+        if data is not None:
+            return data
+        response = self.__client.get(path, params=params, timeout=self.getTimeout(toolName))
+        data = self.__parseResponse(response)
+        self.cache.set(cacheKey, toolName, data)
+        return data
+
+    async def agetData(self,toolName:str,path:str,params:Optional[Dict[str, Any]] = None) -> Any:
+        """getData的异步版本，等待响应时不占用事件循环"""
+        cacheKey = ToolResultCache.buildKey(toolName, path, params)
+        data = self.cache.get(cacheKey)
+        if data is not None:
+            return data
+        response = await self.__asyncClient.get(path, params=params, timeout=self.getTimeout(toolName))
+        data = self.__parseResponse(response)
+        self.cache.set(cacheKey, toolName, data)
+        return data
+
+    @staticmethod
+    def __parseResponse(response:httpx.Response) -> Any:
+        response.raise_for_status()
+        result = response.json()
+        respCode = result.get("code")
+        if respCode != 200:
+            raise ToolHttpError(f"error response {respCode}")
+        return result.get("data")
+
+TOOL_HTTP_CLIENT: Optional[ToolHttpClient] = None
+TOOL_HTTP_CLIENT_LOCK = threading.Lock()
+
+#获取进程级别的工具http客户端
+def getToolHttpClient() -> ToolHttpClient:
+    global TOOL_HTTP_CLIENT
+    if TOOL_HTTP_CLIENT is None:
+        with TOOL_HTTP_CLIENT_LOCK:
+            if TOOL_HTTP_CLIENT is None:
+                TOOL_HTTP_CLIENT = ToolHttpClient(loadYmlFile(getAbsolutePath("../Config/config.yml")).get("tool_http", {}))
+                registerStats("toolResultCache", TOOL_HTTP_CLIENT.cache.stats)
+    return TOOL_HTTP_CLIENT
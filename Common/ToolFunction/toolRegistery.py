@@ -1,38 +1,137 @@
-from typing import Dict, Any
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Any, List, Optional, Tuple
 
+from Common.ToolFunction.circuitBreaker import getCircuitBreaker
+from Common.ToolFunction.toolHttpClient import isServiceFailure
 from Common.ToolFunction.toolTest import *
-from Common.utils import initLogger
+from Common.utils import getAbsolutePath, loadYmlFile, initLogger
 
 #工具注册表，哪些工具可以使用
 TOOL_REGISTRY:Dict[str, Dict[str, Any]] = {
     "findNoUsePage":{
         "func":findNoUsePage,
+        "afunc":afindNoUsePage,
         "description":"查询用户未使用的优惠券有哪些",
         "params": ["userId","page","limit"],
     }
 }
 
-#封装工具调用的核心函数
-def callAgentTool(toolName:str, **kwargs) -> str:
+#工具调用失败与熔断期间返回给大模型的结果
+TOOL_FAILED_ANSWER = "工具调用失败，不需要进一步重新调用，直接让用户自行查看即可。"
+TOOL_UNAVAILABLE_ANSWER = "工具暂时不可用，不要再次调用该工具，直接根据已有信息回复用户，并提示用户稍后自行查看。"
+
+#工具名统一为去空格、小写后比较
+def normalizeToolName(toolName:str) -> str:
+    return str(toolName).strip().lower()
+
+#按规范化工具名索引的注册表，调用时直接查字典，name为注册时的工具名
+TOOL_INDEX:Dict[str, Dict[str, Any]] = {normalizeToolName(toolId): dict(toolMeta, name=toolId) for toolId, toolMeta in TOOL_REGISTRY.items()}
+
+#工具是否可以调用，熔断中的工具不提供给大模型选择
+def isToolAvailable(toolName:str) -> bool:
+    matchedTool = TOOL_INDEX.get(normalizeToolName(toolName))
+    return matchedTool is not None and getCircuitBreaker(matchedTool["name"]).isAvailable()
+
+#查找工具并校验参数，失败时返回None
+def __matchTool(toolName:str,kwargs:Dict[str, Any]) -> Optional[Dict[str, Any]]:
     logger = initLogger(__name__)
-    cleanToolName = toolName.strip().lower()
-    matchedTool = None
-    for toolId,toolMeta in TOOL_REGISTRY.items():
-        if cleanToolName == toolId.lower():
-            matchedTool = toolMeta
+    matchedTool = TOOL_INDEX.get(normalizeToolName(toolName))
     if not matchedTool:
         logger.error("Tool not Exit!")
-        return ""
+        return None
     #校验参数
-    missingParams = [kwargs.get(param) for param in matchedTool["params"] if param not in kwargs]
+    missingParams = [param for param in matchedTool["params"] if param not in kwargs]
     if missingParams:
         logger.error(f"Missing params: {str(missingParams)}")
+        return None
+    return matchedTool
+
+#只有后端服务的故障(连接、超时、5xx、业务错误码)计入熔断，其余异常只释放半开状态的探测名额
+def __recordError(circuitBreaker,error:Exception,latency:float):
+    if isServiceFailure(error):
+        circuitBreaker.recordFailure(latency)
+    else:
+        circuitBreaker.recordIgnored()
+
+#封装工具调用的核心函数，每个工具有自己的熔断器，熔断期间直接返回工具不可用
+def callAgentTool(toolName:str, **kwargs) -> str:
+    logger = initLogger(__name__)
+    matchedTool = __matchTool(toolName, kwargs)
+    if not matchedTool:
         return ""
+    circuitBreaker = getCircuitBreaker(matchedTool["name"])
+    if not circuitBreaker.allow():
+        logger.warning(f"Tool {matchedTool['name']} rejected by the circuit breaker, skipped.")
+        return TOOL_UNAVAILABLE_ANSWER
+    start = time.monotonic()
     try:
         toolFunc = matchedTool["func"]
         result = toolFunc(**kwargs)
-        logger.info(f"Tool use successfully! Result:{result}")
-        return result
     except Exception as e:
-        logger.info(f"Tool use Failed! \n {e}")
+        __recordError(circuitBreaker, e, time.monotonic() - start)
+        logger.error(f"Tool use Failed! \n {e}")
+        return TOOL_FAILED_ANSWER
+    circuitBreaker.recordSuccess(time.monotonic() - start)
+    logger.info(f"Tool use successfully! Result:{result}")
+    return result
+
+#工具调用(异步)，注册了afunc的工具直接在事件循环中执行，其余工具放到共享线程池
+async def acallAgentTool(toolName:str, **kwargs) -> str:
+    logger = initLogger(__name__)
+    matchedTool = __matchTool(toolName, kwargs)
+    if not matchedTool:
         return ""
+    circuitBreaker = getCircuitBreaker(matchedTool["name"])
+    if not circuitBreaker.allow():
+        logger.warning(f"Tool {matchedTool['name']} rejected by the circuit breaker, skipped.")
+        return TOOL_UNAVAILABLE_ANSWER
+    start = time.monotonic()
+    try:
+        if "afunc" in matchedTool:
+            result = await matchedTool["afunc"](**kwargs)
+        else:
+            result = await asyncio.get_running_loop().run_in_executor(getToolExecutor(), partial(matchedTool["func"], **kwargs))
+    except asyncio.CancelledError:
+        circuitBreaker.recordIgnored()
+        raise
+    except Exception as e:
+        __recordError(circuitBreaker, e, time.monotonic() - start)
+        logger.error(f"Tool use Failed! \n {e}")
+        return TOOL_FAILED_ANSWER
+    circuitBreaker.recordSuccess(time.monotonic() - start)
+    logger.info(f"Tool use successfully! Result:{result}")
+    return result
+
+#同一步中多个工具并行调用所用的线程池，所有请求共享，限制同时执行的工具数
+TOOL_EXECUTOR: Optional[ThreadPoolExecutor] = None
+TOOL_EXECUTOR_LOCK = threading.Lock()
+
+#读取工具调用配置
+def loadToolCallConfig() -> Dict[str, Any]:
+    return loadYmlFile(getAbsolutePath("../Config/config.yml")).get("tool_call", {})
+
+def getToolExecutor() -> ThreadPoolExecutor:
+    global TOOL_EXECUTOR
+    if TOOL_EXECUTOR is None:
+        with TOOL_EXECUTOR_LOCK:
+            if TOOL_EXECUTOR is None:
+                TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=loadToolCallConfig().get("max_workers", 8),thread_name_prefix="toolCall")
+    return TOOL_EXECUTOR
+
+#并行调用多个互相独立的工具，toolCalls为(工具名,参数)列表，结果与输入顺序一致
+def callAgentTools(toolCalls:List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+    #只有一个工具时直接在当前线程调用
+    if len(toolCalls) == 1:
+        toolName, params = toolCalls[0]
+        return [callAgentTool(toolName, **params)]
+    toolExecutor = getToolExecutor()
+    futureList = [toolExecutor.submit(callAgentTool, toolName, **params) for toolName, params in toolCalls]
+    return [future.result() for future in futureList]
+
+#并行调用多个工具(异步)，不占用事件循环
+async def acallAgentTools(toolCalls:List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+    return list(await asyncio.gather(*[acallAgentTool(toolName, **params) for toolName, params in toolCalls]))
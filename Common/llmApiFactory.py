@@ -1,12 +1,33 @@
-import concurrent
+import asyncio
+import contextvars
 import json
-import os
+import threading
 import time
-from typing import Optional, Dict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait, TimeoutError as FutureTimeoutError
+from typing import Optional, Dict, Tuple, Set, Callable, Any
+import httpx
 from json_repair import repair_json
 from langchain_openai import ChatOpenAI
+from Common.LLMCommon.endpointRouter import getEndpointRouter, LLMEndpoint
+from Common.LLMCommon.llmCache import getLLMCache, LLMResponseCache
+from Common.LLMCommon.retryPolicy import RetryPolicy, JsonParseError, LLMDeadlineExceeded, REQUEST_DEADLINE
+from Common.LLMCommon.singleFlight import SingleFlight
+from Common.LLMCommon.streamingJson import IncrementalJsonParser
+from Common.statsReporter import registerStats
 from Common.utils import getAbsolutePath, loadYmlFile, initLogger
 
+#进程级别的模型客户端池，key=(模型名,base_url,是否流式)，所有ModelFactory实例共享keep-alive连接
+MODEL_POOL: Dict[Tuple[str, str, bool], ChatOpenAI] = {}
+MODEL_POOL_LOCK = threading.Lock()
+#相同prompt的并发invokeJson只向上游发一次请求，线程与协程共用
+LLM_SINGLE_FLIGHT = SingleFlight()
+registerStats("llmSingleFlight", LLM_SINGLE_FLIGHT.stats)
+#流式json调用在单独的key空间合并，提前停止的不完整结果不会交给invokeJson的调用方
+STREAM_FLIGHT_PREFIX = "stream:"
+#同步调用发对冲请求时使用的线程池
+HEDGE_EXECUTOR: Optional[ThreadPoolExecutor] = None
+HEDGE_EXECUTOR_LOCK = threading.Lock()
+
 
 class ModelFactory:
     def __init__(self,purpose:str = "common"):
@@ -14,83 +35,425 @@ class ModelFactory:
         #读取配置文件
         configPath = getAbsolutePath("../Config/config.yml")
         config = loadYmlFile(configPath)
-        #LLM模型的配置
+        #LLM模型的配置，接口地址与api key见EndpointRouter
         if purpose == "common":
-            self.__llmApiKey = os.getenv("API_KEY_EXTERNAL")
-            self.__baseURL = config["llm"]["base_url"]
             self.__modelName = config["llm"]["model_name"]
-    def __getModel(self,stream:bool = False):
-        return ChatOpenAI(model_name=self.__modelName,
-                          openai_api_key=self.__llmApiKey,
-                          openai_api_base=self.__baseURL,
-                          streaming=stream)
+            self.__httpConfig = config["llm"]
+            self.__retryPolicy = RetryPolicy.fromConfig(config["llm"].get("retry", {}))
+            self.__hedgeWorkers = config["llm"].get("hedge", {}).get("max_workers", 100)
+        self.__cache = getLLMCache()
+        #所有ModelFactory实例共享接口的健康与延迟统计
+        self.__router = getEndpointRouter()
+    def __getModel(self,endpoint:LLMEndpoint,stream:bool = False):
+        poolKey = (endpoint.modelName, endpoint.baseURL, stream)
+        model = MODEL_POOL.get(poolKey)
+        if model is not None:
+            return model
+        with MODEL_POOL_LOCK:
+            if poolKey not in MODEL_POOL:
+                MODEL_POOL[poolKey] = self.__buildModel(endpoint,stream)
+                self.logger.info(f"Create pooled LLM client. Model:{endpoint.modelName},BaseURL:{endpoint.baseURL},Stream:{stream}")
+            return MODEL_POOL[poolKey]
+    #创建带连接池的客户端，超时由http客户端负责
+    def __buildModel(self,endpoint:LLMEndpoint,stream:bool):
+        timeout = httpx.Timeout(self.__httpConfig.get("timeout", 300),connect=self.__httpConfig.get("connect_timeout", 10))
+        limits = httpx.Limits(max_connections=self.__httpConfig.get("max_connections", 100),
+                              max_keepalive_connections=self.__httpConfig.get("max_keepalive_connections", 20),
+                              keepalive_expiry=self.__httpConfig.get("keepalive_expiry", 60))
+        return ChatOpenAI(model_name=endpoint.modelName,
+                          openai_api_key=endpoint.apiKey,
+                          openai_api_base=endpoint.baseURL,
+                          streaming=stream,
+                          request_timeout=timeout,
+                          max_retries=0, #重试由ModelFactory自己控制
+                          http_client=httpx.Client(limits=limits,timeout=timeout),
+                          http_async_client=httpx.AsyncClient(limits=limits,timeout=timeout))
+    #缓存key，解码参数不同的请求不共用缓存；各接口提供的是同一个逻辑模型，key不区分接口
+    def __cacheKey(self,query:str) -> str:
+        model = self.__getModel(self.__router.endpoints[0])
+        decodeParams = {"temperature": model.temperature, "top_p": model.top_p, "max_tokens": model.max_tokens}
+        return LLMResponseCache.buildKey(self.__modelName, query, decodeParams)
     #调用模型
     def invoke(self,query:str,stream:bool=False):
-        model = self.__getModel(stream)
+        endpoint = self.__router.pick()
         if stream:
             # 流式输出
-            tokenIterator = model.stream(query)
+            tokenIterator = self.__limitedStream(endpoint,query)
             return tokenIterator
         else:
-            return model.invoke(query)
-    #超时自动重新调用
-    def invokeRetry(self,query:str,stream:bool=False,maxRuntime:int = 300,maxRetryCount:int = 3,restTime:int = 20):
-        model = self.__getModel(stream)
-        def invokeWithRuntime():
-            return model.invoke(query)
+            return self.__timedInvoke(endpoint,query,None,REQUEST_DEADLINE.get())
+    #超时自动重新调用，重试策略见RetryPolicy，总耗时不超过时间预算与gRPC请求的deadline
+    def invokeRetry(self,query:str,stream:bool=False,retryPolicy:Optional[RetryPolicy] = None):
         if stream:
             # 流式输出
-            tokenIterator = model.stream(query)
+            tokenIterator = self.__limitedStream(self.__router.pick(),query)
             self.logger.info(f"Calling the stream LLM API successfully.")
             return tokenIterator
         else:
-            retryCount = 0
-            while retryCount < maxRetryCount:
-                try:
-                    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-                        future = executor.submit(invokeWithRuntime)
-                        # 超时抛异常TimeoutError
-                        output = future.result(timeout=maxRuntime)
-                        self.logger.info(f"Calling the LLM API successfully.Output: {output}")
-                        return output
-                except concurrent.futures.TimeoutError:
-                    retryCount += 1
-                    self.logger.warning(f"LLM call timed out!")
-                    time.sleep(restTime)
-                except Exception as e:
-                    # 捕获其他异常
-                    retryCount += 1
-                    self.logger.warning(f"LLM call failed:{str(e)}")
-                    time.sleep(restTime)
-            self.logger.error(f"Reach max retry time!")
-            raise Exception(f"Reach max retry time!")
-    #返回json
-    def invokeJson(self,query:str,maxRuntime:int = 300,maxRetryCount:int = 3,restTime:int = 20) -> Dict:
-        model = self.__getModel()
-        def invokeWithRuntime():
-            return model.invoke(query)
-        retryCount = 0
-        while retryCount < maxRetryCount:
+            return self.__retryCall(query,retryPolicy or self.__retryPolicy,lambda output: output)
+    #返回json，cacheTag不为空时按该用途的TTL缓存结果，依赖工具结果等不能复用的调用不传即可
+    def invokeJson(self,query:str,retryPolicy:Optional[RetryPolicy] = None,cacheTag:Optional[str] = None) -> Dict:
+        cacheKey = self.__cacheKey(query)
+        cacheTag = cacheTag if self.__cache.enable else None
+        if cacheTag:
+            jsonOutput = self.__cache.get(cacheKey)
+            if jsonOutput is not None:
+                self.logger.info(f"LLM cache hit. Purpose:{cacheTag}")
+                return jsonOutput
+        #并发的相同请求合并为一次LLM调用，等待时间同样受请求deadline约束
+        return LLM_SINGLE_FLIGHT.do(cacheKey,self.__loadJson,query,retryPolicy or self.__retryPolicy,cacheKey,cacheTag,
+                                    timeout=self.__remainingTime())
+    def __loadJson(self,query:str,retryPolicy:RetryPolicy,cacheKey:str,cacheTag:Optional[str]) -> Dict:
+        jsonOutput = self.__retryCall(query,retryPolicy,self.__parseJson)
+        if cacheTag:
+            self.__cache.set(cacheKey,cacheTag,jsonOutput)
+        return jsonOutput
+    #按重试策略调用，parse失败同样触发重试；重试优先发往还没有尝试过的接口
+    def __retryCall(self,query:str,retryPolicy:RetryPolicy,parse):
+        deadline = retryPolicy.deadline()
+        tried: Set[LLMEndpoint] = set()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                output = self.__hedgedInvoke(query,retryPolicy,deadline,tried)
+                result = parse(output)
+                self.logger.info(f"Calling the LLM API successfully.Output: {output}")
+                return result
+            except Exception as e:
+                delay = self.__nextDelay(retryPolicy,e,attempt,deadline)
+                time.sleep(delay)
+    #流式返回json，每个顶层字段完整后立即回调onField(字段名,值)，回调返回True时停止读取，返回已解析的字段
+    #onField只在真正请求上游时被调用，命中缓存或合并到其他流式请求时直接返回结果；提前停止的结果不写缓存；流式请求不做对冲
+    def invokeJsonStream(self,query:str,onField:Optional[Callable[[str, Any], bool]] = None,
+                         retryPolicy:Optional[RetryPolicy] = None,cacheTag:Optional[str] = None) -> Dict:
+        cacheKey = self.__cacheKey(query)
+        cacheTag = cacheTag if self.__cache.enable else None
+        if cacheTag:
+            jsonOutput = self.__cache.get(cacheKey)
+            if jsonOutput is not None:
+                self.logger.info(f"LLM cache hit. Purpose:{cacheTag}")
+                return jsonOutput
+        return LLM_SINGLE_FLIGHT.do(STREAM_FLIGHT_PREFIX + cacheKey,self.__loadJsonStream,query,onField,retryPolicy or self.__retryPolicy,cacheKey,cacheTag,
+                                    timeout=self.__remainingTime())
+    def __loadJsonStream(self,query:str,onField,retryPolicy:RetryPolicy,cacheKey:str,cacheTag:Optional[str]) -> Dict:
+        deadline = retryPolicy.deadline()
+        tried: Set[LLMEndpoint] = set()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                endpoint = self.__router.pick(exclude=tried)
+                tried.add(endpoint)
+                jsonOutput, stoppedEarly = self.__streamJson(endpoint,query,onField,retryPolicy,deadline)
+                break
+            except Exception as e:
+                delay = self.__nextDelay(retryPolicy,e,attempt,deadline)
+                time.sleep(delay)
+        #只缓存完整的结果，提前停止时缺少后续字段
+        if cacheTag and not stoppedEarly:
+            self.__cache.set(cacheKey,cacheTag,jsonOutput)
+        return jsonOutput
+    #返回(解析结果,是否提前停止)
+    def __streamJson(self,endpoint:LLMEndpoint,query:str,onField,retryPolicy:RetryPolicy,deadline:float) -> Tuple[Dict, bool]:
+        model = self.__getModel(endpoint,stream=True)
+        parser = IncrementalJsonParser()
+        chunks = []
+        stoppedEarly = False
+        with endpoint.rateLimiter.acquire(query,deadline):
+            start = time.monotonic()
+            tokenIterator = model.stream(query,timeout=retryPolicy.attemptTimeoutFor(deadline))
+            try:
+                for token in tokenIterator:
+                    chunks.append(token.content)
+                    stoppedEarly = self.__dispatchFields(parser,token.content,onField)
+                    #格式错误时继续读完，留给repair_json兜底
+                    if stoppedEarly or parser.done:
+                        break
+            except Exception:
+                self.__router.recordFailure(endpoint)
+                raise
+            finally:
+                #提前结束时关闭流，上游停止生成
+                tokenIterator.close()
+        self.__router.recordSuccess(endpoint,time.monotonic() - start)
+        return self.__finishStreamJson(parser,"".join(chunks),stoppedEarly), stoppedEarly
+    #主接口超过对冲等待时间未返回时，向另一个接口发送相同请求，取先成功的结果
+    def __hedgedInvoke(self,query:str,retryPolicy:RetryPolicy,deadline:float,tried:Set[LLMEndpoint]):
+        primary = self.__router.pick(exclude=tried)
+        tried.add(primary)
+        hedgeDelay = self.__router.hedgeDelay(primary)
+        if hedgeDelay is None:
+            return self.__timedInvoke(primary,query,retryPolicy,deadline)
+        executor = self.__getHedgeExecutor()
+        primaryFuture = executor.submit(contextvars.copy_context().run,self.__timedInvoke,primary,query,retryPolicy,deadline)
+        try:
+            return primaryFuture.result(timeout=min(hedgeDelay,max(deadline - time.monotonic(),0)))
+        except FutureTimeoutError:
+            pass
+        backup = self.__router.pick(exclude={primary})
+        if backup is primary:
+            return primaryFuture.result()
+        tried.add(backup)
+        self.logger.info(f"LLM endpoint {primary.name} slower than {hedgeDelay:.2f}s, hedge to {backup.name}")
+        backupFuture = executor.submit(contextvars.copy_context().run,self.__timedInvoke,backup,query,retryPolicy,deadline)
+        pending = {primaryFuture: primary, backupFuture: backup}
+        error = None
+        while pending:
+            done, _ = wait(pending,return_when=FIRST_COMPLETED)
+            for future in done:
+                endpoint = pending.pop(future)
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                #同步的http请求无法中断，落后的请求在后台完成后释放连接，其延迟照常计入统计
+                for loser in pending:
+                    loser.cancel()
+                self.__router.recordHedge(endpoint is backup)
+                return future.result()
+        raise error
+    #单次调用，先经过该接口的限流，再记录接口的延迟与健康状态
+    def __timedInvoke(self,endpoint:LLMEndpoint,query:str,retryPolicy:Optional[RetryPolicy],deadline:Optional[float]):
+        model = self.__getModel(endpoint)
+        with endpoint.rateLimiter.acquire(query,deadline):
+            start = time.monotonic()
+            try:
+                # 单次超时由http客户端抛出APITimeoutError
+                if retryPolicy is None:
+                    output = model.invoke(query)
+                else:
+                    output = model.invoke(query,timeout=retryPolicy.attemptTimeoutFor(deadline))
+            except LLMDeadlineExceeded:
+                raise
+            except Exception:
+                self.__router.recordFailure(endpoint)
+                raise
+        self.__router.recordSuccess(endpoint,time.monotonic() - start)
+        return output
+    #流式调用在整个输出期间占用一个并发名额
+    def __limitedStream(self,endpoint:LLMEndpoint,query:str):
+        model = self.__getModel(endpoint,stream=True)
+        with endpoint.rateLimiter.acquire(query,REQUEST_DEADLINE.get()):
+            try:
+                for token in model.stream(query):
+                    yield token
+            except Exception:
+                self.__router.recordFailure(endpoint)
+                raise
+    #异步调用模型，供grpc.aio服务使用
+    async def ainvoke(self,query:str,stream:bool=False):
+        endpoint = self.__router.pick()
+        if stream:
+            # 流式输出，返回异步token迭代器
+            tokenIterator = self.__alimitedStream(endpoint,query)
+            return tokenIterator
+        else:
+            return await self.__atimedInvoke(endpoint,query,None,REQUEST_DEADLINE.get())
+    #异步超时自动重新调用
+    async def ainvokeRetry(self,query:str,stream:bool=False,retryPolicy:Optional[RetryPolicy] = None):
+        if stream:
+            # 流式输出
+            tokenIterator = self.__alimitedStream(self.__router.pick(),query)
+            self.logger.info(f"Calling the stream LLM API successfully.")
+            return tokenIterator
+        return await self.__aretryCall(query,retryPolicy or self.__retryPolicy,lambda output: output)
+    #异步返回json，SQLite缓存的读写放到线程池
+    async def ainvokeJson(self,query:str,retryPolicy:Optional[RetryPolicy] = None,cacheTag:Optional[str] = None) -> Dict:
+        cacheKey = self.__cacheKey(query)
+        cacheTag = cacheTag if self.__cache.enable else None
+        if cacheTag:
+            jsonOutput = await asyncio.to_thread(self.__cache.get,cacheKey)
+            if jsonOutput is not None:
+                self.logger.info(f"LLM cache hit. Purpose:{cacheTag}")
+                return jsonOutput
+        #并发的相同请求合并为一次LLM调用
+        return await LLM_SINGLE_FLIGHT.ado(cacheKey,self.__aloadJson,query,retryPolicy or self.__retryPolicy,cacheKey,cacheTag,
+                                           timeout=self.__remainingTime())
+    async def __aloadJson(self,query:str,retryPolicy:RetryPolicy,cacheKey:str,cacheTag:Optional[str]) -> Dict:
+        jsonOutput = await self.__aretryCall(query,retryPolicy,self.__parseJson)
+        if cacheTag:
+            await asyncio.to_thread(self.__cache.set,cacheKey,cacheTag,jsonOutput)
+        return jsonOutput
+    async def __aretryCall(self,query:str,retryPolicy:RetryPolicy,parse):
+        deadline = retryPolicy.deadline()
+        tried: Set[LLMEndpoint] = set()
+        attempt = 0
+        while True:
+            attempt += 1
             try:
-                with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-                    future = executor.submit(invokeWithRuntime)
-                    # 超时抛异常TimeoutError
-                    output = future.result(timeout=maxRuntime)
-                    jsonRepair = repair_json(output.content,ensure_ascii=False)
-                    if len(jsonRepair.strip()) == 0:
-                        self.logger.warning(f"Json parsing failed")
-                        raise Exception(f"Json parsing failed")
-                    jsonOutput = json.loads(jsonRepair)
-                    self.logger.info(f"Calling the LLM API successfully.Output: {output}")
-                    return jsonOutput
-            except concurrent.futures.TimeoutError:
-                retryCount += 1
-                self.logger.warning(f"LLM call timed out!")
-                time.sleep(restTime)
+                output = await self.__ahedgedInvoke(query,retryPolicy,deadline,tried)
+                result = parse(output)
+                self.logger.info(f"Calling the LLM API successfully.Output: {output}")
+                return result
             except Exception as e:
-                # 捕获其他异常
-                retryCount += 1
-                self.logger.warning(f"LLM call failed:{str(e)}")
-                time.sleep(restTime)
-        self.logger.error(f"Reach max retry time!")
-        raise Exception(f"Reach max retry time!")
+                delay = self.__nextDelay(retryPolicy,e,attempt,deadline)
+                await asyncio.sleep(delay)
+    #异步流式返回json，onField为同步回调
+    async def ainvokeJsonStream(self,query:str,onField:Optional[Callable[[str, Any], bool]] = None,
+                                retryPolicy:Optional[RetryPolicy] = None,cacheTag:Optional[str] = None) -> Dict:
+        cacheKey = self.__cacheKey(query)
+        cacheTag = cacheTag if self.__cache.enable else None
+        if cacheTag:
+            jsonOutput = await asyncio.to_thread(self.__cache.get,cacheKey)
+            if jsonOutput is not None:
+                self.logger.info(f"LLM cache hit. Purpose:{cacheTag}")
+                return jsonOutput
+        return await LLM_SINGLE_FLIGHT.ado(STREAM_FLIGHT_PREFIX + cacheKey,self.__aloadJsonStream,query,onField,retryPolicy or self.__retryPolicy,cacheKey,cacheTag,
+                                           timeout=self.__remainingTime())
+    async def __aloadJsonStream(self,query:str,onField,retryPolicy:RetryPolicy,cacheKey:str,cacheTag:Optional[str]) -> Dict:
+        deadline = retryPolicy.deadline()
+        tried: Set[LLMEndpoint] = set()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                endpoint = self.__router.pick(exclude=tried)
+                tried.add(endpoint)
+                jsonOutput, stoppedEarly = await self.__astreamJson(endpoint,query,onField,retryPolicy,deadline)
+                break
+            except Exception as e:
+                delay = self.__nextDelay(retryPolicy,e,attempt,deadline)
+                await asyncio.sleep(delay)
+        if cacheTag and not stoppedEarly:
+            await asyncio.to_thread(self.__cache.set,cacheKey,cacheTag,jsonOutput)
+        return jsonOutput
+    async def __astreamJson(self,endpoint:LLMEndpoint,query:str,onField,retryPolicy:RetryPolicy,deadline:float) -> Tuple[Dict, bool]:
+        model = self.__getModel(endpoint,stream=True)
+        parser = IncrementalJsonParser()
+        chunks = []
+        stoppedEarly = False
+        async with endpoint.rateLimiter.aacquire(query,deadline):
+            start = time.monotonic()
+            tokenIterator = model.astream(query,timeout=retryPolicy.attemptTimeoutFor(deadline))
+            try:
+                async for token in tokenIterator:
+                    chunks.append(token.content)
+                    stoppedEarly = self.__dispatchFields(parser,token.content,onField)
+                    if stoppedEarly or parser.done:
+                        break
+            except asyncio.CancelledError:
+                self.__router.recordCancelled(endpoint,time.monotonic() - start)
+                raise
+            except Exception:
+                self.__router.recordFailure(endpoint)
+                raise
+            finally:
+                await tokenIterator.aclose()
+        self.__router.recordSuccess(endpoint,time.monotonic() - start)
+        return self.__finishStreamJson(parser,"".join(chunks),stoppedEarly), stoppedEarly
+    #异步对冲，落后的请求直接取消
+    async def __ahedgedInvoke(self,query:str,retryPolicy:RetryPolicy,deadline:float,tried:Set[LLMEndpoint]):
+        primary = self.__router.pick(exclude=tried)
+        tried.add(primary)
+        hedgeDelay = self.__router.hedgeDelay(primary)
+        if hedgeDelay is None:
+            return await self.__atimedInvoke(primary,query,retryPolicy,deadline)
+        pending = {asyncio.ensure_future(self.__atimedInvoke(primary,query,retryPolicy,deadline)): primary}
+        hedged = False
+        try:
+            done, _ = await asyncio.wait(pending,timeout=min(hedgeDelay,max(deadline - time.monotonic(),0)))
+            if not done:
+                backup = self.__router.pick(exclude={primary})
+                if backup is not primary:
+                    tried.add(backup)
+                    hedged = True
+                    self.logger.info(f"LLM endpoint {primary.name} slower than {hedgeDelay:.2f}s, hedge to {backup.name}")
+                    pending[asyncio.ensure_future(self.__atimedInvoke(backup,query,retryPolicy,deadline))] = backup
+            error = None
+            while pending:
+                done, _ = await asyncio.wait(pending,return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    endpoint = pending.pop(task)
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    if hedged:
+                        self.__router.recordHedge(endpoint is not primary)
+                    return task.result()
+            raise error
+        finally:
+            #返回、出错或调用方被取消时，取消还在进行的请求
+            for task in pending:
+                task.cancel()
+    async def __atimedInvoke(self,endpoint:LLMEndpoint,query:str,retryPolicy:Optional[RetryPolicy],deadline:Optional[float]):
+        model = self.__getModel(endpoint)
+        async with endpoint.rateLimiter.aacquire(query,deadline):
+            start = time.monotonic()
+            try:
+                if retryPolicy is None:
+                    output = await model.ainvoke(query)
+                else:
+                    output = await model.ainvoke(query,timeout=retryPolicy.attemptTimeoutFor(deadline))
+            except asyncio.CancelledError:
+                self.__router.recordCancelled(endpoint,time.monotonic() - start)
+                raise
+            except LLMDeadlineExceeded:
+                raise
+            except Exception:
+                self.__router.recordFailure(endpoint)
+                raise
+        self.__router.recordSuccess(endpoint,time.monotonic() - start)
+        return output
+    async def __alimitedStream(self,endpoint:LLMEndpoint,query:str):
+        model = self.__getModel(endpoint,stream=True)
+        async with endpoint.rateLimiter.aacquire(query,REQUEST_DEADLINE.get()):
+            try:
+                async for token in model.astream(query):
+                    yield token
+            except Exception:
+                self.__router.recordFailure(endpoint)
+                raise
+    #解析LLM输出的json
+    def __parseJson(self,output) -> Dict:
+        jsonRepair = repair_json(output.content,ensure_ascii=False)
+        if len(jsonRepair.strip()) == 0:
+            self.logger.warning(f"Json parsing failed")
+            raise JsonParseError(f"Json parsing failed")
+        return json.loads(jsonRepair)
+    #解析新到的文本并回调完整的字段，返回调用方是否要求停止读取
+    def __dispatchFields(self,parser:IncrementalJsonParser,chunk:str,onField) -> bool:
+        for key, value in parser.feed(chunk):
+            if onField is not None and onField(key,value):
+                self.logger.info(f"Stop reading LLM stream early at field {key}")
+                return True
+        return False
+    #流式解析的结果，对象不完整或格式错误时对完整文本做repair_json
+    def __finishStreamJson(self,parser:IncrementalJsonParser,output:str,stoppedEarly:bool) -> Dict:
+        if parser.done or stoppedEarly:
+            self.logger.info(f"Calling the LLM API successfully.Output: {parser.fields}")
+            return dict(parser.fields)
+        jsonRepair = repair_json(output,ensure_ascii=False)
+        if len(jsonRepair.strip()) == 0:
+            self.logger.warning(f"Json parsing failed")
+            raise JsonParseError(f"Json parsing failed")
+        self.logger.info(f"Streaming json parse incomplete, fallback to repair_json")
+        return json.loads(jsonRepair)
+    #计算下一次重试的等待时间，不可重试时直接抛出
+    def __nextDelay(self,retryPolicy:RetryPolicy,error:Exception,attempt:int,deadline:float) -> float:
+        delay = retryPolicy.nextDelay(error,attempt,deadline)
+        if delay is None:
+            self.logger.error(f"LLM call failed after {attempt} attempts:{str(error)}")
+            if retryPolicy.classify(error) == RetryPolicy.FATAL:
+                raise error
+            if time.monotonic() >= deadline:
+                raise LLMDeadlineExceeded("LLM call deadline exceeded") from error
+            raise Exception(f"Reach max retry time!") from error
+        self.logger.warning(f"LLM call failed:{str(error)}. Retry after {delay:.2f}s")
+        return delay
+    def __getHedgeExecutor(self) -> ThreadPoolExecutor:
+        global HEDGE_EXECUTOR
+        if HEDGE_EXECUTOR is None:
+            with HEDGE_EXECUTOR_LOCK:
+                if HEDGE_EXECUTOR is None:
+                    HEDGE_EXECUTOR = ThreadPoolExecutor(max_workers=self.__hedgeWorkers,thread_name_prefix="llmHedge")
+        return HEDGE_EXECUTOR
+    #各接口限流器的请求数与排队时间统计
+    def rateLimitStats(self) -> Dict:
+        return {endpoint.name: endpoint.rateLimiter.stats() for endpoint in self.__router.endpoints}
+    #对冲次数与各接口的延迟、健康状态
+    def routeStats(self) -> Dict:
+        return self.__router.stats()
+    #当前请求剩余的时间，没有deadline时返回None
+    def __remainingTime(self) -> Optional[float]:
+        requestDeadline = REQUEST_DEADLINE.get()
+        return None if requestDeadline is None else max(requestDeadline - time.monotonic(), 0)
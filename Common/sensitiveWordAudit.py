@@ -0,0 +1,60 @@
+"""历史对话敏感词审计：用当前的敏感词表批量扫描chatHistory_db中的用户输入与输出，敏感词表更新后重新审核历史记录
+用法: python -m Common.sensitiveWordAudit [--tables intentDetection.userInput,decisionAgent.finalAnswer] [--batch-size 1000] [--since-id 0]"""
+import argparse
+import time
+from typing import Dict, List, Tuple
+from sqlalchemy import MetaData, Table, select
+from Common.DBCommon.sqlLiteCom import initSqlite, getDbSession
+from Common.sensitiveWordStore import buildSensitiveWordAutomaton, loadSensitiveWords
+from Common.utils import initLogger
+
+#默认审计的表与字段
+DEFAULT_COLUMNS = "intentDetection.userInput,intentRecognition.userInput,decisionAgent.userInput,decisionAgent.finalAnswer"
+HISTORY_DB = "chatHistory_db"
+
+
+#按id分页读取一个字段，每页一次批量匹配
+def auditColumn(acAutomaton,tableName:str,columnName:str,batchSize:int,sinceId:int) -> Tuple[int, List[Tuple[int, List]]]:
+    sqliteSession = next(getDbSession(HISTORY_DB))
+    table = Table(tableName, MetaData(), autoload_with=sqliteSession.bind)
+    scanned = 0
+    flagged = []
+    lastId = sinceId
+    try:
+        while True:
+            rows = sqliteSession.execute(select(table.c.id, table.c[columnName]).where(table.c.id > lastId)
+                                         .order_by(table.c.id).limit(batchSize)).all()
+            if not rows:
+                break
+            lastId = rows[-1][0]
+            scanned += len(rows)
+            for (rowId, _), hits in zip(rows, acAutomaton.match_batch([text or "" for _, text in rows])):
+                if hits:
+                    flagged.append((rowId, hits))
+    finally:
+        sqliteSession.close()
+    return scanned, flagged
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-moderate chat history with the current sensitive word table")
+    parser.add_argument("--tables", default=DEFAULT_COLUMNS, help="comma separated table.column")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--since-id", type=int, default=0, help="only audit rows with a larger id")
+    args = parser.parse_args()
+    logger = initLogger(__name__)
+    initSqlite()
+    acAutomaton = buildSensitiveWordAutomaton(loadSensitiveWords())
+    summary: Dict[str, Tuple[int, int]] = {}
+    for target in args.tables.split(","):
+        tableName, columnName = target.strip().split(".")
+        start = time.monotonic()
+        scanned, flagged = auditColumn(acAutomaton, tableName, columnName, args.batch_size, args.since_id)
+        for rowId, hits in flagged:
+            print(f"{tableName}.{columnName} id={rowId} " + ", ".join(f"{word}@{begin}-{end}" for begin, end, word in hits))
+        summary[target] = (scanned, len(flagged))
+        logger.info(f"Sensitive word audit. Column:{target},Scanned:{scanned},Flagged:{len(flagged)},Cost:{time.monotonic() - start:.2f}s")
+    for target, (scanned, flaggedCount) in summary.items():
+        print(f"{target}: scanned {scanned}, flagged {flaggedCount}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import threading
+import time
+from typing import List, Optional, Tuple
+from sqlalchemy import MetaData, Table, select
+from Common.DBCommon.sqlLiteCom import getDbSession, getTableSignature
+from Common.utils import ACAutomaton, ArrayACAutomaton, ACStreamMatcher, getAbsolutePath, loadYmlFile, initLogger
+
+#敏感词所在的数据库与表
+SENSITIVE_WORD_DB = "sensitiveWord_db"
+SENSITIVE_WORD_TABLE = "sensitiveWords"
+#可选的AC自动机实现，array为数组存储的实现
+AC_ENGINES = {"array": ArrayACAutomaton, "node": ACAutomaton}
+
+
+#读取全部敏感词
+def loadSensitiveWords() -> List[str]:
+    sqliteSession = next(getDbSession(SENSITIVE_WORD_DB))
+    engine = sqliteSession.bind
+    metadata = MetaData()
+    target_table = Table(
+        SENSITIVE_WORD_TABLE,  # 表名
+        metadata,
+        autoload_with=engine  # 自动从引擎加载表结构
+    )
+    query = select(target_table.c.word)
+    result = sqliteSession.execute(query)
+    wordList = result.scalars().all()
+    return [str(word) if word is not None else "" for word in wordList]
+
+#用敏感词构建AC自动机，构建完成后只读，可以在多个线程间共享
+def buildSensitiveWordAutomaton(sensitiveWords: List[str], engine: str = "array") -> ACAutomaton | ArrayACAutomaton:
+    acAutomaton = AC_ENGINES[engine]()
+    for word in sensitiveWords:
+        acAutomaton.add_sensitive_word(word)
+    acAutomaton.build_fail_pointer()
+    return acAutomaton
+
+
+class SensitiveWordStore:
+    """进程级别的敏感词AC自动机，启动时构建一次；后台线程定期检查敏感词表的指纹，
+    有变化时在后台重建后整体替换，正在匹配的请求继续使用旧自动机。"""
+    def __init__(self, reloadInterval: float = 10, engine: str = "array"):
+        self.logger = initLogger(__name__)
+        self.__engine = engine
+        self.__automaton: Optional[ACAutomaton | ArrayACAutomaton] = None
+        self.__signature: Optional[Tuple[int, int, int]] = None
+        self.__reloadLock = threading.Lock()
+        try:
+            self.reload()
+        except Exception as e:
+            self.logger.error(f"Search sensitive words Failed! \n {e}")
+        if reloadInterval > 0:
+            threading.Thread(target=self.__watch, args=(reloadInterval,), name="sensitiveWordWatcher", daemon=True).start()
+
+    def get(self) -> Optional[ACAutomaton | ArrayACAutomaton]:
+        return self.__automaton
+
+    def streamMatcher(self) -> Optional[ACStreamMatcher]:
+        """流式输出使用的分段匹配器，绑定当前的自动机，中途发生热加载也不影响已开始的匹配"""
+        acAutomaton = self.__automaton
+        return ACStreamMatcher(acAutomaton) if acAutomaton is not None else None
+
+    def reload(self, force: bool = False) -> bool:
+        """敏感词表的指纹变化时重建自动机，返回是否发生了替换"""
+        with self.__reloadLock:
+            signature = getTableSignature(SENSITIVE_WORD_DB, SENSITIVE_WORD_TABLE)
+            if not force and self.__automaton is not None and signature == self.__signature:
+                return False
+            start = time.monotonic()
+            sensitiveWords = loadSensitiveWords()
+            acAutomaton = buildSensitiveWordAutomaton(sensitiveWords, self.__engine)
+            #引用赋值是原子的，之后的请求使用新自动机
+            self.__automaton = acAutomaton
+            self.__signature = signature
+        self.logger.info(f"Sensitive word automaton built. Engine:{self.__engine},Words:{len(sensitiveWords)},Cost:{time.monotonic() - start:.3f}s")
+        return True
+
+    def __watch(self, reloadInterval: float):
+        while True:
+            time.sleep(reloadInterval)
+            try:
+                self.reload()
+            except Exception as e:
+                self.logger.error(f"Sensitive word reload failed! \n {e}")
+
+SENSITIVE_WORD_STORE: Optional[SensitiveWordStore] = None
+SENSITIVE_WORD_STORE_LOCK = threading.Lock()
+
+#获取进程级别的敏感词自动机
+def getSensitiveWordStore() -> SensitiveWordStore:
+    global SENSITIVE_WORD_STORE
+    if SENSITIVE_WORD_STORE is None:
+        with SENSITIVE_WORD_STORE_LOCK:
+            if SENSITIVE_WORD_STORE is None:
+                config = loadYmlFile(getAbsolutePath("../Config/config.yml")).get("sensitive_word", {})
+                SENSITIVE_WORD_STORE = SensitiveWordStore(reloadInterval=config.get("reload_interval", 10),
+                                                          engine=config.get("engine", "array"))
+    return SENSITIVE_WORD_STORE
@@ -0,0 +1,56 @@
+import json
+import threading
+import time
+from typing import Dict, Any, Callable, Optional
+from Common.utils import getAbsolutePath, loadYmlFile, initLogger
+
+#各组件注册的统计函数，name -> 返回可json序列化结果的函数
+STATS_PROVIDERS: Dict[str, Callable[[], Any]] = {}
+STATS_PROVIDERS_LOCK = threading.Lock()
+
+
+#注册统计函数，同名的后注册覆盖先注册
+def registerStats(name:str,provider:Callable[[], Any]):
+    with STATS_PROVIDERS_LOCK:
+        STATS_PROVIDERS[name] = provider
+
+#收集所有已注册组件的统计，单个组件出错不影响其他组件
+def collectStats() -> Dict[str, Any]:
+    logger = initLogger(__name__)
+    with STATS_PROVIDERS_LOCK:
+        providers = list(STATS_PROVIDERS.items())
+    stats = {}
+    for name, provider in providers:
+        try:
+            stats[name] = provider()
+        except Exception as e:
+            logger.error(f"Collect stats of {name} failed! \n {e}")
+    return stats
+
+
+class StatsReporter:
+    """后台线程每log_interval秒把collectStats的结果写入日志，用于线上观察限流、缓存、熔断等组件的状态"""
+    def __init__(self,logInterval:float = 60):
+        self.logger = initLogger(__name__)
+        self.__logInterval = logInterval
+        threading.Thread(target=self.__report, name="statsReporter", daemon=True).start()
+
+    def __report(self):
+        while True:
+            time.sleep(self.__logInterval)
+            for name, stats in collectStats().items():
+                self.logger.info(f"Runtime stats. {name}:{json.dumps(stats, ensure_ascii=False, default=str)}")
+
+STATS_REPORTER: Optional[StatsReporter] = None
+STATS_REPORTER_LOCK = threading.Lock()
+
+#启动进程级别的统计日志线程，log_interval为0时不启动
+def startStatsReporter() -> Optional[StatsReporter]:
+    global STATS_REPORTER
+    if STATS_REPORTER is None:
+        with STATS_REPORTER_LOCK:
+            if STATS_REPORTER is None:
+                logInterval = loadYmlFile(getAbsolutePath("../Config/config.yml")).get("stats", {}).get("log_interval", 60)
+                if logInterval > 0:
+                    STATS_REPORTER = StatsReporter(logInterval)
+    return STATS_REPORTER
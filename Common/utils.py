@@ -2,13 +2,13 @@ import inspect
 import logging
 import os
 import sys
+from array import array
 from collections import deque
 from datetime import datetime
 import yaml
 import colorlog
 import numpy as np
 from huggingface_hub import snapshot_download
-from sentence_transformers import SentenceTransformer
 
 
 def getAbsolutePath(relativePath:str, base_dir=None) -> str:
@@ -111,12 +111,24 @@ def normalizeVectors(vectors):
     norms = np.linalg.norm(vectors, axis=1, keepdims=True)
     return vectors / np.maximum(norms, 1e-12)
 
+#把字典list按列对齐打印成表格，列名取第一行的key，浮点数按floatFormat格式化；用于Benchmark脚本输出结果
+def printTable(rows, floatFormat=".2f"):
+    columns = list(rows[0].keys())
+    cells = [[format(row[column], floatFormat) if isinstance(row[column], float) else str(row[column]) for column in columns]
+             for row in rows]
+    widths = [max(len(column), *(len(cell[index]) for cell in cells)) for index, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for cell in cells:
+        print("  ".join(text.ljust(width) for text, width in zip(cell, widths)))
+
+#向量化，返回numpy数组；模型由进程级别的EmbeddingEngine加载一次，并发请求合并成批
 def getEmbedding(content):
     logger = initLogger(__name__)
     try:
-        model = SentenceTransformer(getAbsolutePath("../Rag/EmbeddingModel/"))
-        embeddings = model.encode(content)
-        return embeddings.tolist(), True
+        #延迟导入，避免与Rag.embeddingEngine循环导入
+        from Rag.embeddingEngine import getEmbeddingEngine
+        embeddings = getEmbeddingEngine().encode(content)
+        return embeddings, True
     except Exception as e:
         logger.error(e)
         return "", False
@@ -207,5 +219,202 @@ class ACAutomaton:
 
         return list(matched_words)
 
+    def scan(self, text, state=None, offset=0):
+        """
+        从state开始扫描文本，用于分段匹配
+        :param state: 上一段结束时的节点，None表示从根节点开始
+        :param offset: 本段第一个字符在完整文本中的位置
+        :return: (结束时的节点, [(起始位置, 结束位置, 敏感词)])，结束位置不包含
+        """
+        current_node = state or self.root
+        hits = []
+        for index, char in enumerate(text):
+            while char not in current_node.children and current_node != self.root:
+                current_node = current_node.fail
+            current_node = current_node.children[char] if char in current_node.children else self.root
+            temp_node = current_node
+            while temp_node != self.root:
+                if temp_node.is_end:
+                    end = offset + index + 1
+                    hits.append((end - len(temp_node.word), end, temp_node.word))
+                temp_node = temp_node.fail
+        return current_node, hits
+
+    def match_batch(self, texts):
+        """
+        批量匹配，返回每条文本的[(起始位置, 结束位置, 敏感词)]
+        """
+        return [self.scan(text)[1] for text in texts]
+
+
+class ArrayACAutomaton:
+    """数组存储的AC自动机，接口与ACAutomaton一致。
+    状态为整数id，失败指针与输出存放在紧凑的整数数组中，不再为每个字符创建节点对象；
+    构建时沿失败指针预先计算完整的goto转移，匹配时每个字符最多查两次字典，不再沿失败链回退。
+    中文字符集很大，转移表按根节点压缩：每个状态只保存与根节点转移不同的字符，其余字符按根节点的转移处理。
+    输出链接指向失败链上最近的敏感词结尾状态，匹配时只记录有输出的状态，最后统一收集敏感词。"""
+    __slots__ = ("transitions", "fail", "outputLink", "wordIds", "hasOutput", "words")
+
+    def __init__(self):
+        self.transitions = [{}]  # 每个状态的转移：字符 -> 状态id，0为根节点；构建前只有子状态，构建后为压缩的goto表
+        self.fail = array("i", [0])  # 失败指针
+        self.outputLink = array("i", [0])  # 失败链上最近的敏感词结尾状态，0表示没有
+        self.wordIds = array("i", [-1])  # 状态对应的敏感词在words中的下标，-1表示不是结尾
+        self.hasOutput = bytearray(1)  # 该状态或其输出链接上有敏感词
+        self.words = []
+
+    def add_sensitive_word(self, word):
+        """向AC自动机中添加敏感词"""
+        if not word:
+            return
+        transitions = self.transitions
+        state = 0
+        for char in word:
+            nextState = transitions[state].get(char)
+            if nextState is None:
+                nextState = len(transitions)
+                transitions[state][char] = nextState
+                transitions.append({})
+                self.fail.append(0)
+                self.outputLink.append(0)
+                self.wordIds.append(-1)
+                self.hasOutput.append(0)
+            state = nextState
+        if self.wordIds[state] < 0:
+            self.wordIds[state] = len(self.words)
+            self.words.append(word)
+
+    def build_fail_pointer(self):
+        """按BFS顺序计算失败指针、输出链接与goto转移，只能在添加完全部敏感词后调用一次"""
+        transitions = self.transitions
+        rootTransitions = transitions[0]
+        fail = self.fail
+        outputLink = self.outputLink
+        wordIds = self.wordIds
+        hasOutput = self.hasOutput
+        queue = deque(rootTransitions.values())
+        while queue:
+            state = queue.popleft()
+            #失败状态比当前状态浅，goto转移已经计算完成
+            failState = fail[state]
+            outputLink[state] = failState if wordIds[failState] >= 0 else outputLink[failState]
+            hasOutput[state] = wordIds[state] >= 0 or outputLink[state] != 0
+            children = transitions[state]
+            failTransitions = transitions[failState] if failState else {}
+            for char, child in children.items():
+                queue.append(child)
+                fail[child] = failTransitions.get(char) or rootTransitions.get(char, 0)
+            #没有子状态的字符沿用失败状态的转移，与根节点相同的转移不保存；叶子状态直接共用失败状态的转移表
+            if failTransitions and children:
+                gotoTransitions = dict(failTransitions)
+                gotoTransitions.update(children)
+                transitions[state] = gotoTransitions
+            elif failTransitions:
+                transitions[state] = failTransitions
+
+    def match(self, text):
+        """
+        匹配文本中的敏感词
+        :param text: 用户输入的文本
+        :return: 匹配到的敏感词列表（去重）
+        """
+        if not text:
+            return []
+        transitions = self.transitions
+        rootTransitions = transitions[0]
+        hasOutput = self.hasOutput
+        state = 0
+        matchedStates = set()
+        for char in text:
+            state = transitions[state].get(char) or rootTransitions.get(char, 0)
+            if hasOutput[state]:
+                matchedStates.add(state)
+        return self.__collectWords(matchedStates)
+
+    def scan(self, text, state=0, offset=0):
+        """
+        从state开始扫描文本，用于分段匹配
+        :param state: 上一段结束时的状态id，0表示从根节点开始
+        :param offset: 本段第一个字符在完整文本中的位置
+        :return: (结束时的状态id, [(起始位置, 结束位置, 敏感词)])，结束位置不包含
+        """
+        transitions = self.transitions
+        rootTransitions = transitions[0]
+        hasOutput = self.hasOutput
+        hits = []
+        for index, char in enumerate(text):
+            state = transitions[state].get(char) or rootTransitions.get(char, 0)
+            if hasOutput[state]:
+                self.__appendHits(hits, state, offset + index + 1)
+        return state, hits
+
+    def match_batch(self, texts):
+        """
+        批量匹配，所有文本在同一次调用中扫描，返回每条文本的[(起始位置, 结束位置, 敏感词)]
+        """
+        transitions = self.transitions
+        rootTransitions = transitions[0]
+        hasOutput = self.hasOutput
+        results = []
+        for text in texts:
+            state = 0
+            hits = []
+            for index, char in enumerate(text):
+                state = transitions[state].get(char) or rootTransitions.get(char, 0)
+                if hasOutput[state]:
+                    self.__appendHits(hits, state, index + 1)
+            results.append(hits)
+        return results
+
+    def __appendHits(self, hits, state, end):
+        #end处结束的全部敏感词：状态本身与输出链接上的结尾状态
+        if self.wordIds[state] < 0:
+            state = self.outputLink[state]
+        while state:
+            word = self.words[self.wordIds[state]]
+            hits.append((end - len(word), end, word))
+            state = self.outputLink[state]
+
+    def __collectWords(self, matchedStates):
+        #沿输出链接收集命中状态上的全部敏感词
+        matchedWords = set()
+        for state in matchedStates:
+            if self.wordIds[state] < 0:
+                state = self.outputLink[state]
+            while state:
+                matchedWords.add(self.words[self.wordIds[state]])
+                state = self.outputLink[state]
+        return list(matchedWords)
+
+
+class ACStreamMatcher:
+    """分段匹配器：保存自动机状态，流式输出每到一段只扫描新内容，跨段的敏感词也能命中。
+    automaton为ACAutomaton或ArrayACAutomaton，构建完成后只读，多个匹配器可以共享同一个自动机。"""
+    __slots__ = ("automaton", "state", "position", "matched")
+
+    def __init__(self, automaton):
+        self.automaton = automaton
+        self.state = None if isinstance(automaton, ACAutomaton) else 0
+        self.position = 0  # 已扫描的字符数
+        self.matched = set()  # 已命中的敏感词
+
+    def feed(self, chunk):
+        """
+        扫描新的一段文本
+        :return: 本段新命中的[(起始位置, 结束位置, 敏感词)]，位置相对于全部已输入的文本
+        """
+        if not chunk:
+            return []
+        self.state, hits = self.automaton.scan(chunk, self.state, self.position)
+        self.position += len(chunk)
+        for _, _, word in hits:
+            self.matched.add(word)
+        return hits
+
+    def reset(self):
+        self.state = None if isinstance(self.automaton, ACAutomaton) else 0
+        self.position = 0
+        self.matched = set()
+
 if __name__ == '__main__':
     pass
\ No newline at end of file
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, String, Text, Float
+from Common.DBCommon.sqlLiteCom import getBase
+
+class llmCacheRecord(getBase("llmCache_db")):
+    __tablename__ = "llmCache"
+    __table_args__ = {'extend_existing': True}
+    cacheKey = Column(String(64), primary_key=True, nullable=False) #模型名+prompt+解码参数的sha256
+    purpose = Column(String(50), nullable=False) #缓存用途，对应不同的TTL
+    response = Column(Text, nullable=False) #json序列化后的LLM输出
+    createTime = Column(Float, nullable=False, index=True)
+    expireTime = Column(Float, nullable=False)
@@ -0,0 +1,174 @@
+"""意图索引离线构建
+用法: python -m Rag.buildIntentIndex --user customer --input raw.jsonl [--batch-size 256] [--dedupe-threshold 0.98] [--write-dataset]
+输入为jsonl，每行至少包含text与intent字段。构建结果发布为index_dir/<userType>/下的新版本，运行中的服务会自动加载。"""
+import argparse
+import json
+import os
+import shutil
+import time
+from typing import Iterator, List, Tuple, Dict
+import faiss
+import numpy as np
+from Common.utils import getAbsolutePath, loadYmlFile, initLogger, normalizeVectors
+from Model.Enums.intentEnum import userType
+from Rag.embeddingEngine import EmbeddingEngine
+from Rag.intentIndexStore import INTENT_DATASET, INTENT_ENUM, getIntentIds, getDatasetSignature, \
+    writeIntentIndex, newVersionDir, publishVersion, getIndexConfig
+
+
+class NearDuplicateFilter:
+    """近重复过滤：与已保留样本的余弦相似度不低于threshold的样本被丢弃，意图不同的记为标签冲突"""
+    def __init__(self,dimension:int,threshold:float):
+        self.threshold = threshold
+        self.__index = faiss.IndexFlatIP(dimension)
+        self.__labels: List[int] = []
+        self.duplicates = 0
+        self.conflicts = 0
+
+    def filter(self,vectors:np.ndarray,labels:List[int]) -> np.ndarray:
+        """vectors为归一化向量，返回需要保留的样本掩码"""
+        keep = np.ones(len(labels), dtype=bool)
+        if self.threshold > 1:
+            return keep
+        nearest = np.full(len(labels), -1)
+        if self.__index.ntotal > 0:
+            scores, indices = self.__index.search(vectors, 1)
+            isDuplicate = scores[:, 0] >= self.threshold
+            keep &= ~isDuplicate
+            nearest[isDuplicate] = np.asarray(self.__labels)[indices[isDuplicate, 0]]
+        #批次内部两两比较，保留先出现的样本
+        similarity = vectors @ vectors.T
+        for row in range(len(labels)):
+            if not keep[row]:
+                continue
+            duplicateRows = np.nonzero(similarity[row, row + 1:] >= self.threshold)[0] + row + 1
+            for duplicateRow in duplicateRows:
+                if keep[duplicateRow]:
+                    keep[duplicateRow] = False
+                    nearest[duplicateRow] = labels[row]
+        for row in np.nonzero(~keep)[0]:
+            self.duplicates += 1
+            if nearest[row] != labels[row]:
+                self.conflicts += 1
+        self.__index.add(vectors[keep])
+        self.__labels.extend(label for label, isKept in zip(labels, keep) if isKept)
+        return keep
+
+
+#逐行读取原始语料，跳过格式错误、意图未知与文本完全重复的行
+def readUtterances(inputPath:str,intentIds:Dict[str, int],stats:Dict[str, int]) -> Iterator[Tuple[str, int]]:
+    logger = initLogger(__name__)
+    seen = set()
+    with open(inputPath, 'r', encoding='utf-8') as f:
+        for lineNum, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            stats["input"] += 1
+            try:
+                jsonData = json.loads(line)
+                text = jsonData["text"].strip()
+                intent = jsonData["intent"]
+            except (json.JSONDecodeError, KeyError, AttributeError):
+                logger.error(f"Parsing input file Failed! Line:{lineNum}")
+                stats["invalid"] += 1
+                continue
+            if intent not in intentIds or not text:
+                logger.error(f"Unknown intent {intent} at line {lineNum}")
+                stats["invalid"] += 1
+                continue
+            if text in seen:
+                stats["exactDuplicates"] += 1
+                continue
+            seen.add(text)
+            yield text, intentIds[intent]
+
+#按batchSize切分迭代器
+def batched(items:Iterator, batchSize:int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batchSize:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+#删除未发布的构建目录与临时数据集文件
+def removeBuildFiles(buildDir:str,datasetTmpPath:str):
+    shutil.rmtree(buildDir, ignore_errors=True)
+    if os.path.exists(datasetTmpPath):
+        os.remove(datasetTmpPath)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and publish a versioned intent index")
+    parser.add_argument("--user", required=True, choices=[user.name for user in userType])
+    parser.add_argument("--input", required=True, help="jsonl file with text and intent fields")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--dedupe-threshold", type=float, default=0.98, help="cosine similarity, >1 disables near-duplicate removal")
+    parser.add_argument("--write-dataset", action="store_true", help="also rewrite Rag/Dataset/*.jsonl with embeddings")
+    args = parser.parse_args()
+    logger = initLogger(__name__)
+    config = loadYmlFile(getAbsolutePath("../Config/config.yml"))
+    ragConfig = config.get("rag", {})
+    embeddingConfig = config.get("embedding", {})
+    indexRoot = getAbsolutePath(ragConfig.get("index_dir", "../Rag/IntentIndex/"))
+    user = userType[args.user]
+    intentIds = getIntentIds(user)
+    intents = list(INTENT_ENUM[user])
+
+    #离线构建不需要凑批等待，直接按batchSize编码
+    engine = EmbeddingEngine(getAbsolutePath(embeddingConfig.get("model_path", "../Rag/EmbeddingModel/")),
+                             maxBatchSize=args.batch_size, maxWait=0, device=embeddingConfig.get("device"),
+                             backend=embeddingConfig.get("backend", "sentence_transformers"), onnxConfig=embeddingConfig.get("onnx"))
+    duplicateFilter = NearDuplicateFilter(engine.dimension(), args.dedupe_threshold)
+    stats = {"input": 0, "invalid": 0, "exactDuplicates": 0}
+    version, buildDir = newVersionDir(indexRoot, user)
+    datasetPath = getAbsolutePath(INTENT_DATASET[user])
+    datasetTmpPath = datasetPath + ".tmp"
+    datasetWriter = open(datasetTmpPath, 'w', encoding='utf-8') if args.write_dataset else None
+    keptVectors = []
+    keptLabels = []
+    start = time.monotonic()
+    try:
+        try:
+            for batch in batched(readUtterances(args.input, intentIds, stats), args.batch_size):
+                texts = [text for text, _ in batch]
+                labels = [label for _, label in batch]
+                vectors = normalizeVectors(np.asarray(engine.encode(texts), dtype=np.float32))
+                keep = duplicateFilter.filter(vectors, labels)
+                keptVectors.append(vectors[keep])
+                keptLabels.extend(label for label, isKept in zip(labels, keep) if isKept)
+                if datasetWriter is not None:
+                    for text, label, vector, isKept in zip(texts, labels, vectors, keep):
+                        if isKept:
+                            datasetWriter.write(json.dumps({"text": text, "intent": intents[label].value,
+                                                            "embedding": vector.tolist()}, ensure_ascii=False) + "\n")
+                logger.info(f"Embedded {stats['input']} lines, kept {len(keptLabels)}")
+        finally:
+            if datasetWriter is not None:
+                datasetWriter.close()
+        if not keptLabels:
+            removeBuildFiles(buildDir, datasetTmpPath)
+            logger.error("No valid utterances, nothing published")
+            return
+        extraMeta = {"source": os.path.abspath(args.input), "dedupeThreshold": args.dedupe_threshold,
+                     "input": stats["input"], "invalid": stats["invalid"], "exactDuplicates": stats["exactDuplicates"],
+                     "nearDuplicates": duplicateFilter.duplicates, "labelConflicts": duplicateFilter.conflicts}
+        #改名不改变文件大小与修改时间，临时文件的指纹即替换后数据集的指纹
+        if datasetWriter is not None:
+            extraMeta["dataset"] = getDatasetSignature(datasetTmpPath)
+        meta = writeIntentIndex(user, np.concatenate(keptVectors), keptLabels, buildDir, extraMeta, getIndexConfig(ragConfig, user))
+        publishVersion(indexRoot, user, version, buildDir, ragConfig.get("keep_versions", 3))
+        #索引发布成功后再替换数据集，构建或发布失败时线上的数据集与索引保持一致
+        if datasetWriter is not None:
+            os.replace(datasetTmpPath, datasetPath)
+    except BaseException:
+        #构建失败时删除未发布的构建目录与临时数据集，避免残留
+        removeBuildFiles(buildDir, datasetTmpPath)
+        raise
+    logger.info(f"Intent index published. UserType:{user.name},Version:{version},Index:{meta['indexClass']},Count:{meta['count']},"
+                f"NearDuplicates:{duplicateFilter.duplicates},LabelConflicts:{duplicateFilter.conflicts},"
+                f"Cost:{time.monotonic() - start:.1f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Any, List, Optional, Union
+import numpy as np
+from Common.statsReporter import registerStats
+from Common.utils import getAbsolutePath, loadYmlFile, initLogger
+
+#批次与排队时间统计窗口大小
+STATS_WINDOW = 1000
+
+
+#按backend加载模型，两种后端的encode接口一致；只导入所选后端的依赖，onnx节点不需要安装torch
+def loadEmbeddingModel(modelPath:str,backend:str = "sentence_transformers",device:Optional[str] = None,
+                       onnxConfig:Optional[Dict[str, Any]] = None):
+    if backend == "onnx":
+        from Rag.onnxEmbedding import OnnxEmbeddingModel
+        onnxConfig = onnxConfig or {}
+        return OnnxEmbeddingModel(modelPath, getAbsolutePath(onnxConfig.get("model_file", "../Rag/EmbeddingModel/onnx/model_int8.onnx")),
+                                  onnxConfig.get("intra_op_threads"), onnxConfig.get("max_seq_length", 128))
+    if backend != "sentence_transformers":
+        raise ValueError(f"Unknown embedding backend {backend}")
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(modelPath,device=device)
+
+
+class EncodeRequest:
+    """一次encode调用：待向量化的文本与返回结果的Future"""
+    __slots__ = ("texts", "single", "future", "enqueueTime")
+
+    def __init__(self,texts:List[str],single:bool):
+        self.texts = texts
+        self.single = single
+        self.future = Future()
+        self.enqueueTime = time.monotonic()
+
+
+class EmbeddingEngine:
+    """进程级别的向量化引擎：模型只加载一次，后台线程把多个gRPC线程的并发encode请求合并成小批次。
+    一个批次最多maxBatchSize条文本，第一条请求最多等待maxWait秒凑批。"""
+    def __init__(self,modelPath:str,maxBatchSize:int = 32,maxWait:float = 0.005,device:Optional[str] = None,
+                 backend:str = "sentence_transformers",onnxConfig:Optional[Dict[str, Any]] = None):
+        self.logger = initLogger(__name__)
+        start = time.monotonic()
+        self.backend = backend
+        self.__model = loadEmbeddingModel(modelPath, backend, device, onnxConfig)
+        self.logger.info(f"Embedding model loaded in {time.monotonic() - start:.2f}s. Backend:{backend},Path:{modelPath}")
+        self.__maxBatchSize = maxBatchSize
+        self.__maxWait = maxWait
+        self.__queue: "queue.Queue[EncodeRequest]" = queue.Queue()
+        self.__statsLock = threading.Lock()
+        self.__batchSizes = deque(maxlen=STATS_WINDOW)
+        self.__queueTimes = deque(maxlen=STATS_WINDOW)
+        self.__counters = {"requests": 0, "texts": 0, "batches": 0, "errors": 0}
+        self.__worker = threading.Thread(target=self.__run,name="embeddingEngine",daemon=True)
+        self.__worker.start()
+
+    def encode(self,content:Union[str, List[str]],timeout:Optional[float] = None) -> np.ndarray:
+        """向量化，输入单条文本返回一维向量，输入文本列表返回(条数,维度)的矩阵"""
+        single = isinstance(content, str)
+        request = EncodeRequest([content] if single else list(content), single)
+        if not request.texts:
+            return np.zeros((0, self.dimension()), dtype=np.float32)
+        self.__queue.put(request)
+        return request.future.result(timeout=timeout)
+
+    def dimension(self) -> int:
+        return self.__model.get_sentence_embedding_dimension()
+
+    def stats(self) -> Dict[str, Any]:
+        """请求、批次计数，以及最近STATS_WINDOW个批次的大小与请求排队时间(秒)"""
+        with self.__statsLock:
+            stats = dict(self.__counters)
+            batchSizes = list(self.__batchSizes)
+            queueTimes = sorted(self.__queueTimes)
+        stats["queueLength"] = self.__queue.qsize()
+        if batchSizes:
+            stats["batchSizeAvg"] = sum(batchSizes) / len(batchSizes)
+            stats["batchSizeMax"] = max(batchSizes)
+        if queueTimes:
+            stats["queueTimeAvg"] = sum(queueTimes) / len(queueTimes)
+            stats["queueTimeP95"] = queueTimes[min(len(queueTimes) - 1, int(len(queueTimes) * 0.95))]
+            stats["queueTimeMax"] = queueTimes[-1]
+        return stats
+
+    def __collectBatch(self) -> List[EncodeRequest]:
+        #阻塞等待第一条请求，之后在maxWait内继续凑批，超过单批上限的大请求单独成批
+        batch = [self.__queue.get()]
+        textCount = len(batch[0].texts)
+        deadline = time.monotonic() + self.__maxWait
+        while textCount < self.__maxBatchSize:
+            remaining = deadline - time.monotonic()
+            try:
+                request = self.__queue.get(timeout=remaining) if remaining > 0 else self.__queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(request)
+            textCount += len(request.texts)
+        return batch
+
+    def __run(self):
+        while True:
+            batch = self.__collectBatch()
+            startTime = time.monotonic()
+            texts = [text for request in batch for text in request.texts]
+            try:
+                embeddings = self.__model.encode(texts,batch_size=self.__maxBatchSize,convert_to_numpy=True)
+            except Exception as e:
+                self.logger.error(f"Embedding batch failed! \n {e}")
+                for request in batch:
+                    request.future.set_exception(e)
+                with self.__statsLock:
+                    self.__counters["errors"] += len(batch)
+                continue
+            #按请求切分结果，切片是同一块内存的视图，不做额外拷贝
+            offset = 0
+            for request in batch:
+                result = embeddings[offset:offset + len(request.texts)]
+                offset += len(request.texts)
+                request.future.set_result(result[0] if request.single else result)
+            with self.__statsLock:
+                self.__counters["requests"] += len(batch)
+                self.__counters["texts"] += len(texts)
+                self.__counters["batches"] += 1
+                self.__batchSizes.append(len(texts))
+                self.__queueTimes.extend(startTime - request.enqueueTime for request in batch)
+
+EMBEDDING_ENGINE: Optional[EmbeddingEngine] = None
+EMBEDDING_ENGINE_LOCK = threading.Lock()
+
+#获取进程级别的向量化引擎，第一次调用时加载模型
+def getEmbeddingEngine() -> EmbeddingEngine:
+    global EMBEDDING_ENGINE
+    if EMBEDDING_ENGINE is None:
+        with EMBEDDING_ENGINE_LOCK:
+            if EMBEDDING_ENGINE is None:
+                config = loadYmlFile(getAbsolutePath("../Config/config.yml")).get("embedding", {})
+                EMBEDDING_ENGINE = EmbeddingEngine(getAbsolutePath(config.get("model_path", "../Rag/EmbeddingModel/")),
+                                                   maxBatchSize=config.get("max_batch_size", 32),
+                                                   maxWait=config.get("max_wait_ms", 5) / 1000,
+                                                   device=config.get("device"),
+                                                   backend=config.get("backend", "sentence_transformers"),
+                                                   onnxConfig=config.get("onnx"))
+                registerStats("embeddingEngine", EMBEDDING_ENGINE.stats)
+    return EMBEDDING_ENGINE
@@ -0,0 +1,331 @@
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Any
+import faiss
+import numpy as np
+from Common.utils import getAbsolutePath, loadYmlFile, initLogger, normalizeVectors
+from Model.Enums.intentEnum import userType, intentCustome, intentDriver
+
+#各userType的意图数据集与意图枚举，标签id为意图在枚举中的顺序
+INTENT_DATASET = {userType.customer: "../Rag/Dataset/intentDataCustom.jsonl",
+                  userType.driver: "../Rag/Dataset/intentDataDriver.jsonl"}
+INTENT_ENUM = {userType.customer: intentCustome, userType.driver: intentDriver}
+#版本目录下的文件
+INDEX_FILE = "intent.faiss"
+VECTOR_FILE = "vectors.npy"
+LABEL_FILE = "labels.npy"
+META_FILE = "meta.json"
+#index_dir/<userType>/CURRENT记录当前生效的版本号
+CURRENT_FILE = "CURRENT"
+#各索引类型的构建参数，变化后需要重新构建；ef_search、nprobe、rerank为检索参数，加载时生效
+INDEX_BUILD_KEYS = {"flat": (), "hnsw": ("m", "ef_construction"), "ivfpq": ("nlist", "pq_m", "nbits")}
+DEFAULT_INDEX_CONFIG = {"type": "flat"}
+
+
+class IntentIndex:
+    """单个userType的意图索引：faiss索引、归一化的向量矩阵与意图标签id数组，均为内存映射"""
+    def __init__(self,user:userType,index:faiss.Index,vectors:np.ndarray,labels:np.ndarray,version:str = "",rerank:int = 1):
+        self.user = user
+        self.index = index
+        self.vectors = vectors
+        self.labels = labels
+        self.version = version
+        self.rerank = rerank
+        self.intents = list(INTENT_ENUM[user])
+
+    def search(self,queryVectors:np.ndarray,count:int) -> Tuple[np.ndarray, np.ndarray]:
+        """queryVectors为(条数,维度)的归一化向量，返回(条数,count)的相似度与意图标签id，不足count条的位置标签为-1"""
+        scores, indices = self.searchIds(queryVectors, count)
+        labelIds = np.where(indices >= 0, self.labels[np.maximum(indices, 0)], -1)
+        return scores, labelIds
+
+    def searchIds(self,queryVectors:np.ndarray,count:int) -> Tuple[np.ndarray, np.ndarray]:
+        """返回(条数,count)的相似度与样本下标；rerank大于1时先取count*rerank条候选，再用原始向量精确打分重排"""
+        queryVectors = np.ascontiguousarray(queryVectors, dtype=np.float32)
+        if self.rerank <= 1:
+            return self.index.search(queryVectors, count)
+        _, candidates = self.index.search(queryVectors, count * self.rerank)
+        #只读取候选样本的向量，内存映射下不会加载整个矩阵
+        candidateVectors = self.vectors[np.maximum(candidates, 0)]
+        scores = np.einsum("qkd,qd->qk", candidateVectors, queryVectors)
+        scores[candidates < 0] = -np.inf
+        order = np.argsort(-scores, axis=1)[:, :count]
+        scores = np.take_along_axis(scores, order, axis=1)
+        indices = np.take_along_axis(candidates, order, axis=1)
+        indices[np.isneginf(scores)] = -1
+        return scores, indices
+
+    def toIntents(self,labelIds:np.ndarray) -> List[intentCustome|intentDriver]:
+        return [self.intents[labelId] for labelId in labelIds.tolist() if labelId >= 0]
+
+    def voteProportions(self,scores:Optional[np.ndarray],labelIds:np.ndarray,weighted:bool = False) -> np.ndarray:
+        """按检索结果投票，返回(条数,意图数)的意图占比，列顺序与self.intents一致。
+        不加权时每条结果一票，除以检索条数；加权时按相似度(负数记0)投票，除以相似度总和"""
+        queryCount, count = labelIds.shape
+        intentCount = len(self.intents)
+        valid = labelIds >= 0
+        #每条查询的标签平移到各自的区间，一次bincount完成全部查询的计票
+        bins = (np.arange(queryCount)[:, None] * intentCount + labelIds)[valid]
+        weights = np.maximum(scores, 0)[valid] if weighted else None
+        votes = np.bincount(bins, weights=weights, minlength=queryCount * intentCount).reshape(queryCount, intentCount)
+        if weighted:
+            return votes / np.maximum(votes.sum(axis=1, keepdims=True), 1e-12)
+        return votes / count
+
+
+#数据集文件的指纹，变化后需要重新构建索引
+def getDatasetSignature(datasetPath:str) -> Dict:
+    stat = os.stat(datasetPath)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+#意图名到标签id的映射
+def getIntentIds(user:userType) -> Dict[str, int]:
+    return {intent.value: labelId for labelId, intent in enumerate(INTENT_ENUM[user])}
+
+#配置中索引类型与构建参数，meta中记录的也是这部分，用于判断是否需要重新构建
+def getIndexBuildConfig(indexConfig:Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    indexConfig = indexConfig or DEFAULT_INDEX_CONFIG
+    indexType = indexConfig.get("type", "flat")
+    if indexType not in INDEX_BUILD_KEYS:
+        raise ValueError(f"Unknown index type {indexType}")
+    buildConfig = {"type": indexType}
+    buildConfig.update({key: indexConfig[key] for key in INDEX_BUILD_KEYS[indexType] if indexConfig.get(key) is not None})
+    return buildConfig
+
+#按配置创建并训练faiss索引，均使用内积(向量已归一化，即余弦相似度)；样本数不够训练IVF-PQ时退回flat
+#返回(索引,实际构建的索引配置)，退回flat时实际配置与请求的配置不同
+def createFaissIndex(vectors:np.ndarray,indexConfig:Optional[Dict[str, Any]] = None) -> Tuple[faiss.Index, Dict[str, Any]]:
+    logger = initLogger(__name__)
+    count, dimension = vectors.shape
+    buildConfig = getIndexBuildConfig(indexConfig)
+    indexType = buildConfig["type"]
+    if indexType == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, buildConfig.get("m", 32), faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = buildConfig.get("ef_construction", 200)
+    elif indexType == "ivfpq":
+        #nlist默认取4*sqrt(样本数)，pq_m需要整除向量维度
+        nlist = buildConfig.get("nlist") or max(1, int(4 * np.sqrt(count)))
+        pqM = buildConfig.get("pq_m", 16)
+        nbits = buildConfig.get("nbits", 8)
+        if dimension % pqM != 0:
+            raise ValueError(f"pq_m {pqM} must divide dimension {dimension}")
+        if count < max(nlist, 2 ** nbits):
+            logger.warning(f"Too few vectors to train IVF-PQ ({count} < {max(nlist, 2 ** nbits)}), fall back to flat")
+            index = faiss.IndexFlatIP(dimension)
+            index.add(vectors)
+            return index, dict(DEFAULT_INDEX_CONFIG)
+        index = faiss.IndexIVFPQ(faiss.IndexFlatIP(dimension), dimension, nlist, pqM, nbits, faiss.METRIC_INNER_PRODUCT)
+        #每个聚类中心最多用256条样本训练，避免百万级语料训练过慢
+        trainCount = min(count, nlist * 256)
+        trainRows = np.sort(np.random.default_rng(0).choice(count, trainCount, replace=False)) if trainCount < count else slice(None)
+        index.train(np.ascontiguousarray(vectors[trainRows]))
+    else:
+        index = faiss.IndexFlatIP(dimension)
+    index.add(vectors)
+    return index, buildConfig
+
+#设置检索参数：hnsw的ef_search、ivfpq的nprobe，无需重新构建即可调整
+def applySearchParams(index:faiss.Index,indexConfig:Optional[Dict[str, Any]] = None):
+    indexConfig = indexConfig or DEFAULT_INDEX_CONFIG
+    if isinstance(index, faiss.IndexHNSW) and indexConfig.get("ef_search"):
+        index.hnsw.efSearch = indexConfig["ef_search"]
+    ivfIndex = faiss.try_extract_index_ivf(index)
+    if ivfIndex is not None and indexConfig.get("nprobe"):
+        ivfIndex.nprobe = indexConfig["nprobe"]
+
+#把归一化向量与标签写成索引文件，meta最后写入，作为索引文件完整的标志
+def writeIntentIndex(user:userType,vectors:np.ndarray,labels:np.ndarray,outputDir:str,extraMeta:Optional[Dict[str, Any]] = None,
+                     indexConfig:Optional[Dict[str, Any]] = None) -> Dict:
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    buildStart = time.monotonic()
+    index, builtConfig = createFaissIndex(vectors, indexConfig)
+    buildCost = time.monotonic() - buildStart
+    os.makedirs(outputDir, exist_ok=True)
+    np.save(os.path.join(outputDir, VECTOR_FILE), vectors)
+    np.save(os.path.join(outputDir, LABEL_FILE), np.asarray(labels, dtype=np.int16))
+    faiss.write_index(index, os.path.join(outputDir, INDEX_FILE))
+    meta = dict(extraMeta or {})
+    meta.update({"userType": user.name, "count": int(vectors.shape[0]), "dimension": int(vectors.shape[1]),
+                 "intents": [intent.value for intent in INTENT_ENUM[user]], "buildTime": time.time()})
+    #index为实际构建的索引，requestedIndex为配置请求的索引，用于判断配置是否变化
+    meta.update({"index": builtConfig, "requestedIndex": getIndexBuildConfig(indexConfig), "indexClass": type(index).__name__,
+                 "indexBuildCost": buildCost})
+    with open(os.path.join(outputDir, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    return meta
+
+#从带embedding字段的jsonl数据集构建索引文件
+def buildIntentIndex(user:userType,datasetPath:str,outputDir:str,indexConfig:Optional[Dict[str, Any]] = None) -> Dict:
+    logger = initLogger(__name__)
+    intentIds = getIntentIds(user)
+    embeddings = []
+    labels = []
+    with open(datasetPath, 'r', encoding='utf-8') as f:
+        for lineNum, line in enumerate(f, 1):
+            try:
+                jsonData = json.loads(line.strip())
+            except json.JSONDecodeError:
+                logger.error(f"Parsing dataset file Failed! Line:{lineNum}")
+                continue
+            if jsonData['intent'] not in intentIds:
+                logger.error(f"Unknown intent {jsonData['intent']} at line {lineNum}")
+                continue
+            embeddings.append(jsonData['embedding'])
+            labels.append(intentIds[jsonData['intent']])
+    vectors = normalizeVectors(np.asarray(embeddings, dtype=np.float32))
+    meta = writeIntentIndex(user, vectors, labels, outputDir, {"dataset": getDatasetSignature(datasetPath)}, indexConfig)
+    logger.info(f"Intent index built. UserType:{user.name},Index:{meta['indexClass']},Count:{meta['count']},Path:{outputDir}")
+    return meta
+
+#用已有版本保存的向量与标签按新的索引配置重新构建，不需要重新向量化
+def rebuildIntentIndex(user:userType,sourceDir:str,outputDir:str,indexConfig:Optional[Dict[str, Any]] = None) -> Dict:
+    logger = initLogger(__name__)
+    with open(os.path.join(sourceDir, META_FILE), 'r', encoding='utf-8') as f:
+        extraMeta = json.load(f)
+    vectors = np.load(os.path.join(sourceDir, VECTOR_FILE), mmap_mode="r")
+    labels = np.load(os.path.join(sourceDir, LABEL_FILE))
+    meta = writeIntentIndex(user, vectors, labels, outputDir, extraMeta, indexConfig)
+    logger.info(f"Intent index rebuilt. UserType:{user.name},Index:{meta['indexClass']},Count:{meta['count']},Path:{outputDir}")
+    return meta
+
+#以内存映射方式加载索引，多个进程共享同一份页缓存；近似索引按配置设置检索参数
+def loadIntentIndex(user:userType,indexDir:str,version:str = "",indexConfig:Optional[Dict[str, Any]] = None) -> IntentIndex:
+    index = faiss.read_index(os.path.join(indexDir, INDEX_FILE), faiss.IO_FLAG_MMAP_IFC)
+    applySearchParams(index, indexConfig)
+    vectors = np.load(os.path.join(indexDir, VECTOR_FILE), mmap_mode="r")
+    labels = np.load(os.path.join(indexDir, LABEL_FILE), mmap_mode="r")
+    #精确检索的结果不需要重排
+    rerank = 1 if isinstance(index, faiss.IndexFlat) else (indexConfig or {}).get("rerank", 1)
+    return IntentIndex(user, index, vectors, labels, version, rerank)
+
+#读取配置中某个userType的索引配置，没有配置时使用flat
+def getIndexConfig(ragConfig:Dict[str, Any],user:userType) -> Dict[str, Any]:
+    return (ragConfig.get("index") or {}).get(user.name) or DEFAULT_INDEX_CONFIG
+
+#当前生效的版本号，没有时返回None
+def readCurrentVersion(indexRoot:str,user:userType) -> Optional[str]:
+    currentPath = os.path.join(indexRoot, user.name, CURRENT_FILE)
+    if not os.path.exists(currentPath):
+        return None
+    with open(currentPath, 'r', encoding='utf-8') as f:
+        return f.read().strip() or None
+
+#新版本的临时构建目录，构建完成后由publishVersion发布
+def newVersionDir(indexRoot:str,user:userType) -> Tuple[str, str]:
+    version = datetime.now().strftime("v%Y%m%d%H%M%S%f")
+    return version, os.path.join(indexRoot, user.name, version + ".tmp")
+
+#发布新版本：构建目录改名为正式目录后原子替换CURRENT，只保留最近keepVersions个版本
+def publishVersion(indexRoot:str,user:userType,version:str,buildDir:str,keepVersions:int = 3):
+    userDir = os.path.join(indexRoot, user.name)
+    os.rename(buildDir, os.path.join(userDir, version))
+    tmpCurrent = os.path.join(userDir, CURRENT_FILE + ".tmp")
+    with open(tmpCurrent, 'w', encoding='utf-8') as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmpCurrent, os.path.join(userDir, CURRENT_FILE))
+    #已加载旧版本的进程仍持有文件句柄，删除目录不影响正在处理的请求
+    versions = sorted(name for name in os.listdir(userDir)
+                      if name.startswith("v") and not name.endswith(".tmp") and name != version)
+    for oldVersion in versions[:max(len(versions) - keepVersions + 1, 0)]:
+        shutil.rmtree(os.path.join(userDir, oldVersion), ignore_errors=True)
+
+
+class IntentIndexStore:
+    """进程级别的意图索引，启动时加载一次；后台线程定期检查CURRENT，有新版本时加载后整体替换，
+    正在检索的请求继续使用旧索引对象，不会中断。没有任何版本或数据集有变化时从数据集构建新版本，
+    索引类型或构建参数变化时用当前版本的向量重建。"""
+    def __init__(self,indexRoot:str,reloadInterval:float = 10,keepVersions:int = 3,indexConfigs:Optional[Dict[userType, Dict]] = None):
+        self.logger = initLogger(__name__)
+        self.__indexRoot = indexRoot
+        self.__keepVersions = keepVersions
+        self.__indexConfigs = indexConfigs or {}
+        self.__indexes: Dict[userType, IntentIndex] = {}
+        self.__reloadLock = threading.Lock()
+        for user in userType:
+            self.__loadOrBuild(user)
+        if reloadInterval > 0:
+            threading.Thread(target=self.__watch,args=(reloadInterval,),name="intentIndexWatcher",daemon=True).start()
+
+    def get(self,user:userType) -> Optional[IntentIndex]:
+        return self.__indexes.get(user)
+
+    def versions(self) -> Dict[str, str]:
+        return {user.name: intentIndex.version for user, intentIndex in self.__indexes.items()}
+
+    def reload(self,user:userType) -> bool:
+        """CURRENT指向的版本与已加载的不同时加载新版本，返回是否发生了替换"""
+        with self.__reloadLock:
+            version = readCurrentVersion(self.__indexRoot, user)
+            loaded = self.__indexes.get(user)
+            if version is None or (loaded is not None and loaded.version == version):
+                return False
+            intentIndex = loadIntentIndex(user, os.path.join(self.__indexRoot, user.name, version), version,
+                                          self.__indexConfigs.get(user))
+            #字典项赋值是原子的，之后的请求使用新索引
+            self.__indexes[user] = intentIndex
+        self.logger.info(f"Intent index loaded. UserType:{user.name},Version:{version},"
+                         f"Index:{type(intentIndex.index).__name__},Count:{intentIndex.index.ntotal}")
+        return True
+
+    def __loadOrBuild(self,user:userType):
+        datasetPath = getAbsolutePath(INTENT_DATASET[user])
+        indexConfig = self.__indexConfigs.get(user)
+        try:
+            buildFrom = self.__needBuild(user, datasetPath)
+            if buildFrom is not None:
+                version, buildDir = newVersionDir(self.__indexRoot, user)
+                if buildFrom == datasetPath:
+                    buildIntentIndex(user, datasetPath, buildDir, indexConfig)
+                else:
+                    rebuildIntentIndex(user, buildFrom, buildDir, indexConfig)
+                publishVersion(self.__indexRoot, user, version, buildDir, self.__keepVersions)
+            self.reload(user)
+        except Exception as e:
+            self.logger.error(f"Intent index load failed! UserType:{user.name} \n {e}")
+
+    def __needBuild(self,user:userType,datasetPath:str) -> Optional[str]:
+        """返回构建新版本的来源：数据集路径，或者索引配置变化时用于重建的当前版本目录；不需要构建时返回None"""
+        version = readCurrentVersion(self.__indexRoot, user)
+        if version is None:
+            return datasetPath
+        versionDir = os.path.join(self.__indexRoot, user.name, version)
+        with open(os.path.join(versionDir, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        #离线构建且没有写出数据集的版本不记录dataset，不因数据集变化而重建
+        if os.path.exists(datasetPath) and "dataset" in meta and meta["dataset"] != getDatasetSignature(datasetPath):
+            return datasetPath
+        #比较请求的配置而不是实际构建的索引，样本太少退回flat的版本不会反复重建
+        if meta.get("requestedIndex", meta.get("index", DEFAULT_INDEX_CONFIG)) != getIndexBuildConfig(self.__indexConfigs.get(user)):
+            return versionDir
+        return None
+
+    def __watch(self,reloadInterval:float):
+        while True:
+            time.sleep(reloadInterval)
+            for user in userType:
+                try:
+                    self.reload(user)
+                except Exception as e:
+                    self.logger.error(f"Intent index reload failed! UserType:{user.name} \n {e}")
+
+INTENT_INDEX_STORE: Optional[IntentIndexStore] = None
+INTENT_INDEX_STORE_LOCK = threading.Lock()
+
+#获取进程级别的意图索引
+def getIntentIndexStore() -> IntentIndexStore:
+    global INTENT_INDEX_STORE
+    if INTENT_INDEX_STORE is None:
+        with INTENT_INDEX_STORE_LOCK:
+            if INTENT_INDEX_STORE is None:
+                config = loadYmlFile(getAbsolutePath("../Config/config.yml")).get("rag", {})
+                INTENT_INDEX_STORE = IntentIndexStore(getAbsolutePath(config.get("index_dir", "../Rag/IntentIndex/")),
+                                                      reloadInterval=config.get("reload_interval", 10),
+                                                      keepVersions=config.get("keep_versions", 3),
+                                                      indexConfigs={user: getIndexConfig(config, user) for user in userType})
+    return INTENT_INDEX_STORE
@@ -1,8 +1,7 @@
-import json
-from typing import List
+from typing import List, Optional
 import numpy as np
-from Common.utils import initLogger, normalizeVectors, getEmbedding, getAbsolutePath
-import faiss
+from Common.utils import initLogger, normalizeVectors, getEmbedding
+from Rag.intentIndexStore import getIntentIndexStore, INTENT_ENUM
 from Model.Enums.intentEnum import userType, intentCustome, intentDriver
 
 
@@ -12,34 +11,28 @@ def getSimilarIntents(query:str,user:userType,count:int) -> List[intentCustome|i
     if not successReturn:
         logger.error("Embedding Failed!")
         return None
-    if user == userType.customer:
-        dataUrl = "../Rag/Dataset/intentDataCustom.jsonl"
-    elif user == userType.driver:
-        dataUrl = "../Rag/Dataset/intentDataDriver.jsonl"
-    texts = []
-    rawIntent = []
-    ans  = []
-    with open(getAbsolutePath(dataUrl), 'r', encoding='utf-8') as f:
-        for line_num, line in enumerate(f, 1):
-            try:
-                # 解析json数据
-                json_data = json.loads(line.strip())
-                emb = np.array(json_data['embedding'], dtype=np.float32)
-                texts.append(emb)
-                rawIntent.append(json_data['intent'])
-            except json.JSONDecodeError as e:
-                logger.error("Parsing dataset file Failed!")
-    doc_embeddings = np.array(texts, dtype=np.float32)
-    doc_embeddings = normalizeVectors(doc_embeddings)  # 归一化文档向量
-    embedding_dim = doc_embeddings.shape[1]
-    index = faiss.IndexFlatIP(embedding_dim)
-    # 添加文档向量到索引
-    index.add(doc_embeddings)
-    query = queryEmbedding
-    query = np.array(query, dtype=np.float32)
-    query = query.reshape(1, -1)
-    scores, indices = index.search(query, k=count)
-    indicesList = indices.tolist()[0]
-    for indece in indicesList:
-        ans.append(intentCustome(rawIntent[indece]) if user == userType.customer else intentDriver(rawIntent[indece]))
-    return ans
\ No newline at end of file
+    #索引在进程启动时加载一次
+    intentIndex = getIntentIndexStore().get(user)
+    if intentIndex is None:
+        logger.error("Intent index not loaded!")
+        return None
+    queryVector = normalizeVectors(np.asarray(queryEmbedding, dtype=np.float32).reshape(1, -1))
+    scores, labelIds = intentIndex.search(queryVector, count)
+    return intentIndex.toIntents(labelIds[0])
+
+#批量检索意图占比：全部查询一次向量化、一次index.search，返回(查询条数,意图数)的矩阵，列顺序与意图枚举一致
+def getIntentProportions(queries:List[str],user:userType,count:int,weighted:bool = False) -> Optional[np.ndarray]:
+    logger = initLogger(__name__)
+    if not queries:
+        return np.zeros((0, len(INTENT_ENUM[user])))
+    queryEmbeddings, successReturn = getEmbedding(list(queries))
+    if not successReturn:
+        logger.error("Embedding Failed!")
+        return None
+    intentIndex = getIntentIndexStore().get(user)
+    if intentIndex is None:
+        logger.error("Intent index not loaded!")
+        return None
+    queryVectors = normalizeVectors(np.asarray(queryEmbeddings, dtype=np.float32).reshape(len(queries), -1))
+    scores, labelIds = intentIndex.search(queryVectors, count)
+    return intentIndex.voteProportions(scores, labelIds, weighted)
@@ -0,0 +1,133 @@
+"""ONNX Runtime向量化后端：把Rag/EmbeddingModel导出为ONNX并做int8动态量化，CPU推理时替代SentenceTransformer
+导出: python -m Rag.onnxEmbedding --export，输出到embedding.onnx.model_file所在目录
+校验: python -m Rag.onnxEmbedding --verify [--min-cosine 0.99]，在意图数据集上对比与PyTorch模型输出的余弦相似度
+导出与校验需要torch、transformers、onnx，线上推理只需要onnxruntime与tokenizers。"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List, Optional, Union
+import numpy as np
+from Common.utils import getAbsolutePath, loadYmlFile, initLogger, normalizeVectors
+
+#导出文件名，int8量化模型由fp32模型生成
+ONNX_FP32_FILE = "model.onnx"
+ONNX_INT8_FILE = "model_int8.onnx"
+ONNX_INPUTS = ["input_ids", "attention_mask", "token_type_ids"]
+
+
+class OnnxEmbeddingModel:
+    """与SentenceTransformer的encode接口一致的ONNX推理模型：tokenizers分词，输出按attention_mask做均值池化"""
+    def __init__(self,modelPath:str,onnxFile:str,intraOpThreads:Optional[int] = None,maxSeqLength:int = 128):
+        import onnxruntime
+        from tokenizers import Tokenizer
+        self.logger = initLogger(__name__)
+        self.maxSeqLength = maxSeqLength
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        #引擎只有一个工作线程，算子内部并行是唯一的并行来源
+        options.intra_op_num_threads = intraOpThreads or os.cpu_count() or 1
+        options.inter_op_num_threads = 1
+        self.__session = onnxruntime.InferenceSession(onnxFile, options, providers=["CPUExecutionProvider"])
+        self.__inputNames = {item.name for item in self.__session.get_inputs()}
+        self.__tokenizer = Tokenizer.from_file(os.path.join(modelPath, "tokenizer.json"))
+        self.__tokenizer.enable_truncation(max_length=maxSeqLength)
+        self.__tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+        with open(os.path.join(modelPath, "config.json"), 'r', encoding='utf-8') as f:
+            self.__dimension = json.load(f)["hidden_size"]
+        self.logger.info(f"ONNX embedding model loaded. File:{onnxFile},IntraOpThreads:{options.intra_op_num_threads}")
+
+    def encode(self,content:Union[str, List[str]],batch_size:int = 32,**kwargs) -> np.ndarray:
+        single = isinstance(content, str)
+        texts = [content] if single else list(content)
+        embeddings = np.zeros((len(texts), self.__dimension), dtype=np.float32)
+        #按长度排序后分批，减少padding
+        order = sorted(range(len(texts)), key=lambda row: len(texts[row]))
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            embeddings[rows] = self.__encodeBatch([texts[row] for row in rows])
+        return embeddings[0] if single else embeddings
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.__dimension
+
+    def __encodeBatch(self,texts:List[str]) -> np.ndarray:
+        encodings = self.__tokenizer.encode_batch(texts)
+        inputs = {"input_ids": np.asarray([encoding.ids for encoding in encodings], dtype=np.int64),
+                  "attention_mask": np.asarray([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+                  "token_type_ids": np.asarray([encoding.type_ids for encoding in encodings], dtype=np.int64)}
+        hiddenStates = self.__session.run(None, {name: value for name, value in inputs.items() if name in self.__inputNames})[0]
+        mask = inputs["attention_mask"][:, :, None].astype(np.float32)
+        return (hiddenStates * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+
+#导出fp32的ONNX模型并做int8动态量化，返回量化模型路径
+def exportOnnxModel(modelPath:str,outputDir:str) -> str:
+    import torch
+    from transformers import AutoModel
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    logger = initLogger(__name__)
+    os.makedirs(outputDir, exist_ok=True)
+    fp32File = os.path.join(outputDir, ONNX_FP32_FILE)
+    int8File = os.path.join(outputDir, ONNX_INT8_FILE)
+    model = AutoModel.from_pretrained(modelPath)
+    model.eval()
+    dummy = {name: torch.ones((1, 8), dtype=torch.long) for name in ONNX_INPUTS}
+    dynamicAxes = {name: {0: "batch", 1: "sequence"} for name in ONNX_INPUTS}
+    dynamicAxes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    dynamicAxes["pooler_output"] = {0: "batch"}
+    with torch.no_grad():
+        torch.onnx.export(model, (dummy,), fp32File, input_names=ONNX_INPUTS, output_names=["last_hidden_state", "pooler_output"],
+                          dynamic_axes=dynamicAxes, opset_version=14)
+    quantize_dynamic(fp32File, int8File, weight_type=QuantType.QInt8)
+    logger.info(f"ONNX model exported. FP32:{os.path.getsize(fp32File) / 1024 / 1024:.1f}MB,"
+                f"INT8:{os.path.getsize(int8File) / 1024 / 1024:.1f}MB,Path:{outputDir}")
+    return int8File
+
+#读取意图数据集中的全部文本
+def loadDatasetTexts() -> List[str]:
+    from Rag.intentIndexStore import INTENT_DATASET
+    texts = []
+    for datasetPath in INTENT_DATASET.values():
+        with open(getAbsolutePath(datasetPath), 'r', encoding='utf-8') as f:
+            texts.extend(json.loads(line)["text"] for line in f if line.strip())
+    return texts
+
+#对比ONNX模型与PyTorch模型在意图数据集上的输出，返回逐条余弦相似度
+def verifyOnnxModel(modelPath:str,onnxModel:OnnxEmbeddingModel,texts:List[str],batchSize:int = 32) -> np.ndarray:
+    from sentence_transformers import SentenceTransformer
+    torchModel = SentenceTransformer(modelPath, device="cpu")
+    #两边使用相同的截断长度
+    torchModel.max_seq_length = onnxModel.maxSeqLength
+    expected = normalizeVectors(np.asarray(torchModel.encode(texts, batch_size=batchSize, convert_to_numpy=True), dtype=np.float32))
+    actual = normalizeVectors(onnxModel.encode(texts, batch_size=batchSize))
+    return (expected * actual).sum(axis=1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, quantise and verify the ONNX embedding backend")
+    parser.add_argument("--export", action="store_true", help="export the model to ONNX and quantise it to int8")
+    parser.add_argument("--verify", action="store_true", help="compare cosine similarity with the PyTorch model on the intent dataset")
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="verification fails below this minimum cosine")
+    args = parser.parse_args()
+    logger = initLogger(__name__)
+    config = loadYmlFile(getAbsolutePath("../Config/config.yml")).get("embedding", {})
+    onnxConfig = config.get("onnx", {})
+    modelPath = getAbsolutePath(config.get("model_path", "../Rag/EmbeddingModel/"))
+    onnxFile = getAbsolutePath(onnxConfig.get("model_file", "../Rag/EmbeddingModel/onnx/model_int8.onnx"))
+    if args.export:
+        exportOnnxModel(modelPath, os.path.dirname(onnxFile))
+    if args.verify:
+        onnxModel = OnnxEmbeddingModel(modelPath, onnxFile, onnxConfig.get("intra_op_threads"), onnxConfig.get("max_seq_length", 128))
+        texts = loadDatasetTexts()
+        start = time.monotonic()
+        cosines = verifyOnnxModel(modelPath, onnxModel, texts)
+        logger.info(f"ONNX verification. Texts:{len(texts)},CosineMean:{cosines.mean():.5f},CosineP1:{np.percentile(cosines, 1):.5f},"
+                    f"CosineMin:{cosines.min():.5f},Cost:{time.monotonic() - start:.1f}s")
+        if cosines.min() < args.min_cosine:
+            logger.error(f"ONNX verification failed! {int((cosines < args.min_cosine).sum())} texts below {args.min_cosine}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x12\x61gentService.proto\x12\x05\x61gent\"@\n\rsystemRequest\x12\x0e\n\x06userId\x18\x01 \x01(\x05\x12\x10\n\x08userType\x18\x02 \x01(\x05\x12\r\n\x05query\x18\x03 \x01(\t\"<\n\ragentResponse\x12\x0c\n\x04\x63ode\x18\x01 \x01(\x05\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x0c\n\x04\x64\x61ta\x18\x03 \x01(\t2I\n\x0c\x61gentService\x12\x39\n\x0bgetUserInfo\x12\x14.agent.systemRequest\x1a\x14.agent.agentResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x12\x61gentService.proto\x12\x05\x61gent\"@\n\rsystemRequest\x12\x0e\n\x06userId\x18\x01 \x01(\x05\x12\x10\n\x08userType\x18\x02 \x01(\x05\x12\r\n\x05query\x18\x03 \x01(\t\"<\n\ragentResponse\x12\x0c\n\x04\x63ode\x18\x01 \x01(\x05\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x0c\n\x04\x64\x61ta\x18\x03 \x01(\t\"@\n\x13\x61gentStreamResponse\x12\x0c\n\x04\x63ode\x18\x01 \x01(\x05\x12\r\n\x05\x65vent\x18\x02 \x01(\t\x12\x0c\n\x04\x64\x61ta\x18\x03 \x01(\t2\x8f\x01\n\x0c\x61gentService\x12\x39\n\x0bgetUserInfo\x12\x14.agent.systemRequest\x1a\x14.agent.agentResponse\x12\x44\n\x0estreamUserInfo\x12\x14.agent.systemRequest\x1a\x1a.agent.agentStreamResponse0\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -35,6 +35,8 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_SYSTEMREQUEST']._serialized_end=93
   _globals['_AGENTRESPONSE']._serialized_start=95
   _globals['_AGENTRESPONSE']._serialized_end=155
-  _globals['_AGENTSERVICE']._serialized_start=157
-  _globals['_AGENTSERVICE']._serialized_end=230
+  _globals['_AGENTSTREAMRESPONSE']._serialized_start=157
+  _globals['_AGENTSTREAMRESPONSE']._serialized_end=221
+  _globals['_AGENTSERVICE']._serialized_start=224
+  _globals['_AGENTSERVICE']._serialized_end=367
 # @@protoc_insertion_point(module_scope)
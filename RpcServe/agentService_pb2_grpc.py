@@ -39,6 +39,11 @@ class agentServiceStub(object):
                 request_serializer=agentService__pb2.systemRequest.SerializeToString,
                 response_deserializer=agentService__pb2.agentResponse.FromString,
                 _registered_method=True)
+        self.streamUserInfo = channel.unary_stream(
+                '/agent.agentService/streamUserInfo',
+                request_serializer=agentService__pb2.systemRequest.SerializeToString,
+                response_deserializer=agentService__pb2.agentStreamResponse.FromString,
+                _registered_method=True)
 
 
 class agentServiceServicer(object):
@@ -51,6 +56,13 @@ class agentServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def streamUserInfo(self, request, context):
+        """服务端流式 RPC：先推送阶段事件，再逐token推送最终回答
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_agentServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -59,6 +71,11 @@ def add_agentServiceServicer_to_server(servicer, server):
                     request_deserializer=agentService__pb2.systemRequest.FromString,
                     response_serializer=agentService__pb2.agentResponse.SerializeToString,
             ),
+            'streamUserInfo': grpc.unary_stream_rpc_method_handler(
+                    servicer.streamUserInfo,
+                    request_deserializer=agentService__pb2.systemRequest.FromString,
+                    response_serializer=agentService__pb2.agentStreamResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'agent.agentService', rpc_method_handlers)
@@ -96,3 +113,30 @@ class agentService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def streamUserInfo(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/agent.agentService/streamUserInfo',
+            agentService__pb2.systemRequest.SerializeToString,
+            agentService__pb2.agentStreamResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
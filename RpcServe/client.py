@@ -20,6 +20,21 @@ def get_user_info(user_id):
             # 捕获并处理 gRPC 异常
             print(f"Error: {e.code()}, {e.details()}")
 
+# 调用流式接口，边接收边打印
+def stream_user_info(user_id):
+    with grpc.insecure_channel("localhost:50051") as channel:
+        stub = agentService_pb2_grpc.agentServiceStub(channel)
+        request = agentService_pb2.systemRequest(userId=user_id,userType = 1,query = "我有哪些优惠券能用")
+        try:
+            # 服务端流式 RPC，返回响应迭代器
+            for response in stub.streamUserInfo(request):
+                if response.event == "answerToken":
+                    print(response.data, end="", flush=True)
+                else:
+                    print(f"\n[{response.event}] {response.data}")
+        except grpc.RpcError as e:
+            print(f"Error: {e.code()}, {e.details()}")
+
 if __name__ == "__main__":
     # 调用服务，查询 ID=1 的用户信息
     get_user_info(1)
@@ -1,18 +1,83 @@
+import asyncio
+import contextvars
 import os
 import sys
+import threading
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_dir)
 from concurrent import futures
 import grpc
-from Common.utils import initLogger
+from Common.LLMCommon.retryPolicy import setRequestDeadline
+from Common.utils import initLogger, getAbsolutePath, loadYmlFile
 from Model.Enums.intentEnum import userType
 import agentService_pb2
 import agentService_pb2_grpc
-from WorkFlow.decisionAgent import decisionAgent
-from WorkFlow.inputDetection import inputDetection
-from WorkFlow.intenRecognition import intentRecognition
+from WorkFlow.decisionAgent import decisionAgent, adecisionAgent, decisionAgentStream, adecisionAgentStream
+from WorkFlow.inputDetection import inputDetection, ainputDetection
+from WorkFlow.intenRecognition import intentRecognition, aintentRecognition
 
 
+#读取gRPC服务配置
+def __loadGrpcConfig():
+    config = loadYmlFile(getAbsolutePath("../Config/config.yml"))
+    return config.get("grpc", {})
+
+#投机执行意图识别所用的线程池(thread模式)
+SPECULATIVE_EXECUTOR = futures.ThreadPoolExecutor(max_workers=__loadGrpcConfig().get("max_workers", 50),thread_name_prefix="speculative")
+
+#构造流式响应的单条消息
+def buildStreamResponse(event:str,data:str = "",code:int = 200):
+    return agentService_pb2.agentStreamResponse(code = code,event = event,data = data)
+
+#构造输入检测不通过的响应
+def buildRejectResponse(reason:str):
+    return agentService_pb2.agentResponse(
+        code = 202,
+        message = "Input Detection Failed",
+        data = reason,
+    )
+
+#输入检测与意图识别同时启动，检测结束即返回，不等待意图识别；检测不通过时取消意图识别
+#返回(检测结果,意图识别的Future或None,取消意图识别的Event)
+def startSpeculativeRecognition(userId:int,type:userType,query:str):
+    cancelEvent = threading.Event()
+    #复制上下文，请求的deadline随之带入线程池
+    intentFuture = SPECULATIVE_EXECUTOR.submit(contextvars.copy_context().run,intentRecognition,type,query,str(userId),cancelEvent)
+    try:
+        detectionRes = inputDetection(userId, query)
+    except Exception:
+        cancelEvent.set()
+        raise
+    if not detectionRes.isPassed:
+        #尚未开始的任务直接取消，已经在执行的任务在下一个节点前退出
+        cancelEvent.set()
+        intentFuture.cancel()
+        return detectionRes, None, cancelEvent
+    return detectionRes, intentFuture, cancelEvent
+
+#投机执行并等待意图识别完成，返回(检测结果,意图识别结果或None)
+def speculativeRecognition(userId:int,type:userType,query:str):
+    detectionRes, intentFuture, _ = startSpeculativeRecognition(userId,type,query)
+    return detectionRes, intentFuture.result() if intentFuture is not None else None
+
+#投机执行(异步)，检测结束即返回(检测结果,意图识别任务或None)；检测不通过时直接取消意图识别任务，正在进行的LLM请求一并中断
+async def astartSpeculativeRecognition(userId:int,type:userType,query:str):
+    intentTask = asyncio.create_task(aintentRecognition(type,query,str(userId)))
+    try:
+        detectionRes = await ainputDetection(userId, query)
+    except BaseException:
+        intentTask.cancel()
+        raise
+    if not detectionRes.isPassed:
+        intentTask.cancel()
+        return detectionRes, None
+    return detectionRes, intentTask
+
+#投机执行(异步)并等待意图识别完成
+async def aspeculativeRecognition(userId:int,type:userType,query:str):
+    detectionRes, intentTask = await astartSpeculativeRecognition(userId,type,query)
+    return detectionRes, await intentTask if intentTask is not None else None
+
 class agentServiceServicer(agentService_pb2_grpc.agentServiceServicer):
     #实现接口方法
     def getUserInfo(self, request, context):
@@ -20,9 +85,12 @@ class agentServiceServicer(agentService_pb2_grpc.agentServiceServicer):
         userId = request.userId
         query = request.query
         type = userType(request.userType)
-        # agent执行
-        inputDetection(userId, query)
-        intentRecognitionRes = intentRecognition(type,query,str(userId))
+        #客户端的deadline传递给所有LLM调用
+        setRequestDeadline(context.time_remaining())
+        # agent执行，输入检测与意图识别并行
+        detectionRes, intentRecognitionRes = speculativeRecognition(userId,type,query)
+        if not detectionRes.isPassed:
+            return buildRejectResponse(detectionRes.reason)
         if intentRecognitionRes.isItentClearly:
             decisionRes =  decisionAgent({"userId": userId}, intentRecognitionRes.userInput, intentRecognitionRes.outPut, "")
             agentAnswer = decisionRes.finalAnswer
@@ -41,19 +109,120 @@ class agentServiceServicer(agentService_pb2_grpc.agentServiceServicer):
                 message="Agent Execution Failed",
                 data="",
             )
+    #服务端流式接口：先推送阶段事件，再逐token推送最终回答
+    def streamUserInfo(self, request, context):
+        userId = request.userId
+        query = request.query
+        type = userType(request.userType)
+        #客户端的deadline传递给所有LLM调用
+        setRequestDeadline(context.time_remaining())
+        detectionRes, intentFuture, cancelEvent = startSpeculativeRecognition(userId,type,query)
+        if not detectionRes.isPassed:
+            yield buildStreamResponse("detectionRejected",detectionRes.reason,202)
+            return
+        try:
+            #检测通过后立即推送，意图识别在后台继续
+            yield buildStreamResponse("detectionPassed")
+            intentRecognitionRes = intentFuture.result()
+        finally:
+            #客户端提前断开时中止还在进行的意图识别
+            if not intentFuture.done():
+                cancelEvent.set()
+                intentFuture.cancel()
+        yield buildStreamResponse("intentRecognised",intentRecognitionRes.outPut)
+        if intentRecognitionRes.isItentClearly:
+            for event,data in decisionAgentStream({"userId": userId}, intentRecognitionRes.userInput, intentRecognitionRes.outPut, ""):
+                yield buildStreamResponse(event,data)
+        else:
+            #意图不明确时直接返回追问话术
+            yield buildStreamResponse("answerToken",intentRecognitionRes.outPut)
+        yield buildStreamResponse("finish")
+
+class agentServiceAsyncServicer(agentService_pb2_grpc.agentServiceServicer):
+    #grpc.aio版本的接口实现，等待LLM期间不占用线程
+    async def getUserInfo(self, request, context):
+        userId = request.userId
+        query = request.query
+        type = userType(request.userType)
+        #客户端的deadline传递给所有LLM调用
+        setRequestDeadline(context.time_remaining())
+        # agent执行，输入检测与意图识别并行
+        detectionRes, intentRecognitionRes = await aspeculativeRecognition(userId,type,query)
+        if not detectionRes.isPassed:
+            return buildRejectResponse(detectionRes.reason)
+        if intentRecognitionRes.isItentClearly:
+            decisionRes = await adecisionAgent({"userId": userId}, intentRecognitionRes.userInput, intentRecognitionRes.outPut, "")
+            agentAnswer = decisionRes.finalAnswer
+        else:
+            agentAnswer = intentRecognitionRes.outPut
+        if agentAnswer and len(agentAnswer) != 0:
+            return agentService_pb2.agentResponse(
+                code = 200,
+                message = "",
+                data = agentAnswer,
+            )
+        else:
+            return agentService_pb2.agentResponse(
+                code=201,
+                message="Agent Execution Failed",
+                data="",
+            )
+    #服务端流式接口(异步)
+    async def streamUserInfo(self, request, context):
+        userId = request.userId
+        query = request.query
+        type = userType(request.userType)
+        #客户端的deadline传递给所有LLM调用
+        setRequestDeadline(context.time_remaining())
+        detectionRes, intentTask = await astartSpeculativeRecognition(userId,type,query)
+        if not detectionRes.isPassed:
+            yield buildStreamResponse("detectionRejected",detectionRes.reason,202)
+            return
+        try:
+            #检测通过后立即推送，意图识别在后台继续
+            yield buildStreamResponse("detectionPassed")
+            intentRecognitionRes = await intentTask
+        finally:
+            #客户端提前断开时取消还在进行的意图识别
+            if not intentTask.done():
+                intentTask.cancel()
+        yield buildStreamResponse("intentRecognised",intentRecognitionRes.outPut)
+        if intentRecognitionRes.isItentClearly:
+            async for event,data in adecisionAgentStream({"userId": userId}, intentRecognitionRes.userInput, intentRecognitionRes.outPut, ""):
+                yield buildStreamResponse(event,data)
+        else:
+            #意图不明确时直接返回追问话术
+            yield buildStreamResponse("answerToken",intentRecognitionRes.outPut)
+        yield buildStreamResponse("finish")
+
 def serve():
     logger = initLogger(__name__)
+    grpcConfig = __loadGrpcConfig()
+    port = grpcConfig.get("port", 50051)
     # 创建 gRPC 服务器（使用多线程处理请求）
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=50))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=grpcConfig.get("max_workers", 50)))
     # 注册自定义的服务实现到服务器
     agentService_pb2_grpc.add_agentServiceServicer_to_server(agentServiceServicer(), server)
     # 绑定端口（格式：[::]:端口号，支持 IPv4/IPv6）
-    server.add_insecure_port("[::]:50051")
+    server.add_insecure_port(f"[::]:{port}")
     # 启动服务器
-    logger.info("gRPC server started on port 50051...")
+    logger.info(f"gRPC server started on port {port}...")
     server.start()
     # 保持服务器运行（阻塞主线程）
     server.wait_for_termination()
 
+#grpc.aio服务，单个事件循环承载所有会话
+async def serveAsync():
+    logger = initLogger(__name__)
+    grpcConfig = __loadGrpcConfig()
+    port = grpcConfig.get("port", 50051)
+    # 限制同时处理的请求数，超过的请求直接返回RESOURCE_EXHAUSTED
+    server = grpc.aio.server(maximum_concurrent_rpcs=grpcConfig.get("max_concurrent_rpcs", 5000))
+    agentService_pb2_grpc.add_agentServiceServicer_to_server(agentServiceAsyncServicer(), server)
+    server.add_insecure_port(f"[::]:{port}")
+    logger.info(f"gRPC aio server started on port {port}...")
+    await server.start()
+    await server.wait_for_termination()
+
 if __name__ == "__main__":
     serve()
\ No newline at end of file
@@ -0,0 +1,75 @@
+import random
+import pytest
+from Common.utils import ACAutomaton, ArrayACAutomaton, ACStreamMatcher
+
+WORDS = ["他", "他们", "们好", "你好", "好人", "坏人", "你好坏", "大坏蛋", "好"]
+
+
+def buildAutomaton(automatonCls, words):
+    automaton = automatonCls()
+    for word in words:
+        automaton.add_sensitive_word(word)
+    automaton.build_fail_pointer()
+    return automaton
+
+
+def bruteForceMatch(words, text):
+    return {word for word in words if word and word in text}
+
+
+@pytest.mark.parametrize("automatonCls", [ACAutomaton, ArrayACAutomaton])
+def testMatch(automatonCls):
+    automaton = buildAutomaton(automatonCls, WORDS)
+    assert sorted(automaton.match("他们好你好坏大坏蛋")) == sorted(["他", "他们", "们好", "好", "你好", "你好坏", "大坏蛋"])
+    assert automaton.match("") == []
+    assert automaton.match("没有敏感词") == []
+
+
+@pytest.mark.parametrize("automatonCls", [ACAutomaton, ArrayACAutomaton])
+def testMatchAgreesWithBruteForce(automatonCls):
+    #小字符集让词之间大量重叠，覆盖失败指针与输出链接的各种情况
+    rng = random.Random(7)
+    alphabet = "abcd"
+    for _ in range(50):
+        words = {"".join(rng.choice(alphabet) for _ in range(rng.randint(1, 5))) for _ in range(rng.randint(1, 20))}
+        automaton = buildAutomaton(automatonCls, words)
+        for _ in range(20):
+            text = "".join(rng.choice(alphabet + "x") for _ in range(rng.randint(0, 40)))
+            assert set(automaton.match(text)) == bruteForceMatch(words, text)
+
+
+def testDuplicateAndEmptyWordsIgnored():
+    automaton = buildAutomaton(ArrayACAutomaton, ["坏人", "坏人", ""])
+    assert automaton.words == ["坏人"]
+    assert automaton.match("坏人坏人") == ["坏人"]
+
+
+def bruteForceHits(words, text):
+    return sorted((start, start + len(word), word) for word in words if word
+                  for start in range(len(text) - len(word) + 1) if text.startswith(word, start))
+
+
+@pytest.mark.parametrize("automatonCls", [ACAutomaton, ArrayACAutomaton])
+def testMatchBatchPositions(automatonCls):
+    automaton = buildAutomaton(automatonCls, WORDS)
+    texts = ["他们好", "", "你好坏人", "没有"]
+    results = automaton.match_batch(texts)
+    assert [sorted(hits) for hits in results] == [bruteForceHits(WORDS, text) for text in texts]
+    assert sorted(results[0]) == [(0, 1, "他"), (0, 2, "他们"), (1, 3, "们好"), (2, 3, "好")]
+
+
+@pytest.mark.parametrize("automatonCls", [ACAutomaton, ArrayACAutomaton])
+def testStreamMatcherAcrossChunks(automatonCls):
+    automaton = buildAutomaton(automatonCls, WORDS)
+    rng = random.Random(11)
+    text = "你好坏他们好大坏蛋好人你" * 3
+    for _ in range(20):
+        #随机切分，跨段的敏感词也要命中，位置相对于完整文本
+        cuts = sorted(rng.sample(range(1, len(text)), rng.randint(1, 10)))
+        chunks = [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+        matcher = ACStreamMatcher(automaton)
+        hits = [hit for chunk in chunks for hit in matcher.feed(chunk)]
+        assert sorted(hits) == bruteForceHits(WORDS, text)
+        assert matcher.matched == bruteForceMatch(WORDS, text)
+        matcher.reset()
+        assert matcher.feed("大坏") == [] and matcher.feed("蛋") == [(0, 3, "大坏蛋")]
@@ -0,0 +1,102 @@
+import time
+from Common.ToolFunction.circuitBreaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+BREAKER_CONFIG = {"window_size": 4, "min_calls": 2, "failure_rate": 0.5, "slow_call_seconds": 1,
+                  "open_seconds": 0.05, "half_open_calls": 1}
+
+
+def openBreaker() -> CircuitBreaker:
+    breaker = CircuitBreaker("testTool", BREAKER_CONFIG)
+    breaker.recordSuccess(0.01)
+    breaker.recordFailure(0.01)
+    assert breaker.stats()["state"] == OPEN
+    return breaker
+
+
+def testOpensAtFailureRate():
+    breaker = CircuitBreaker("testTool", BREAKER_CONFIG)
+    breaker.recordFailure(0.01)
+    #未达到min_calls不熔断
+    assert breaker.stats()["state"] == CLOSED
+    breaker.recordSuccess(0.01)
+    breaker.recordSuccess(0.01)
+    breaker.recordFailure(0.01)
+    assert breaker.stats()["state"] == OPEN
+    assert not breaker.allow()
+    assert not breaker.isAvailable()
+    assert breaker.stats()["rejected"] == 1
+
+
+def testSlowCallCountsAsFailure():
+    breaker = CircuitBreaker("testTool", BREAKER_CONFIG)
+    breaker.recordSuccess(0.01)
+    breaker.recordSuccess(2)
+    stats = breaker.stats()
+    assert stats["state"] == OPEN
+    assert stats["slow"] == 1
+
+
+def testHalfOpenProbeSuccessCloses():
+    breaker = openBreaker()
+    time.sleep(0.06)
+    assert breaker.isAvailable()
+    assert breaker.allow()
+    assert breaker.stats()["state"] == HALF_OPEN
+    #探测名额只有一个
+    assert not breaker.allow()
+    breaker.recordSuccess(0.01)
+    stats = breaker.stats()
+    assert stats["state"] == CLOSED
+    assert stats["failureRate"] == 0.0
+
+
+def testHalfOpenProbeFailureReopens():
+    breaker = openBreaker()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.recordFailure(0.01)
+    stats = breaker.stats()
+    assert stats["state"] == OPEN
+    assert stats["opened"] == 2
+
+
+def testIgnoredReleasesProbe():
+    breaker = openBreaker()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.recordIgnored()
+    assert breaker.stats()["state"] == HALF_OPEN
+    assert breaker.allow()
+
+
+def testIgnoredNotCounted():
+    breaker = CircuitBreaker("testTool", BREAKER_CONFIG)
+    for _ in range(4):
+        breaker.recordIgnored()
+    stats = breaker.stats()
+    assert stats["state"] == CLOSED
+    assert stats["success"] == stats["failure"] == 0
+
+
+def testDisabledOnlyCounts():
+    breaker = CircuitBreaker("testTool", dict(BREAKER_CONFIG, enable=False))
+    for _ in range(4):
+        breaker.recordFailure(0.01)
+    assert breaker.allow()
+    assert breaker.stats()["failure"] == 4
+
+
+def testOnlyServiceFailuresCounted(monkeypatch):
+    import httpx
+    import Common.ToolFunction.toolRegistery as toolRegistery
+    from Common.ToolFunction.circuitBreaker import getCircuitBreaker
+    from Common.ToolFunction.toolHttpClient import ToolHttpError
+    errors = [ValueError("bad argument"), ToolHttpError("error response 500"), httpx.ConnectError("refused")]
+
+    def flakyTool():
+        raise errors.pop(0)
+
+    monkeypatch.setitem(toolRegistery.TOOL_INDEX, "flakytool", {"name": "flakyTool", "func": flakyTool, "params": []})
+    for _ in range(3):
+        assert toolRegistery.callAgentTool("flakyTool") == toolRegistery.TOOL_FAILED_ANSWER
+    assert getCircuitBreaker("flakyTool").stats()["failure"] == 2
@@ -0,0 +1,56 @@
+import WorkFlow.decisionAgent as decisionAgent
+
+TOOL_ROW = {"toolName": "findNoUsePage", "toolCapability": "查询未使用的优惠券", "inputPara": "userId,page,limit",
+            "intentList": "['优惠券咨询']"}
+
+
+class FakeToken:
+    def __init__(self,content):
+        self.content = content
+
+
+class FakeModel:
+    """第一步不调用工具，第二步调用findNoUsePage，第三步结束"""
+    def __init__(self):
+        self.thinks = 0
+
+    def invokeJsonStream(self,query,onField = None,**kwargs):
+        self.thinks += 1
+        return {"isEnd": self.thinks > 2, "thoughtAns": "思考", "action": "行动"}
+
+    def invokeJson(self,query,**kwargs):
+        if "选择性地进行工具调用" in query:
+            if self.thinks == 1:
+                return {"toolCalls": []}
+            return {"toolCalls": [{"toolName": "findNoUsePage", "reason": "查询优惠券"}]}
+        if "输入参数的提取" in query:
+            return {"paraLists": {"findNoUsePage": {"userId": 1, "page": 1, "limit": 10}}}
+        return {"userEmotion": "平静", "outputTone": "礼貌"}
+
+    def invoke(self,query,stream = False):
+        return iter([FakeToken("您有"), FakeToken("一张优惠券")])
+
+
+class FakeCatalogue:
+    def toolsForIntent(self,intent):
+        return [TOOL_ROW]
+
+
+class FakeSession:
+    def add(self,record):
+        pass
+
+    def commit(self):
+        pass
+
+    def refresh(self,record):
+        pass
+
+
+def testZeroToolStepEmitsNoToolEvent(monkeypatch):
+    monkeypatch.setattr(decisionAgent, "model", FakeModel())
+    monkeypatch.setattr(decisionAgent, "getToolCatalogue", lambda: FakeCatalogue())
+    monkeypatch.setattr(decisionAgent, "callAgentTools", lambda toolParams: ["优惠券:1张"] * len(toolParams))
+    monkeypatch.setattr(decisionAgent, "getDbSession", lambda dbAlias: iter([FakeSession()]))
+    events = list(decisionAgent.decisionAgentStream({"userId": 1}, "我有优惠券吗", "优惠券咨询", ""))
+    assert events == [("toolCalled", "findNoUsePage"), ("answerToken", "您有"), ("answerToken", "一张优惠券")]
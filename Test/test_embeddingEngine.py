@@ -0,0 +1,90 @@
+import threading
+import time
+import numpy as np
+import pytest
+import Rag.embeddingEngine as embeddingEngine
+from Rag.embeddingEngine import EmbeddingEngine
+
+
+class FakeModel:
+    """向量为[文本长度,序号]，第一批在release之前阻塞，让后续请求排队"""
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def encode(self,texts,batch_size = 32,convert_to_numpy = True):
+        self.batches.append(list(texts))
+        self.started.set()
+        self.release.wait(5)
+        if "error" in texts:
+            raise RuntimeError("encode failed")
+        return np.array([[len(text), index] for index, text in enumerate(texts)], dtype=np.float32)
+
+    def get_sentence_embedding_dimension(self):
+        return 2
+
+
+@pytest.fixture
+def fakeModel(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(embeddingEngine, "loadEmbeddingModel", lambda *args, **kwargs: model)
+    return model
+
+
+def encodeInThreads(engine:EmbeddingEngine,contents:list) -> list:
+    results = [None] * len(contents)
+
+    def encode(index):
+        try:
+            results[index] = engine.encode(contents[index], timeout=5)
+        except Exception as e:
+            results[index] = e
+    threads = [threading.Thread(target=encode, args=(index,)) for index in range(len(contents))]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def testSingleAndListShapes(fakeModel):
+    fakeModel.release.set()
+    engine = EmbeddingEngine("fake", maxWait=0)
+    assert engine.encode("你好").tolist() == [2, 0]
+    assert engine.encode(["a", "bcd"]).tolist() == [[1, 0], [3, 1]]
+    assert engine.encode([]).shape == (0, 2)
+
+
+def testConcurrentRequestsBatched(fakeModel):
+    engine = EmbeddingEngine("fake", maxBatchSize=4, maxWait=0.05)
+    blocker, _ = encodeInThreads(engine, ["first"])
+    fakeModel.started.wait(5)
+    #第一批阻塞期间到达的请求合并成批，单批不超过maxBatchSize条文本(最后一个请求可以越过上限)
+    threads, results = encodeInThreads(engine, ["a", "bb", ["ccc", "dddd"], "eeeee", "ffffff"])
+    while engine.stats()["queueLength"] < 5:
+        time.sleep(0.001)
+    fakeModel.release.set()
+    for thread in blocker + threads:
+        thread.join()
+    assert len(fakeModel.batches[0]) == 1
+    assert sum(len(batch) for batch in fakeModel.batches[1:]) == 6
+    assert len(fakeModel.batches) == 3
+    #每个请求拿到自己的那部分结果
+    assert [result[..., 0].tolist() for result in results] == [1, 2, [3, 4], 5, 6]
+    stats = engine.stats()
+    assert (stats["requests"], stats["texts"], stats["batches"]) == (6, 7, len(fakeModel.batches))
+
+
+def testBatchFailurePropagatesToEveryRequest(fakeModel):
+    engine = EmbeddingEngine("fake", maxBatchSize=8, maxWait=0.05)
+    blocker, _ = encodeInThreads(engine, ["first"])
+    fakeModel.started.wait(5)
+    threads, results = encodeInThreads(engine, ["error", "other"])
+    while engine.stats()["queueLength"] < 2:
+        time.sleep(0.001)
+    fakeModel.release.set()
+    for thread in blocker + threads:
+        thread.join()
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert engine.stats()["errors"] == 2
+    #失败后引擎继续工作
+    assert engine.encode("ok").tolist() == [2, 0]
@@ -0,0 +1,90 @@
+import time
+from collections import Counter
+from Common.LLMCommon.endpointRouter import EndpointRouter, LLMEndpoint
+from Common.LLMCommon.rateLimiter import LLMRateLimiter
+
+
+def buildEndpoint(name:str,weight:float = 1) -> LLMEndpoint:
+    rateLimiter = LLMRateLimiter(name, rpm=1000, tpm=100000, maxConcurrency=10, outputTokens=0)
+    return LLMEndpoint(name, f"http://{name}/v1", "Qwen", None, weight, rateLimiter)
+
+
+def buildRouter(count:int = 2,routingConfig = None,hedgeConfig = None) -> EndpointRouter:
+    endpoints = [buildEndpoint(f"endpoint{index}") for index in range(count)]
+    return EndpointRouter(endpoints, routingConfig or {"failure_threshold": 2, "cooldown": 60}, hedgeConfig or {})
+
+
+def testPickPrefersFasterEndpoint():
+    router = buildRouter()
+    fast, slow = router.endpoints
+    router.recordSuccess(fast, 0.1)
+    router.recordSuccess(slow, 1.0)
+    picks = Counter(router.pick().name for _ in range(2000))
+    assert picks["endpoint0"] > picks["endpoint1"] * 5
+
+
+def testZeroWeightOnlyAsFallback():
+    router = buildRouter()
+    primary, backup = router.endpoints
+    backup.weight = 0
+    assert {router.pick().name for _ in range(200)} == {"endpoint0"}
+    assert router.pick(exclude=[primary]) is backup
+
+
+def testConsecutiveFailuresCoolDown():
+    router = buildRouter()
+    broken, healthy = router.endpoints
+    router.recordFailure(broken)
+    assert router.stats()["endpoint0"]["healthy"] is True
+    router.recordFailure(broken)
+    assert router.stats()["endpoint0"]["healthy"] is False
+    assert {router.pick().name for _ in range(200)} == {"endpoint1"}
+    #成功后立即恢复
+    router.recordSuccess(broken, 0.1)
+    assert router.stats()["endpoint0"]["healthy"] is True
+
+
+def testAllCoolingPicksEarliestRecovery():
+    router = buildRouter()
+    first, second = router.endpoints
+    for endpoint in (second, first):
+        router.recordFailure(endpoint)
+        router.recordFailure(endpoint)
+    assert router.pick() is second
+    second.openUntil = time.monotonic() - 1
+    assert router.pick(exclude=[second]) is first
+
+
+def testHedgeDelayFromLatencyPercentile():
+    router = buildRouter(hedgeConfig={"enable": True, "min_samples": 10, "default_delay": 5,
+                                      "percentile": 90, "min_delay": 0.5, "max_delay": 3})
+    endpoint = router.endpoints[0]
+    assert router.hedgeDelay(endpoint) == 3 #样本不足时用默认值，并受max_delay限制
+    for latency in range(1, 11):
+        router.recordSuccess(endpoint, latency / 10)
+    assert router.hedgeDelay(endpoint) == 1.0
+    #被取消的慢请求也计入延迟样本
+    for _ in range(10):
+        router.recordCancelled(endpoint, 20)
+    assert router.hedgeDelay(endpoint) == 3
+
+
+def testHedgeDisabledWithSingleEndpoint():
+    router = buildRouter(count=1, hedgeConfig={"enable": True})
+    assert router.hedgeDelay(router.endpoints[0]) is None
+
+
+def testStats():
+    router = buildRouter()
+    endpoint = router.endpoints[0]
+    router.recordSuccess(endpoint, 0.2)
+    router.recordFailure(endpoint)
+    router.recordCancelled(endpoint, 0.4)
+    router.recordHedge(True)
+    router.recordHedge(False)
+    stats = router.stats()
+    assert (stats["hedged"], stats["hedgeWin"]) == (2, 1)
+    endpointStats = stats["endpoint0"]
+    assert (endpointStats["success"], endpointStats["failure"], endpointStats["cancelled"]) == (1, 1, 1)
+    assert endpointStats["latencyP50"] == 0.4
+    assert abs(endpointStats["ewmaLatency"] - 0.24) < 1e-9
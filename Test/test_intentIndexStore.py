@@ -0,0 +1,59 @@
+import json
+import os
+import numpy as np
+from Common.utils import normalizeVectors
+from Model.Enums.intentEnum import userType
+from Rag.intentIndexStore import IntentIndexStore, META_FILE, createFaissIndex, writeIntentIndex, newVersionDir, \
+    publishVersion, readCurrentVersion, INTENT_ENUM
+
+IVFPQ_CONFIG = {"type": "ivfpq", "nlist": 4, "pq_m": 4, "nbits": 8, "nprobe": 4}
+
+
+def randomVectors(count:int) -> np.ndarray:
+    return normalizeVectors(np.random.default_rng(0).standard_normal((count, 16)).astype(np.float32))
+
+
+def publish(indexRoot:str,user:userType,count:int,indexConfig) -> str:
+    vectors = randomVectors(count)
+    labels = np.arange(count) % len(INTENT_ENUM[user])
+    version, buildDir = newVersionDir(indexRoot, user)
+    writeIntentIndex(user, vectors, labels, buildDir, None, indexConfig)
+    publishVersion(indexRoot, user, version, buildDir)
+    return version
+
+
+def readMeta(indexRoot:str,user:userType) -> dict:
+    with open(os.path.join(indexRoot, user.name, readCurrentVersion(indexRoot, user), META_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def testIvfpqBuiltWhenEnoughVectors():
+    index, builtConfig = createFaissIndex(randomVectors(512), IVFPQ_CONFIG)
+    assert type(index).__name__ == "IndexIVFPQ"
+    assert builtConfig == {"type": "ivfpq", "nlist": 4, "pq_m": 4, "nbits": 8}
+
+
+def testFallbackRecordedInMeta(tmp_path):
+    indexRoot = str(tmp_path)
+    publish(indexRoot, userType.customer, 100, IVFPQ_CONFIG)
+    meta = readMeta(indexRoot, userType.customer)
+    assert meta["index"] == {"type": "flat"}
+    assert meta["requestedIndex"]["type"] == "ivfpq"
+    assert meta["indexClass"] == "IndexFlatIP"
+
+
+def testFallbackVersionNotRebuilt(tmp_path):
+    indexRoot = str(tmp_path)
+    versions = {user.name: publish(indexRoot, user, 100, IVFPQ_CONFIG) for user in userType}
+    store = IntentIndexStore(indexRoot, reloadInterval=0, indexConfigs={user: IVFPQ_CONFIG for user in userType})
+    assert store.versions() == versions
+
+
+def testConfigChangeRebuilds(tmp_path):
+    indexRoot = str(tmp_path)
+    versions = {user.name: publish(indexRoot, user, 512, None) for user in userType}
+    store = IntentIndexStore(indexRoot, reloadInterval=0, indexConfigs={user: IVFPQ_CONFIG for user in userType})
+    for user in userType:
+        assert store.versions()[user.name] != versions[user.name]
+        assert readMeta(indexRoot, user)["index"]["type"] == "ivfpq"
+        assert type(store.get(user).index).__name__ == "IndexIVFPQ"
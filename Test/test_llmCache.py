@@ -0,0 +1,79 @@
+import time
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+import Common.LLMCommon.llmCache as llmCache
+from Common.LLMCommon.llmCache import LLMResponseCache
+
+
+@pytest.fixture
+def memoryDb(monkeypatch):
+    #用内存SQLite代替DBFile中的缓存库
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    sessionCls = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def getDbSession(dbAlias):
+        session = sessionCls()
+        try:
+            yield session
+        finally:
+            session.close()
+    monkeypatch.setattr(llmCache, "getDbSession", getDbSession)
+    return engine
+
+
+def buildCache(memorySize = 2048,ttl = None) -> LLMResponseCache:
+    return LLMResponseCache({"enable": True, "memory_size": memorySize, "ttl": ttl or {"default": 60}})
+
+
+def testMemoryHitReturnsCopy(memoryDb):
+    cache = buildCache()
+    key = LLMResponseCache.buildKey("Qwen", "prompt", {"temperature": 0})
+    cache.set(key, "intentRecognition", {"intent": ["优惠券咨询"]})
+    cache.get(key)["intent"].append("其他")
+    assert cache.get(key) == {"intent": ["优惠券咨询"]}
+    assert cache.stats()["memoryHit"] == 2
+
+
+def testKeyIncludesDecodeParams(memoryDb):
+    cache = buildCache()
+    cache.set(LLMResponseCache.buildKey("Qwen", "prompt", {"temperature": 0}), "default", {"answer": 1})
+    assert cache.get(LLMResponseCache.buildKey("Qwen", "prompt", {"temperature": 0.7})) is None
+    assert cache.get(LLMResponseCache.buildKey("Other", "prompt", {"temperature": 0})) is None
+
+
+def testZeroTtlNotCached(memoryDb):
+    cache = buildCache(ttl={"default": 60, "toneAnalysis": 0})
+    key = LLMResponseCache.buildKey("Qwen", "prompt", {})
+    cache.set(key, "toneAnalysis", {"tone": "礼貌"})
+    assert cache.get(key) is None
+    assert cache.stats()["write"] == 0
+
+
+def testTtlExpires(memoryDb):
+    cache = buildCache(ttl={"default": 0.05})
+    key = LLMResponseCache.buildKey("Qwen", "prompt", {})
+    cache.set(key, "default", {"answer": 1})
+    assert cache.get(key) == {"answer": 1}
+    time.sleep(0.06)
+    #内存与SQLite中的记录都已过期
+    assert cache.get(key) is None
+    assert cache.stats()["diskHit"] == 0
+
+
+def testEvictedEntryReloadedFromDisk(memoryDb):
+    cache = buildCache(memorySize=1)
+    keys = [LLMResponseCache.buildKey("Qwen", f"prompt{index}", {}) for index in range(2)]
+    cache.set(keys[0], "default", {"answer": 0})
+    cache.set(keys[1], "default", {"answer": 1})
+    assert cache.stats()["evict"] == 1
+    assert cache.get(keys[0]) == {"answer": 0}
+    stats = cache.stats()
+    assert (stats["diskHit"], stats["memorySize"]) == (1, 1)
+
+
+def testRestartReadsPersistedEntry(memoryDb):
+    key = LLMResponseCache.buildKey("Qwen", "prompt", {})
+    buildCache().set(key, "default", {"answer": 1})
+    assert buildCache().get(key) == {"answer": 1}
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+import pytest
+from Common.LLMCommon.rateLimiter import TokenBucket, LLMRateLimiter, getRateLimiter
+from Common.LLMCommon.retryPolicy import LLMDeadlineExceeded
+
+
+def testTokenBucketReservesInArrivalOrder():
+    bucket = TokenBucket(60)
+    assert bucket.reserve(60) == 0
+    #额度用完后每个令牌需要等待1秒，后到的请求排在前一个之后
+    assert bucket.reserve(1) == pytest.approx(1, abs=0.05)
+    assert bucket.reserve(1) == pytest.approx(2, abs=0.05)
+    bucket.refund(2)
+    assert bucket.reserve(1) == pytest.approx(1, abs=0.05)
+
+
+def testRequestsPerMinuteThrottled():
+    limiter = LLMRateLimiter("test", rpm=600, tpm=100000, maxConcurrency=10, outputTokens=0)
+    start = time.monotonic()
+    for _ in range(602):
+        with limiter.acquire("q"):
+            pass
+    #600个令牌用完后每秒补充10个
+    assert time.monotonic() - start >= 0.15
+    stats = limiter.stats()
+    assert (stats["requests"], stats["inFlight"], stats["rejected"]) == (602, 0, 0)
+    assert stats["queued"] >= 1
+
+
+def testWaitBeyondDeadlineRejected():
+    limiter = LLMRateLimiter("test", rpm=60, tpm=100000, maxConcurrency=10, outputTokens=0)
+    for _ in range(60):
+        with limiter.acquire("q"):
+            pass
+    with pytest.raises(LLMDeadlineExceeded):
+        with limiter.acquire("q", deadline=time.monotonic() + 0.1):
+            pass
+    #被拒绝的请求归还了令牌
+    with limiter.acquire("q", deadline=time.monotonic() + 1.5):
+        pass
+    assert limiter.stats()["rejected"] == 1
+
+
+def testConcurrencyLimited():
+    limiter = LLMRateLimiter("test", rpm=1000, tpm=100000, maxConcurrency=2, outputTokens=0)
+    lock = threading.Lock()
+    running = [0, 0] #当前并发数,最大并发数
+
+    def call():
+        with limiter.acquire("q"):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+
+    threads = [threading.Thread(target=call) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert running[1] == 2
+
+
+def testConcurrencySlotTimeout():
+    limiter = LLMRateLimiter("test", rpm=1000, tpm=100000, maxConcurrency=1, outputTokens=0)
+    with limiter.acquire("q"):
+        with pytest.raises(LLMDeadlineExceeded):
+            with limiter.acquire("q", deadline=time.monotonic() + 0.05):
+                pass
+    assert limiter.stats()["inFlight"] == 0
+
+
+def testAsyncConcurrencyLimited():
+    limiter = LLMRateLimiter("test", rpm=1000, tpm=100000, maxConcurrency=2, outputTokens=0)
+    running = [0, 0]
+
+    async def call():
+        async with limiter.aacquire("q"):
+            running[0] += 1
+            running[1] = max(running)
+            await asyncio.sleep(0.05)
+            running[0] -= 1
+
+    async def main():
+        await asyncio.gather(*[call() for _ in range(6)])
+    asyncio.run(main())
+    assert running[1] == 2
+    assert limiter.stats()["requests"] == 6
+
+
+def testConfigLookupOrder(monkeypatch):
+    monkeypatch.setattr("Common.LLMCommon.rateLimiter.RATE_LIMITER_MAP", {})
+    config = {"default": {"max_concurrency": 1}, "Qwen": {"max_concurrency": 2}, "intent": {"max_concurrency": 3}}
+    assert getRateLimiter("intent", config, "Qwen") is getRateLimiter("intent", config, "Qwen")
+    with getRateLimiter("chat", config, "Qwen").acquire("q"):
+        with getRateLimiter("chat", config, "Qwen").acquire("q"):
+            pass
+    with getRateLimiter("other", config, "Other").acquire("q"):
+        with pytest.raises(LLMDeadlineExceeded):
+            with getRateLimiter("other", config, "Other").acquire("q", deadline=time.monotonic() + 0.05):
+                pass
@@ -0,0 +1,74 @@
+import json
+import time
+import httpx
+import pytest
+from openai import APIStatusError, APITimeoutError
+import Common.LLMCommon.retryPolicy as retryPolicy
+from Common.LLMCommon.retryPolicy import RetryPolicy, JsonParseError, LLMDeadlineExceeded, REQUEST_DEADLINE, setRequestDeadline
+
+REQUEST = httpx.Request("POST", "http://llm/v1/chat/completions")
+
+
+def statusError(statusCode:int) -> APIStatusError:
+    return APIStatusError("error", response=httpx.Response(statusCode, request=REQUEST), body=None)
+
+
+@pytest.fixture(autouse=True)
+def resetDeadline():
+    token = REQUEST_DEADLINE.set(None)
+    yield
+    REQUEST_DEADLINE.reset(token)
+
+
+def testClassify():
+    policy = RetryPolicy()
+    assert policy.classify(JsonParseError("bad json")) == RetryPolicy.RETRY_NOW
+    assert policy.classify(json.JSONDecodeError("bad json", "{", 1)) == RetryPolicy.RETRY_NOW
+    assert policy.classify(APITimeoutError(request=REQUEST)) == RetryPolicy.RETRY
+    assert policy.classify(statusError(429)) == RetryPolicy.RETRY
+    assert policy.classify(statusError(503)) == RetryPolicy.RETRY
+    assert policy.classify(statusError(400)) == RetryPolicy.FATAL
+    assert policy.classify(LLMDeadlineExceeded()) == RetryPolicy.FATAL
+
+
+def testBackoffIsBoundedAndStopsAtMaxAttempts():
+    policy = RetryPolicy(maxAttempts=4, baseDelay=0.5, maxDelay=1)
+    deadline = time.monotonic() + 60
+    error = APITimeoutError(request=REQUEST)
+    for attempt, bound in [(1, 0.5), (2, 1), (3, 1)]:
+        for _ in range(50):
+            assert 0 <= policy.nextDelay(error, attempt, deadline) <= bound
+    assert policy.nextDelay(error, 4, deadline) is None
+
+
+def testJsonErrorRetriesImmediately():
+    policy = RetryPolicy()
+    assert policy.nextDelay(JsonParseError("bad json"), 1, time.monotonic() + 60) == 0
+
+
+def testFatalNotRetried():
+    policy = RetryPolicy()
+    assert policy.nextDelay(statusError(401), 1, time.monotonic() + 60) is None
+
+
+def testNoRetryPastDeadline(monkeypatch):
+    policy = RetryPolicy(baseDelay=10, maxDelay=10)
+    assert policy.nextDelay(JsonParseError("bad json"), 1, time.monotonic() - 0.01) is None
+    #等待结束时已超过截止时间则不再重试
+    monkeypatch.setattr(retryPolicy.random, "uniform", lambda low, high: high)
+    assert policy.nextDelay(statusError(503), 1, time.monotonic() + 5) is None
+    assert policy.nextDelay(statusError(503), 1, time.monotonic() + 15) == 10
+
+
+def testRequestDeadlineCapsBudget():
+    policy = RetryPolicy(totalBudget=120, attemptTimeout=60)
+    setRequestDeadline(0.5)
+    deadline = policy.deadline()
+    assert deadline - time.monotonic() <= 0.5
+    assert policy.attemptTimeoutFor(deadline) <= 0.5
+
+
+def testAttemptTimeoutRaisesWhenExhausted():
+    policy = RetryPolicy()
+    with pytest.raises(LLMDeadlineExceeded):
+        policy.attemptTimeoutFor(time.monotonic() - 1)
@@ -0,0 +1,64 @@
+import pytest
+import Common.sensitiveWordStore as sensitiveWordStore
+from Common.sensitiveWordStore import SensitiveWordStore
+from Common.utils import ACAutomaton, ArrayACAutomaton
+
+
+class FakeTable:
+    """代替敏感词表：words为表内容，signature为表指纹，loads记录读表次数"""
+    def __init__(self,words):
+        self.words = list(words)
+        self.signature = (len(self.words), len(self.words), 1)
+        self.loads = 0
+
+    def update(self,words):
+        self.words = list(words)
+        self.signature = (len(self.words), self.signature[1] + 1, self.signature[2] + 1)
+
+    def load(self):
+        self.loads += 1
+        return list(self.words)
+
+
+@pytest.fixture
+def fakeTable(monkeypatch):
+    table = FakeTable(["坏人"])
+    monkeypatch.setattr(sensitiveWordStore, "getTableSignature", lambda dbAlias, tableName: table.signature)
+    monkeypatch.setattr(sensitiveWordStore, "loadSensitiveWords", table.load)
+    return table
+
+
+def testReloadOnlyWhenTableChanges(fakeTable):
+    store = SensitiveWordStore(reloadInterval=0)
+    automaton = store.get()
+    assert automaton.match("你是坏人") == ["坏人"]
+    assert store.reload() is False and store.get() is automaton
+    assert fakeTable.loads == 1
+    fakeTable.update(["坏人", "骗子"])
+    assert store.reload() is True
+    assert sorted(store.get().match("坏人骗子")) == ["坏人", "骗子"]
+    assert store.reload(force=True) is True and fakeTable.loads == 3
+
+
+def testStreamMatcherKeepsItsAutomaton(fakeTable):
+    store = SensitiveWordStore(reloadInterval=0)
+    matcher = store.streamMatcher()
+    assert matcher.feed("大坏") == []
+    fakeTable.update(["骗子"])
+    store.reload()
+    #热加载前开始的匹配继续使用旧自动机
+    assert matcher.feed("人") == [(1, 3, "坏人")]
+    assert store.streamMatcher().feed("坏人骗子") == [(2, 4, "骗子")]
+
+
+def testEngineSelection(fakeTable):
+    assert isinstance(SensitiveWordStore(reloadInterval=0).get(), ArrayACAutomaton)
+    assert isinstance(SensitiveWordStore(reloadInterval=0, engine="node").get(), ACAutomaton)
+
+
+def testInitialLoadFailure(monkeypatch):
+    def failSignature(dbAlias, tableName):
+        raise RuntimeError("no such table")
+    monkeypatch.setattr(sensitiveWordStore, "getTableSignature", failSignature)
+    store = SensitiveWordStore(reloadInterval=0)
+    assert store.get() is None and store.streamMatcher() is None
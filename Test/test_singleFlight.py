@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+import pytest
+from Common.LLMCommon.retryPolicy import LLMDeadlineExceeded
+from Common.LLMCommon.singleFlight import SingleFlight
+
+
+def runFollower(singleFlight:SingleFlight,key:str,fn,results:list,timeout = None) -> threading.Thread:
+    def follow():
+        try:
+            results.append(singleFlight.do(key, fn, timeout=timeout))
+        except Exception as e:
+            results.append(e)
+    thread = threading.Thread(target=follow)
+    thread.start()
+    return thread
+
+
+def testConcurrentCallsCoalesced():
+    singleFlight = SingleFlight()
+    started = threading.Event()
+    calls = []
+
+    def slowCall():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return {"answer": [1]}
+
+    results = []
+    leader = runFollower(singleFlight, "key", slowCall, results)
+    started.wait()
+    followers = [runFollower(singleFlight, "key", slowCall, results) for _ in range(3)]
+    for thread in [leader] + followers:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [{"answer": [1]}] * 4
+    #跟随者拿到的是深拷贝
+    assert len({id(result) for result in results}) == 4
+    assert singleFlight.stats() == {"leader": 1, "shared": 3, "inFlight": 0}
+
+
+def testLeaderErrorShared():
+    singleFlight = SingleFlight()
+    started = threading.Event()
+
+    def failingCall():
+        started.set()
+        time.sleep(0.1)
+        raise ValueError("bad response")
+
+    results = []
+    leader = runFollower(singleFlight, "key", failingCall, results)
+    started.wait()
+    follower = runFollower(singleFlight, "key", lambda: "unused", results)
+    leader.join()
+    follower.join()
+    assert [type(result) for result in results] == [ValueError, ValueError]
+
+
+def testLeaderDeadlineNotShared():
+    singleFlight = SingleFlight()
+    started = threading.Event()
+
+    def leaderCall():
+        started.set()
+        time.sleep(0.1)
+        raise LLMDeadlineExceeded("leader deadline")
+
+    results = []
+    leader = runFollower(singleFlight, "key", leaderCall, results)
+    started.wait()
+    follower = runFollower(singleFlight, "key", lambda: "follower answer", results, timeout=5)
+    leader.join()
+    follower.join()
+    assert isinstance(results[0], LLMDeadlineExceeded)
+    #跟随者在自己的deadline内重新执行
+    assert results[1] == "follower answer"
+    assert singleFlight.stats()["inFlight"] == 0
+
+
+def testFollowerWaitTimeout():
+    singleFlight = SingleFlight()
+    started = threading.Event()
+
+    def slowCall():
+        started.set()
+        time.sleep(0.2)
+        return "late"
+
+    results = []
+    leader = runFollower(singleFlight, "key", slowCall, results)
+    started.wait()
+    with pytest.raises(LLMDeadlineExceeded):
+        singleFlight.do("key", slowCall, timeout=0.05)
+    leader.join()
+
+
+def testAsyncLeaderCancelledFollowerRetries():
+    singleFlight = SingleFlight()
+
+    async def leaderCall():
+        await asyncio.sleep(10)
+
+    async def followerCall():
+        return "follower answer"
+
+    async def main():
+        leader = asyncio.create_task(singleFlight.ado("key", leaderCall))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(singleFlight.ado("key", followerCall, timeout=5))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await follower == "follower answer"
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    asyncio.run(main())
+
+
+def testAsyncLeaderDeadlineNotShared():
+    singleFlight = SingleFlight()
+
+    async def leaderCall():
+        await asyncio.sleep(0.05)
+        raise LLMDeadlineExceeded("leader deadline")
+
+    async def followerCall():
+        return "follower answer"
+
+    async def main():
+        leader = asyncio.create_task(singleFlight.ado("key", leaderCall))
+        await asyncio.sleep(0.01)
+        results = await asyncio.gather(leader, singleFlight.ado("key", followerCall, timeout=5), return_exceptions=True)
+        assert isinstance(results[0], LLMDeadlineExceeded)
+        assert results[1] == "follower answer"
+
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+from Common.LLMCommon.streamingJson import IncrementalJsonParser
+from Common.llmApiFactory import ModelFactory
+
+
+class FakeToken:
+    def __init__(self,content):
+        self.content = content
+
+
+class FakeStreamModel:
+    """按字符逐个返回输出，记录读取了多少个token"""
+    temperature = None
+    top_p = None
+    max_tokens = None
+
+    def __init__(self,output):
+        self.output = output
+        self.streamed = 0
+        self.calls = 0
+
+    def stream(self,query,timeout = None):
+        self.calls += 1
+        for char in self.output:
+            self.streamed += 1
+            yield FakeToken(char)
+
+
+class FakeCache:
+    enable = True
+
+    def __init__(self):
+        self.memory = {}
+
+    def get(self,key):
+        return self.memory.get(key)
+
+    def set(self,key,purpose,value):
+        self.memory[key] = value
+
+
+def fakeModelFactory(monkeypatch,output):
+    monkeypatch.setenv("API_KEY_EXTERNAL", "sk-test")
+    factory = ModelFactory()
+    streamModel = FakeStreamModel(output)
+    cache = FakeCache()
+    factory._ModelFactory__getModel = lambda endpoint, stream = False: streamModel
+    factory._ModelFactory__cache = cache
+    return factory, streamModel, cache
+
+
+def testFieldsCompleteBeforeObjectEnds():
+    parser = IncrementalJsonParser()
+    assert parser.feed('```json\n{"isEnd": fal') == []
+    assert parser.feed('se, "thoughtAns": "查询优') == [("isEnd", False)]
+    assert parser.feed('惠券", "action"') == [("thoughtAns", "查询优惠券")]
+    assert parser.feed(': {"tool": [1, 2]}}') == [("action", {"tool": [1, 2]})]
+    assert parser.done and not parser.failed
+
+
+def testPythonLiteralRepaired():
+    parser = IncrementalJsonParser()
+    assert parser.feed('{"isEnd": True}') == [("isEnd", True)]
+    assert parser.done
+
+
+def testEarlyStopNotCached(monkeypatch):
+    output = '{"isEnd": true, "thoughtAns": "' + "很长的思考" * 20 + '"}'
+    factory, streamModel, cache = fakeModelFactory(monkeypatch, output)
+    stop = lambda key, value: key == "isEnd" and value is True
+    assert factory.invokeJsonStream("query", onField=stop, cacheTag="thinking") == {"isEnd": True}
+    #读到isEnd就停止，后续输出不再读取
+    assert streamModel.streamed < len(output)
+    assert cache.memory == {}
+    assert factory.invokeJsonStream("query", onField=stop, cacheTag="thinking") == {"isEnd": True}
+    assert streamModel.calls == 2
+
+
+def testCompleteStreamCached(monkeypatch):
+    factory, streamModel, cache = fakeModelFactory(monkeypatch, '{"isEnd": false, "action": "查询"}')
+    stop = lambda key, value: key == "isEnd" and value is True
+    expected = {"isEnd": False, "action": "查询"}
+    assert factory.invokeJsonStream("query", onField=stop, cacheTag="thinking") == expected
+    assert list(cache.memory.values()) == [expected]
+    assert factory.invokeJsonStream("query", onField=stop, cacheTag="thinking") == expected
+    assert streamModel.calls == 1
@@ -0,0 +1,48 @@
+import time
+from Common.ToolFunction.toolHttpClient import ToolResultCache
+
+
+def testTtlExpires():
+    cache = ToolResultCache({"findNoUsePage": 0.05})
+    key = ToolResultCache.buildKey("findNoUsePage", "/coupon/noUse", {"userId": 1})
+    cache.set(key, "findNoUsePage", {"coupons": [1]})
+    assert cache.get(key) == {"coupons": [1]}
+    time.sleep(0.06)
+    assert cache.get(key) is None
+    stats = cache.stats()
+    assert (stats["hit"], stats["miss"], stats["write"], stats["size"]) == (1, 1, 1, 0)
+
+
+def testZeroTtlNotCached():
+    cache = ToolResultCache({"default": 0, "findNoUsePage": 60})
+    key = ToolResultCache.buildKey("findOrder", "/order", {"userId": 1})
+    cache.set(key, "findOrder", {"orders": []})
+    assert cache.get(key) is None
+    assert cache.stats()["write"] == 0
+
+
+def testKeyIncludesParams():
+    cache = ToolResultCache({"default": 60})
+    key = ToolResultCache.buildKey("findNoUsePage", "/coupon/noUse", {"userId": 1, "page": 1})
+    cache.set(key, "findNoUsePage", {"coupons": [1]})
+    assert cache.get(ToolResultCache.buildKey("findNoUsePage", "/coupon/noUse", {"page": 1, "userId": 1})) == {"coupons": [1]}
+    assert cache.get(ToolResultCache.buildKey("findNoUsePage", "/coupon/noUse", {"userId": 2, "page": 1})) is None
+
+
+def testReturnsCopy():
+    cache = ToolResultCache({"default": 60})
+    key = ToolResultCache.buildKey("findNoUsePage", "/coupon/noUse", None)
+    cache.set(key, "findNoUsePage", {"coupons": [1]})
+    cache.get(key)["coupons"].append(2)
+    assert cache.get(key) == {"coupons": [1]}
+
+
+def testEvictsLeastRecentlyUsed():
+    cache = ToolResultCache({"default": 60}, maxSize=2)
+    keys = [ToolResultCache.buildKey("tool", "/path", {"id": index}) for index in range(3)]
+    cache.set(keys[0], "tool", 0)
+    cache.set(keys[1], "tool", 1)
+    cache.get(keys[0])
+    cache.set(keys[2], "tool", 2)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == 0 and cache.get(keys[2]) == 2
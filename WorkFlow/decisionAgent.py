@@ -1,15 +1,17 @@
-import ast
+import asyncio
+import threading
 from datetime import datetime
-from typing import TypedDict, List, Any
+from typing import TypedDict, List, Any, Dict, Tuple
 from langgraph.graph import StateGraph,END
-from Common.ToolFunction import toolTest
 from langchain_core.messages import HumanMessage, AIMessage
-from sqlalchemy import MetaData,Table,select
+from langchain_core.runnables import RunnableLambda
 from Common.DBCommon.sqlLiteCom import getDbSession
-from Common.ToolFunction.toolRegistery import callAgentTool
+from Common.ToolFunction.toolCatalogue import getToolCatalogue
+from Common.ToolFunction.toolRegistery import callAgentTools, acallAgentTools, loadToolCallConfig, normalizeToolName, \
+    isToolAvailable
 from Common.llmApiFactory import ModelFactory
 from Common.Prompt.decisionAgentPrompt import thinkingPrompt, toolUsingPrompt, paramSelectPrompt, toneAnalysisPrompt, \
-    finishPrompt
+    finishPrompt, finishStreamPrompt
 from Common.utils import initLogger
 from Model.Entity.decisonAgentRes import decisionAgentRes
 from RpcServe import agentService_pb2
@@ -26,9 +28,17 @@ class __conditionalState(TypedDict):
     isFinish: str
     pipelineHistory: List  # 对话历史
     chatHistory: str #前几轮对话的对话历史
+    toolHistory: List # 已调用的工具名称
+    stepTools: List # 本步调用的工具名称，没有调用工具时为空
+    streamAnswer: bool # 最终回答是否由调用方流式生成
+    finishPrompt: str # 流式生成最终回答所用的prompt
 
 model = ModelFactory()
 
+#流式解析到isEnd为True时停止读取
+def __isThinkFinished(key:str,value) -> bool:
+    return key == "isEnd" and value is True
+
 #推理思考过程
 def __thinkStep(state: __conditionalState) -> __conditionalState:
     userQuery = state["userQuery"]
@@ -38,10 +48,11 @@ def __thinkStep(state: __conditionalState) -> __conditionalState:
     action = state["action"]
     chatHistory = state["chatHistory"]
     thinkigPrompt = thinkingPrompt.format(chatHistory = chatHistory, cleanedInput = userQuery, thoughtChain = str(observation))
-    thinkingThoughtDict = model.invokeJson(thinkigPrompt)
+    #isEnd为True时后续字段均为空，不必等输出结束
+    thinkingThoughtDict = model.invokeJsonStream(thinkigPrompt,onField = __isThinkFinished)
     isFinish = thinkingThoughtDict["isEnd"]
-    thought.append(thinkingThoughtDict["thoughtAns"])
-    action.append(thinkingThoughtDict["action"])
+    thought.append(thinkingThoughtDict.get("thoughtAns", ""))
+    action.append(thinkingThoughtDict.get("action", ""))
     pipelineHistory.append(HumanMessage(thinkigPrompt))
     pipelineHistory.append(AIMessage(str(thinkingThoughtDict)))
     return {
@@ -51,9 +62,82 @@ def __thinkStep(state: __conditionalState) -> __conditionalState:
         "pipelineHistory": pipelineHistory
     }
 
-#工具调用
-def __toolUsing(state: __conditionalState) -> __conditionalState:
+#推理思考过程(异步)
+async def __athinkStep(state: __conditionalState) -> __conditionalState:
+    userQuery = state["userQuery"]
+    observation = state["observation"]
+    pipelineHistory = state["pipelineHistory"]
+    thought = state["thought"]
+    action = state["action"]
+    chatHistory = state["chatHistory"]
+    thinkigPrompt = thinkingPrompt.format(chatHistory = chatHistory, cleanedInput = userQuery, thoughtChain = str(observation))
+    thinkingThoughtDict = await model.ainvokeJsonStream(thinkigPrompt,onField = __isThinkFinished)
+    isFinish = thinkingThoughtDict["isEnd"]
+    thought.append(thinkingThoughtDict.get("thoughtAns", ""))
+    action.append(thinkingThoughtDict.get("action", ""))
+    pipelineHistory.append(HumanMessage(thinkigPrompt))
+    pipelineHistory.append(AIMessage(str(thinkingThoughtDict)))
+    return {
+        "thought": thought,
+        "action": action,
+        "isFinish": isFinish,
+        "pipelineHistory": pipelineHistory
+    }
+
+#每一步最多调用的工具数
+MAX_TOOLS_PER_STEP = loadToolCallConfig().get("max_tools_per_step", 4)
+
+#解析工具选择的结果，兼容只返回toolName的单工具格式，去掉重复以及不在本次提供给大模型的工具列表中的工具
+def __parseToolCalls(toolUsingDict,toolListFiltered:List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     logger = initLogger(__name__)
+    offeredTools = {normalizeToolName(toolDict["toolName"]): toolDict for toolDict in toolListFiltered}
+    toolCalls = toolUsingDict.get("toolCalls")
+    if not isinstance(toolCalls, list):
+        toolCalls = [toolUsingDict] if toolUsingDict.get("toolName") else []
+    selectedCalls = []
+    for toolCall in toolCalls:
+        if not isinstance(toolCall, dict):
+            continue
+        toolDict = offeredTools.get(normalizeToolName(toolCall.get("toolName", "")))
+        if toolDict is None:
+            logger.warning(f"Tool {toolCall.get('toolName')} is not in the tool list, skipped.")
+            continue
+        if any(selectedCall["tool"] is toolDict for selectedCall in selectedCalls):
+            continue
+        selectedCalls.append({"tool": toolDict, "reason": toolCall.get("reason", "")})
+    if len(selectedCalls) > MAX_TOOLS_PER_STEP:
+        logger.warning(f"{len(selectedCalls)} tools selected, only the first {MAX_TOOLS_PER_STEP} are called in this step.")
+    return selectedCalls[:MAX_TOOLS_PER_STEP]
+
+#一次提取本步所有工具的参数
+def __paramSelectPrompt(toolCalls:List[Dict[str, Any]],userInfo) -> str:
+    tools = [{"toolName": toolCall["tool"]["toolName"], "toolCapability": toolCall["tool"]["toolCapability"],
+              "inputPara": toolCall["tool"]["inputPara"]} for toolCall in toolCalls]
+    return paramSelectPrompt.format(tools = str(tools), userInfo = str(userInfo))
+
+#按工具名取出各工具的参数，返回(工具名,参数)列表
+def __parseParams(paramSelectDict,toolCalls:List[Dict[str, Any]]) -> List[Tuple[str, Dict[str, Any]]]:
+    paraLists = paramSelectDict.get("paraLists")
+    if not isinstance(paraLists, dict):
+        paraLists = {toolCalls[0]["tool"]["toolName"]: paramSelectDict.get("paraList")} if len(toolCalls) == 1 else {}
+    paraLists = {normalizeToolName(toolName): paraList for toolName, paraList in paraLists.items()}
+    callList = []
+    for toolCall in toolCalls:
+        toolName = toolCall["tool"]["toolName"]
+        paraList = paraLists.get(normalizeToolName(toolName))
+        callList.append((toolName, paraList if isinstance(paraList, dict) else {}))
+    return callList
+
+#合并本步所有工具的调用结果，作为下一轮思考的依据
+def __toolObservation(thought:str,action:str,toolCalls:List[Dict[str, Any]],callingAnsList:List[str]) -> str:
+    if not toolCalls:
+        return f"推理思考的结果:{thought}。行动规划的结果:{action}。工具调用结果:没有可以调用的工具。"
+    toolResults = "；".join(f"调用了工具{toolCall['tool']['toolName']}。选择该工具的理由:{toolCall['reason']}。工具调用的结果:{callingAns}"
+                           for toolCall, callingAns in zip(toolCalls, callingAnsList))
+    return f"推理思考的结果:{thought}。行动规划的结果:{action}。工具调用结果:{toolResults}"
+
+#工具调用，一步中互相独立的多个工具一次提取参数后并行执行
+def __toolUsing(state: __conditionalState) -> __conditionalState:
     userQuery = state["userQuery"]
     thought = state["thought"]
     action = state["action"]
@@ -61,53 +145,84 @@ def __toolUsing(state: __conditionalState) -> __conditionalState:
     observation = state["observation"]
     userInfo = state["userInfo"]
     pipelineHistory = state["pipelineHistory"]
-    toolListFiltered = []
-    #加载工具调用表
-    try:
-        sqliteSession = next(getDbSession("toolRegister_db"))
-        engine = sqliteSession.bind
-        metadata = MetaData()
-        target_table = Table(
-            "toolUsingTable",  # 表名
-            metadata,
-            autoload_with=engine  # 自动从引擎加载表结构
-        )
-        query = select(target_table)
-        result = sqliteSession.execute(query)
-        toolList = result.mappings().all() #返回字典list，列名:数值
-        if len(toolList) == 0:
-            raise ValueError("Don't find any tools in the table")
-        for dict in toolList:
-            intentList = ast.literal_eval(dict["intentList"])
-            if intent in intentList:
-                toolListFiltered.append(dict)
-    except Exception as e:
-        logger.error(f"Tool List search failed! \n {e}")
+    toolCatalogue = getToolCatalogue()
+    #熔断中的工具不提供给大模型，避免反复选择不可用的工具
+    toolListFiltered = [toolDict for toolDict in toolCatalogue.toolsForIntent(intent) if isToolAvailable(toolDict["toolName"])]
     #工具选择
     toolUsing = toolUsingPrompt.format(tools = str(toolListFiltered),cleanedInput = str(userQuery),
                                              thinkingAns = str(thought[-1]),action = str(action[-1]))
     toolUsingDict = model.invokeJson(toolUsing)
     pipelineHistory.append(HumanMessage(toolUsing))
     pipelineHistory.append(AIMessage(str(toolUsingDict)))
-    #工具参数的选择
-    paraList = None
-    toolCapability = ""
-    for toolDict in toolListFiltered:
-        if toolDict["toolName"] == toolUsingDict["toolName"]:
-            paraList = toolDict["inputPara"]
-            toolCapability = toolDict["toolCapability"]
-    paramSelect = paramSelectPrompt.format(tool = str(toolCapability),paraNameList = str(paraList), userInfo = str(userInfo))
-    paramSelectDict = model.invokeJson(paramSelect)
-    pipelineHistory.append(HumanMessage(paramSelect))
-    pipelineHistory.append(AIMessage(str(paramSelectDict)))
-    #工具调用
-    callingAns = callAgentTool(toolUsingDict["toolName"],**paramSelectDict["paraList"])
-    observation.append(f"推理思考的结果:{thought[-1]}。行动规划的结果:{action[-1]}。工具调用结果:调用了工具{toolUsingDict['toolName']}。选择该工具的理由:{toolUsingDict['reason']}。工具调用的结果:{callingAns}")
+    toolCalls = __parseToolCalls(toolUsingDict, toolListFiltered)
+    callingAnsList = []
+    if toolCalls:
+        #工具参数的选择
+        paramSelect = __paramSelectPrompt(toolCalls, userInfo)
+        paramSelectDict = model.invokeJson(paramSelect)
+        pipelineHistory.append(HumanMessage(paramSelect))
+        pipelineHistory.append(AIMessage(str(paramSelectDict)))
+        #工具调用
+        callingAnsList = callAgentTools(__parseParams(paramSelectDict, toolCalls))
+    observation.append(__toolObservation(thought[-1], action[-1], toolCalls, callingAnsList))
+    stepTools = [toolCall["tool"]["toolName"] for toolCall in toolCalls]
+    toolHistory = state["toolHistory"]
+    toolHistory.extend(stepTools)
     return{
         "observation" : observation,
+        "toolHistory" : toolHistory,
+        "stepTools" : stepTools,
         "pipelineHistory" : pipelineHistory
     }
 
+#工具调用(异步)
+async def __atoolUsing(state: __conditionalState) -> __conditionalState:
+    userQuery = state["userQuery"]
+    thought = state["thought"]
+    action = state["action"]
+    intent = state["intent"]
+    observation = state["observation"]
+    userInfo = state["userInfo"]
+    pipelineHistory = state["pipelineHistory"]
+    toolCatalogue = getToolCatalogue()
+    #熔断中的工具不提供给大模型，避免反复选择不可用的工具
+    toolListFiltered = [toolDict for toolDict in toolCatalogue.toolsForIntent(intent) if isToolAvailable(toolDict["toolName"])]
+    #工具选择
+    toolUsing = toolUsingPrompt.format(tools = str(toolListFiltered),cleanedInput = str(userQuery),
+                                             thinkingAns = str(thought[-1]),action = str(action[-1]))
+    toolUsingDict = await model.ainvokeJson(toolUsing)
+    pipelineHistory.append(HumanMessage(toolUsing))
+    pipelineHistory.append(AIMessage(str(toolUsingDict)))
+    toolCalls = __parseToolCalls(toolUsingDict, toolListFiltered)
+    callingAnsList = []
+    if toolCalls:
+        #工具参数的选择
+        paramSelect = __paramSelectPrompt(toolCalls, userInfo)
+        paramSelectDict = await model.ainvokeJson(paramSelect)
+        pipelineHistory.append(HumanMessage(paramSelect))
+        pipelineHistory.append(AIMessage(str(paramSelectDict)))
+        #工具调用
+        callingAnsList = await acallAgentTools(__parseParams(paramSelectDict, toolCalls))
+    observation.append(__toolObservation(thought[-1], action[-1], toolCalls, callingAnsList))
+    stepTools = [toolCall["tool"]["toolName"] for toolCall in toolCalls]
+    toolHistory = state["toolHistory"]
+    toolHistory.extend(stepTools)
+    return{
+        "observation" : observation,
+        "toolHistory" : toolHistory,
+        "stepTools" : stepTools,
+        "pipelineHistory" : pipelineHistory
+    }
+
+#流式输出的最终结果prompt，输出为纯文本
+def __streamFinishPrompt(observation:List,toneAnalysisDict,pipelineHistory:List):
+    finish = finishStreamPrompt.format(pipelineAns = str(observation),tone = str(toneAnalysisDict["outputTone"]))
+    pipelineHistory.append(HumanMessage(finish))
+    return{
+        "finishPrompt": finish,
+        "pipelineHistory": pipelineHistory
+    }
+
 #生成最终结果
 def __finishReAct(state: __conditionalState) -> __conditionalState:
     observation = state["observation"]
@@ -116,10 +231,13 @@ def __finishReAct(state: __conditionalState) -> __conditionalState:
     intent = state["intent"]
     #聊天记录语气适配
     toneAnalysis = toneAnalysisPrompt.format(userInput = str(chatHistory))
-    toneAnalysisDict = model.invokeJson(toneAnalysis)
+    toneAnalysisDict = model.invokeJson(toneAnalysis,cacheTag = "toneAnalysis")
     pipelineHistory.append(HumanMessage(toneAnalysis))
     pipelineHistory.append(AIMessage(str(toneAnalysisDict)))
     #用户意图语气适配,没做，写个注释意思意思
+    #流式输出时最终回答交给调用方逐token生成
+    if state["streamAnswer"]:
+        return __streamFinishPrompt(observation,toneAnalysisDict,pipelineHistory)
     #最终的结果
     finish = finishPrompt.format(pipelineAns = str(observation),tone = str(toneAnalysisDict["outputTone"]))
     finishDict = model.invokeJson(finish)
@@ -130,11 +248,35 @@ def __finishReAct(state: __conditionalState) -> __conditionalState:
         "pipelineHistory": pipelineHistory
     }
 
+#生成最终结果(异步)
+async def __afinishReAct(state: __conditionalState) -> __conditionalState:
+    observation = state["observation"]
+    pipelineHistory = state["pipelineHistory"]
+    chatHistory = state["chatHistory"]
+    #聊天记录语气适配
+    toneAnalysis = toneAnalysisPrompt.format(userInput = str(chatHistory))
+    toneAnalysisDict = await model.ainvokeJson(toneAnalysis,cacheTag = "toneAnalysis")
+    pipelineHistory.append(HumanMessage(toneAnalysis))
+    pipelineHistory.append(AIMessage(str(toneAnalysisDict)))
+    #流式输出时最终回答交给调用方逐token生成
+    if state["streamAnswer"]:
+        return __streamFinishPrompt(observation,toneAnalysisDict,pipelineHistory)
+    #最终的结果
+    finish = finishPrompt.format(pipelineAns = str(observation),tone = str(toneAnalysisDict["outputTone"]))
+    finishDict = await model.ainvokeJson(finish)
+    pipelineHistory.append(HumanMessage(finish))
+    pipelineHistory.append(AIMessage(str(finishDict)))
+    return{
+        "finalAnswer": finishDict["content"],
+        "pipelineHistory": pipelineHistory
+    }
+
 def __buildConditionalAgent():
     graphBuilder = StateGraph(__conditionalState)
-    graphBuilder.add_node("thinkStep",__thinkStep)
-    graphBuilder.add_node("toolUsing",__toolUsing)
-    graphBuilder.add_node("finishReAct",__finishReAct)
+    #同一张图同时支持invoke与ainvoke
+    graphBuilder.add_node("thinkStep",RunnableLambda(__thinkStep, afunc = __athinkStep))
+    graphBuilder.add_node("toolUsing",RunnableLambda(__toolUsing, afunc = __atoolUsing))
+    graphBuilder.add_node("finishReAct",RunnableLambda(__finishReAct, afunc = __afinishReAct))
     def isReasoningEnd(state: __conditionalState) -> str:
         isFinish = state["isFinish"]
         if isFinish:
@@ -151,13 +293,27 @@ def __buildConditionalAgent():
     conditionalAgent = graphBuilder.compile()
     return conditionalAgent
 
-def decisionAgent(userInfo,userQuery:str,intent:str,dialogHistory:str) -> decisionAgentRes:
-    logger = initLogger(__name__)
+#编译好的图只保存结构，请求状态都在invoke传入的state中，所有请求共享同一个实例
+CONDITIONAL_AGENT = None
+CONDITIONAL_AGENT_LOCK = threading.Lock()
+
+#获取编译好的图，第一次调用时编译
+def __getConditionalAgent():
+    global CONDITIONAL_AGENT
+    if CONDITIONAL_AGENT is None:
+        with CONDITIONAL_AGENT_LOCK:
+            if CONDITIONAL_AGENT is None:
+                CONDITIONAL_AGENT = __buildConditionalAgent()
+    return CONDITIONAL_AGENT
+
+def __initDecisionRes(userInfo,userQuery:str) -> decisionAgentRes:
     decisionRes = decisionAgentRes()
     decisionRes.userId = userInfo["userId"]
     decisionRes.userInput = userQuery
-    agent = __buildConditionalAgent()
-    iniInput = {
+    return decisionRes
+
+def __iniInput(userInfo,userQuery:str,intent:str,dialogHistory:str,streamAnswer:bool = False):
+    return {
         "userQuery": userQuery,
         "userInfo": userInfo,
         "intent": intent,
@@ -168,8 +324,15 @@ def decisionAgent(userInfo,userQuery:str,intent:str,dialogHistory:str) -> decisi
         "isFinish": False,
         "pipelineHistory": [],
         "chatHistory": dialogHistory,
+        "toolHistory": [],
+        "stepTools": [],
+        "streamAnswer": streamAnswer,
+        "finishPrompt": "",
     }
-    result = agent.invoke(iniInput)
+
+#保存决策结果
+def __saveDecisionRes(decisionRes:decisionAgentRes,result) -> decisionAgentRes:
+    logger = initLogger(__name__)
     decisionRes.observation = str(result['observation'])
     decisionRes.finalAnswer = result['finalAnswer']
     decisionRes.chatHistory = str(result['pipelineHistory'])
@@ -183,3 +346,58 @@ def decisionAgent(userInfo,userQuery:str,intent:str,dialogHistory:str) -> decisi
     logger.info(
         f"Agent Complete Decisions. Id:{decisionRes.id},Time:{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     return decisionRes
+
+def decisionAgent(userInfo,userQuery:str,intent:str,dialogHistory:str) -> decisionAgentRes:
+    decisionRes = __initDecisionRes(userInfo,userQuery)
+    agent = __getConditionalAgent()
+    result = agent.invoke(__iniInput(userInfo,userQuery,intent,dialogHistory))
+    return __saveDecisionRes(decisionRes,result)
+
+#异步版本，LLM调用不占用线程，数据库写入放到线程池执行
+async def adecisionAgent(userInfo,userQuery:str,intent:str,dialogHistory:str) -> decisionAgentRes:
+    decisionRes = __initDecisionRes(userInfo,userQuery)
+    agent = __getConditionalAgent()
+    result = await agent.ainvoke(__iniInput(userInfo,userQuery,intent,dialogHistory))
+    return await asyncio.to_thread(__saveDecisionRes,decisionRes,result)
+
+#流式决策，依次产出("toolCalled",工具名)与("answerToken",回答token)，每个调用的工具产出一次toolCalled
+def decisionAgentStream(userInfo,userQuery:str,intent:str,dialogHistory:str):
+    decisionRes = __initDecisionRes(userInfo,userQuery)
+    agent = __getConditionalAgent()
+    result = None
+    for mode,chunk in agent.stream(__iniInput(userInfo,userQuery,intent,dialogHistory,True),stream_mode=["updates","values"]):
+        if mode == "values":
+            result = chunk
+        elif "toolUsing" in chunk:
+            #一步可能调用多个工具，也可能一个都没有调用
+            for toolName in chunk["toolUsing"]["stepTools"]:
+                yield "toolCalled", toolName
+    answerTokens = []
+    for token in model.invoke(result["finishPrompt"],stream=True):
+        if token.content:
+            answerTokens.append(token.content)
+            yield "answerToken", token.content
+    result["finalAnswer"] = "".join(answerTokens)
+    result["pipelineHistory"].append(AIMessage(result["finalAnswer"]))
+    __saveDecisionRes(decisionRes,result)
+
+#流式决策(异步)
+async def adecisionAgentStream(userInfo,userQuery:str,intent:str,dialogHistory:str):
+    decisionRes = __initDecisionRes(userInfo,userQuery)
+    agent = __getConditionalAgent()
+    result = None
+    async for mode,chunk in agent.astream(__iniInput(userInfo,userQuery,intent,dialogHistory,True),stream_mode=["updates","values"]):
+        if mode == "values":
+            result = chunk
+        elif "toolUsing" in chunk:
+            #一步可能调用多个工具，也可能一个都没有调用
+            for toolName in chunk["toolUsing"]["stepTools"]:
+                yield "toolCalled", toolName
+    answerTokens = []
+    async for token in await model.ainvoke(result["finishPrompt"],stream=True):
+        if token.content:
+            answerTokens.append(token.content)
+            yield "answerToken", token.content
+    result["finalAnswer"] = "".join(answerTokens)
+    result["pipelineHistory"].append(AIMessage(result["finalAnswer"]))
+    await asyncio.to_thread(__saveDecisionRes,decisionRes,result)
@@ -1,14 +1,17 @@
+import asyncio
+import threading
 from datetime import datetime
 from typing import TypedDict, List
 from langgraph.graph import END
 from langchain_core.messages import SystemMessage, AIMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph
-from sqlalchemy import MetaData,Table,select
 
 from Common.DBCommon.sqlLiteCom import getDbSession
 from Common.Prompt.inputDetectionPrompt import semanticsDetectionPrompt
 from Common.llmApiFactory import ModelFactory
-from Common.utils import ACAutomaton, initLogger
+from Common.sensitiveWordStore import getSensitiveWordStore
+from Common.utils import initLogger
 from Model.Entity.inputDetectionRes import inputDetectionRes
 
 
@@ -19,37 +22,21 @@ class __conditionalState(TypedDict):
     pipelineHistory: List #对话历史
 
 model = ModelFactory()
+#语义检测提前结束、没有输出reason时使用的拒绝原因
+DEFAULT_REJECT_REASON = "输入内容未通过语义检测"
 
 #AC自动机敏感词检测
 def __sensitiveWordDetection(state: __conditionalState) -> __conditionalState:
     logger = initLogger(__name__)
     userQuery = state["userQuery"]
     pipelineHistory = state["pipelineHistory"]
-    #查违禁词
-    sensitiveWords = []
     isDetectionPass = True
     reason = ""
-    try:
-        sqliteSession = next(getDbSession("sensitiveWord_db"))
-        engine = sqliteSession.bind
-        metadata = MetaData()
-        target_table = Table(
-            "sensitiveWords",  # 表名
-            metadata,
-            autoload_with=engine  # 自动从引擎加载表结构
-        )
-        query = select(target_table.c.word)
-        result = sqliteSession.execute(query)
-        wordList = result.scalars().all()
-        sensitiveWords = [str(word) if word is not None else "" for word in wordList]
-    except Exception as e:
-        logger.error(f"Search sensitive words Failed! \n {e}")
-    #初始化自动机
-    acAutomaton = ACAutomaton()
-    for word in sensitiveWords:
-        acAutomaton.add_sensitive_word(word)
-    acAutomaton.build_fail_pointer()
-    matched = acAutomaton.match(userQuery)
+    #自动机在进程启动时构建，敏感词表变化后由后台线程重建替换
+    acAutomaton = getSensitiveWordStore().get()
+    if acAutomaton is None:
+        logger.error("Sensitive word automaton not loaded!")
+    matched = acAutomaton.match(userQuery) if acAutomaton is not None else []
     if len(matched) != 0:
         failedSentence = f"用户输入敏感度检测不通过。原因：包含违禁词{str(matched)}。"
         pipelineHistory.append(SystemMessage(failedSentence))
@@ -63,13 +50,31 @@ def __sensitiveWordDetection(state: __conditionalState) -> __conditionalState:
         "pipelineHistory" :pipelineHistory
     }
 
+#流式解析到detectionAns为False时停止读取
+def __isDetectionRejected(key:str,value) -> bool:
+    return key == "detectionAns" and value is False
+
 #LLM语义检测
 def __semanticsDetection(state: __conditionalState) -> __conditionalState:
     userQuery = state["userQuery"]
     pipelineHistory = state["pipelineHistory"]
-    detectionDict = model.invokeJson(semanticsDetectionPrompt.format(userInput = userQuery))
+    #detectionAns为False时立即拒绝，不等待reason输出
+    detectionDict = model.invokeJsonStream(semanticsDetectionPrompt.format(userInput = userQuery),onField = __isDetectionRejected,cacheTag = "semanticsDetection")
+    isDetectionPass = detectionDict["detectionAns"]
+    reason = detectionDict.get("reason", DEFAULT_REJECT_REASON)
+    pipelineHistory.append(SystemMessage(semanticsDetectionPrompt.format(userInput = userQuery)))
+    pipelineHistory.append(AIMessage(str(detectionDict)))
+    return {"isDetectionPass": isDetectionPass,
+        "reason": reason,
+        "pipelineHistory" :pipelineHistory}
+
+#LLM语义检测(异步)
+async def __asemanticsDetection(state: __conditionalState) -> __conditionalState:
+    userQuery = state["userQuery"]
+    pipelineHistory = state["pipelineHistory"]
+    detectionDict = await model.ainvokeJsonStream(semanticsDetectionPrompt.format(userInput = userQuery),onField = __isDetectionRejected,cacheTag = "semanticsDetection")
     isDetectionPass = detectionDict["detectionAns"]
-    reason = detectionDict["reason"]
+    reason = detectionDict.get("reason", DEFAULT_REJECT_REASON)
     pipelineHistory.append(SystemMessage(semanticsDetectionPrompt.format(userInput = userQuery)))
     pipelineHistory.append(AIMessage(str(detectionDict)))
     return {"isDetectionPass": isDetectionPass,
@@ -78,8 +83,9 @@ def __semanticsDetection(state: __conditionalState) -> __conditionalState:
 
 def __buildConditionalAgent():
     graphBuilder = StateGraph(__conditionalState)
+    #同一张图同时支持invoke与ainvoke，未提供异步实现的节点在ainvoke时由线程池执行
     graphBuilder.add_node("sensitiveWordDetection",__sensitiveWordDetection)
-    graphBuilder.add_node("semanticsDetection", __semanticsDetection)
+    graphBuilder.add_node("semanticsDetection", RunnableLambda(__semanticsDetection, afunc = __asemanticsDetection))
     def isPassed(state: __conditionalState) -> str:
         isDetectionPass = state["isDetectionPass"]
         if isDetectionPass:
@@ -95,19 +101,36 @@ def __buildConditionalAgent():
     conditionalAgent = graphBuilder.compile()
     return conditionalAgent
 
-def inputDetection(userId:int,input:str) -> inputDetectionRes:
-    logger = initLogger(__name__)
+#编译好的图只保存结构，请求状态都在invoke传入的state中，所有请求共享同一个实例
+CONDITIONAL_AGENT = None
+CONDITIONAL_AGENT_LOCK = threading.Lock()
+
+#获取编译好的图，第一次调用时编译
+def __getConditionalAgent():
+    global CONDITIONAL_AGENT
+    if CONDITIONAL_AGENT is None:
+        with CONDITIONAL_AGENT_LOCK:
+            if CONDITIONAL_AGENT is None:
+                CONDITIONAL_AGENT = __buildConditionalAgent()
+    return CONDITIONAL_AGENT
+
+def __initDetectionRes(userId:int,input:str) -> inputDetectionRes:
     detectionRes = inputDetectionRes()
     detectionRes.userId = str(userId)
     detectionRes.userInput = input
-    agent = __buildConditionalAgent()
-    iniInput = {
+    return detectionRes
+
+def __iniInput(input:str):
+    return {
         "userQuery": input,
         "isDetectionPass": True,
         "reason": "",
         "pipelineHistory": []
     }
-    result = agent.invoke(iniInput)
+
+#保存检测结果
+def __saveDetectionRes(detectionRes:inputDetectionRes,result) -> inputDetectionRes:
+    logger = initLogger(__name__)
     detectionRes.reason = result["reason"]
     detectionRes.chatHistory = str(result["pipelineHistory"])
     detectionRes.isPassed = result["isDetectionPass"]
@@ -119,4 +142,17 @@ def inputDetection(userId:int,input:str) -> inputDetectionRes:
     except Exception as e:
         logger.error(f"DataBase Save Failed! \n {e}")
     logger.info(f"Intent Recognition Complete. Id:{detectionRes.id},Time:{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    return detectionRes
\ No newline at end of file
+    return detectionRes
+
+def inputDetection(userId:int,input:str) -> inputDetectionRes:
+    detectionRes = __initDetectionRes(userId,input)
+    agent = __getConditionalAgent()
+    result = agent.invoke(__iniInput(input))
+    return __saveDetectionRes(detectionRes,result)
+
+#异步版本，LLM调用不占用线程，数据库写入放到线程池执行
+async def ainputDetection(userId:int,input:str) -> inputDetectionRes:
+    detectionRes = __initDetectionRes(userId,input)
+    agent = __getConditionalAgent()
+    result = await agent.ainvoke(__iniInput(input))
+    return await asyncio.to_thread(__saveDetectionRes,detectionRes,result)
@@ -1,14 +1,18 @@
+import asyncio
+import threading
 from datetime import datetime
-from typing import TypedDict, List, Dict
+from typing import TypedDict, List, Dict, Optional
 from langchain_core.messages import SystemMessage, AIMessage
+from langchain_core.runnables import RunnableLambda
 from Common.DBCommon.sqlLiteCom import getDbSession
 from Common.Prompt.intentRecognitionPrompt import PreCleaningPrompt, featureExtractionPrompt, reQuestionPrompt
 from Common.llmApiFactory import ModelFactory
 from langgraph.graph import StateGraph,END
 from Model.Entity.intentRecognitionRes import intentRecognitionRes
 from Model.Enums.intentEnum import userType, intentCustome, intentDriver
-from Common.utils import initLogger
-from Rag.intentRecognitionRAG import getSimilarIntents
+from Common.statsReporter import registerStats
+from Common.utils import initLogger, getAbsolutePath, loadYmlFile
+from Rag.intentRecognitionRAG import getIntentProportions
 
 """用于做意图识别的Agent"""
 
@@ -19,26 +23,75 @@ class __conditionalState(TypedDict):
     queryQuestion: str #意图检索增强的查询
     intentPropotions: Dict[intentCustome | intentDriver, float] #不同意图的占比
     isItentClearly: bool #用户是否明确自己的意图
+    isFastPath: bool #是否由原始输入直接检索得到结果
     outPut: str #结果输出
     pipelineHistory: List
 
 model = ModelFactory()
-customerDict: Dict[intentCustome, float] = {}
-driverDict: Dict[intentDriver, float] = {}
-
-def __initProportionDict():
-    #初始化占比Dict
-    for custom in intentCustome:
-        customerDict[custom] = 0
-    for driver in intentDriver:
-        driverDict[driver] = 0
+#快速通道：先用原始输入检索，最高意图占比超过threshold时跳过清洗与特征提取
+FAST_PATH_CONFIG = loadYmlFile(getAbsolutePath("../Config/config.yml")).get("intent_recognition", {}).get("fast_path", {})
+#快速通道命中统计
+FAST_PATH_STATS = {"requests": 0, "attempts": 0, "hits": 0}
+FAST_PATH_STATS_LOCK = threading.Lock()
+
+#快速通道命中率：requests为全部请求，attempts为满足长度限制并尝试检索的请求
+def fastPathStats() -> Dict[str, float]:
+    with FAST_PATH_STATS_LOCK:
+        stats = dict(FAST_PATH_STATS)
+    stats["hitRate"] = stats["hits"] / stats["requests"] if stats["requests"] else 0.0
+    return stats
+
+registerStats("intentFastPath", fastPathStats)
+
+#快速通道：原始输入较短时直接检索，意图足够明确则直接输出
+def __fastPathRetrieval(state: __conditionalState) -> __conditionalState:
+    logger = initLogger(__name__)
+    userQuery = state["userQuery"]
+    userType = state["userType"]
+    retrieveSum = 15
+    fastThreshold = FAST_PATH_CONFIG.get("threshold", 0.8)
+    attempted = FAST_PATH_CONFIG.get("enable", False) and len(userQuery) <= FAST_PATH_CONFIG.get("max_query_length", 50)
+    isFastPath = False
+    userDict = {}
+    if attempted:
+        intents = list(intentCustome) if userType == userType.customer else list(intentDriver)
+        proportions = getIntentProportions([userQuery],userType,retrieveSum)
+        if proportions is not None:
+            userDict = dict(zip(intents, proportions[0].tolist()))
+            isFastPath = max(userDict.values()) > fastThreshold
+    with FAST_PATH_STATS_LOCK:
+        FAST_PATH_STATS["requests"] += 1
+        FAST_PATH_STATS["attempts"] += int(attempted)
+        FAST_PATH_STATS["hits"] += int(isFastPath)
+    if not isFastPath:
+        return {"isFastPath": False}
+    logger.info(f"Intent fast path hit. Proportion:{max(userDict.values()):.2f},HitRate:{fastPathStats()['hitRate']:.2%}")
+    return {"isFastPath": True,
+            "cleanedDialog": userQuery,
+            "queryQuestion": userQuery,
+            "intentPropotions": userDict,
+            "isItentClearly": True}
+
 #对话清理
 def __answerPreCleaning(state: __conditionalState) -> __conditionalState:
     userQuery = state["userQuery"]
     pipelineHistory = state["pipelineHistory"]
     if pipelineHistory is None:
         pipelineHistory = []
-    cleanContentDict = model.invokeJson(PreCleaningPrompt.format(inputDialog = userQuery))
+    cleanContentDict = model.invokeJson(PreCleaningPrompt.format(inputDialog = userQuery),cacheTag = "preCleaning")
+    pipelineHistory.append(SystemMessage(PreCleaningPrompt.format(inputDialog = userQuery)))
+    pipelineHistory.append(AIMessage(str(cleanContentDict)))
+    return {"cleanedDialog" : cleanContentDict["cleanDialog"],
+            "userType": state["userType"],
+            "pipelineHistory" : pipelineHistory}
+
+#对话清理(异步)
+async def __aanswerPreCleaning(state: __conditionalState) -> __conditionalState:
+    userQuery = state["userQuery"]
+    pipelineHistory = state["pipelineHistory"]
+    if pipelineHistory is None:
+        pipelineHistory = []
+    cleanContentDict = await model.ainvokeJson(PreCleaningPrompt.format(inputDialog = userQuery),cacheTag = "preCleaning")
     pipelineHistory.append(SystemMessage(PreCleaningPrompt.format(inputDialog = userQuery)))
     pipelineHistory.append(AIMessage(str(cleanContentDict)))
     return {"cleanedDialog" : cleanContentDict["cleanDialog"],
@@ -49,7 +102,18 @@ def __answerPreCleaning(state: __conditionalState) -> __conditionalState:
 def __featureExtraction(state: __conditionalState) -> __conditionalState:
     cleanedDialog = state["cleanedDialog"]
     pipelineHistory = state["pipelineHistory"]
-    queryContentDict = model.invokeJson(featureExtractionPrompt.format(cleanedDialog = cleanedDialog))
+    queryContentDict = model.invokeJson(featureExtractionPrompt.format(cleanedDialog = cleanedDialog),cacheTag = "featureExtraction")
+    pipelineHistory.append(SystemMessage(featureExtractionPrompt.format(cleanedDialog = cleanedDialog)))
+    pipelineHistory.append(AIMessage(str(queryContentDict)))
+    return {"queryQuestion" : queryContentDict["queryContent"],
+            "userType": state["userType"],
+                "pipelineHistory" : pipelineHistory}
+
+#特征提取(异步)
+async def __afeatureExtraction(state: __conditionalState) -> __conditionalState:
+    cleanedDialog = state["cleanedDialog"]
+    pipelineHistory = state["pipelineHistory"]
+    queryContentDict = await model.ainvokeJson(featureExtractionPrompt.format(cleanedDialog = cleanedDialog),cacheTag = "featureExtraction")
     pipelineHistory.append(SystemMessage(featureExtractionPrompt.format(cleanedDialog = cleanedDialog)))
     pipelineHistory.append(AIMessage(str(queryContentDict)))
     return {"queryQuestion" : queryContentDict["queryContent"],
@@ -64,15 +128,15 @@ def __RAGandInentAnalysis(state: __conditionalState) -> __conditionalState:
     #检索最相似的n条语句
     retrieveSum = 15
     propotionThreshold = 0.6
+    #是否按相似度加权投票
+    weightedVote = False
     isItentClearly = False
-    retrieveAns = getSimilarIntents(queryQuestion,userType,retrieveSum)
-    userDict = customerDict.copy() if userType == userType.customer else driverDict.copy()
-    #统计意图占比
-    for item in retrieveAns:
-        userDict[item] += 1
-    for key in userDict.keys():
-        userDict[key] = userDict[key]/retrieveSum
-    maxVal = max(userDict.values())
+    intents = list(intentCustome) if userType == userType.customer else list(intentDriver)
+    #统计意图占比，检索失败时占比全为0，走意图不清晰的分支
+    proportions = getIntentProportions([queryQuestion],userType,retrieveSum,weightedVote)
+    proportions = [0.0] * len(intents) if proportions is None else proportions[0].tolist()
+    userDict = dict(zip(intents, proportions))
+    maxVal = max(proportions)
     if maxVal > propotionThreshold:
         isItentClearly = True
     return {"intentPropotions": userDict,
@@ -95,13 +159,24 @@ def __intentNotClear(state: __conditionalState) -> __conditionalState:
     return {"outPut": reqeustionDict["queryContent"],
             "pipelineHistory" : pipelineHistory}
 
+#意图不清晰(异步)
+async def __aintentNotClear(state: __conditionalState) -> __conditionalState:
+    pipelineHistory = state["pipelineHistory"]
+    reqeustionDict = await model.ainvokeJson(reQuestionPrompt.format(inputDialog = state["cleanedDialog"],intentProportion = state["intentPropotions"]))
+    pipelineHistory.append(SystemMessage(reQuestionPrompt.format(inputDialog = state["cleanedDialog"],intentProportion = state["intentPropotions"])))
+    pipelineHistory.append(AIMessage(str(reqeustionDict)))
+    return {"outPut": reqeustionDict["queryContent"],
+            "pipelineHistory" : pipelineHistory}
+
 def __buildConditionalAgent():
     graphBuilder = StateGraph(__conditionalState)
-    graphBuilder.add_node("answerPreCleaning",__answerPreCleaning)
-    graphBuilder.add_node("featureExtraction",__featureExtraction)
+    graphBuilder.add_node("fastPathRetrieval",__fastPathRetrieval)
+    #同一张图同时支持invoke与ainvoke，未提供异步实现的节点在ainvoke时由线程池执行
+    graphBuilder.add_node("answerPreCleaning",RunnableLambda(__answerPreCleaning, afunc = __aanswerPreCleaning))
+    graphBuilder.add_node("featureExtraction",RunnableLambda(__featureExtraction, afunc = __afeatureExtraction))
     graphBuilder.add_node("RAGandInentAnalysis",__RAGandInentAnalysis)
     graphBuilder.add_node("intentClear", __intentClear)
-    graphBuilder.add_node("intentNotClear", __intentNotClear)
+    graphBuilder.add_node("intentNotClear", RunnableLambda(__intentNotClear, afunc = __aintentNotClear))
 
     def chooseOutputNode(state: __conditionalState) -> str:
         isItentClearly = state["isItentClearly"]
@@ -109,7 +184,16 @@ def __buildConditionalAgent():
             return "intentClear"
         else:
             return "intentNotClear"
-    graphBuilder.set_entry_point("answerPreCleaning")
+    def chooseFastPathNode(state: __conditionalState) -> str:
+        if state["isFastPath"]:
+            return "intentClear"
+        else:
+            return "answerPreCleaning"
+    graphBuilder.set_entry_point("fastPathRetrieval")
+    graphBuilder.add_conditional_edges(
+        source = "fastPathRetrieval",
+        path = chooseFastPathNode
+    )
     graphBuilder.add_edge("answerPreCleaning","featureExtraction")
     graphBuilder.add_edge("featureExtraction","RAGandInentAnalysis")
     graphBuilder.add_conditional_edges(
@@ -121,31 +205,48 @@ def __buildConditionalAgent():
     conditionalAgent = graphBuilder.compile()
     return conditionalAgent
 
-def intentRecognition(user:userType,queryContent:str,userId:str) -> intentRecognitionRes:
-    __initProportionDict()
-    logger = initLogger(__name__)
+#编译好的图只保存结构，请求状态都在invoke传入的state中，所有请求共享同一个实例
+CONDITIONAL_AGENT = None
+CONDITIONAL_AGENT_LOCK = threading.Lock()
+
+#获取编译好的图，第一次调用时编译
+def __getConditionalAgent():
+    global CONDITIONAL_AGENT
+    if CONDITIONAL_AGENT is None:
+        with CONDITIONAL_AGENT_LOCK:
+            if CONDITIONAL_AGENT is None:
+                CONDITIONAL_AGENT = __buildConditionalAgent()
+    return CONDITIONAL_AGENT
+
+def __initIntentRes(queryContent:str,userId:str) -> intentRecognitionRes:
     #意图识别的最终结果
     intentRes = intentRecognitionRes()
     intentRes.userInput = queryContent
     intentRes.userId = userId
-    agent = __buildConditionalAgent()
-    iniInput = {
+    return intentRes
+
+def __iniInput(user:userType,queryContent:str):
+    return {
         "userQuery": queryContent,
         "userType": user,
         "cleanedDialog": "",
         "queryQuestion": "",
         "intentPropotions": {},  # 空字典
         "isItentClearly": True, # 默认用户意图不明确
+        "isFastPath": False,
         "outPut": "",
         "pipelineHistory": []    # 空列表
     }
-    result = agent.invoke(iniInput)
+
+#保存意图识别结果
+def __saveIntentRes(intentRes:intentRecognitionRes,result) -> intentRecognitionRes:
+    logger = initLogger(__name__)
     intentRes.successFinish = True
     if not result["isItentClearly"]:
         intentRes.isItentClearly = False
     else:
         intentRes.isItentClearly = True
-    intentRecognitionRes.userInput = result["cleanedDialog"]
+    #userInput保留用户原始输入(__initIntentRes中设置)，入库与传给decisionAgent的都是原始输入，清洗结果只在流程内使用
     intentRes.outPut = result["outPut"]
     intentRes.chatHistory = str(result["pipelineHistory"])
     #保存并返回
@@ -156,5 +257,25 @@ def intentRecognition(user:userType,queryContent:str,userId:str) -> intentRecogn
         sqliteSession.refresh(intentRes)
     except Exception as e:
         logger.error(f"DataBase Save Failed! \n {e}")
-    logger.info(f"Intent Recognition Complete. Id:{intentRes.id},Time:{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.info(f"Intent Recognition Complete. Id:{intentRes.id},FastPath:{result['isFastPath']},"
+                f"FastPathHitRate:{fastPathStats()['hitRate']:.2%},Time:{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     return intentRes
+
+#cancelEvent被置位时在节点之间停止执行并返回None，用于输入检测不通过时取消投机执行
+def intentRecognition(user:userType,queryContent:str,userId:str,cancelEvent:Optional[threading.Event] = None) -> Optional[intentRecognitionRes]:
+    logger = initLogger(__name__)
+    intentRes = __initIntentRes(queryContent,userId)
+    agent = __getConditionalAgent()
+    result = None
+    for result in agent.stream(__iniInput(user,queryContent),stream_mode="values"):
+        if cancelEvent is not None and cancelEvent.is_set():
+            logger.info(f"Intent Recognition Cancelled. UserId:{userId}")
+            return None
+    return __saveIntentRes(intentRes,result)
+
+#异步版本，LLM调用不占用线程，检索与数据库写入放到线程池执行
+async def aintentRecognition(user:userType,queryContent:str,userId:str) -> intentRecognitionRes:
+    intentRes = __initIntentRes(queryContent,userId)
+    agent = __getConditionalAgent()
+    result = await agent.ainvoke(__iniInput(user,queryContent))
+    return await asyncio.to_thread(__saveIntentRes,intentRes,result)
@@ -1,7 +1,26 @@
+import asyncio
 from Common.DBCommon.sqlLiteCom import initSqlite
-from RpcServe.serve import serve
+from Common.sensitiveWordStore import getSensitiveWordStore
+from Common.statsReporter import startStatsReporter
+from Common.ToolFunction.toolCatalogue import getToolCatalogue
+from Common.utils import getAbsolutePath, loadYmlFile
+from Rag.embeddingEngine import getEmbeddingEngine
+from Rag.intentIndexStore import getIntentIndexStore
+from RpcServe.serve import serve, serveAsync
 
 #程序入口，初始化需要的模块
 if __name__ == '__main__':
     initSqlite()
-    serve()
\ No newline at end of file
+    #启动时加载向量化模型、意图索引与敏感词自动机，避免第一个请求承担加载耗时
+    getEmbeddingEngine()
+    getIntentIndexStore()
+    getSensitiveWordStore()
+    getToolCatalogue()
+    #定期把限流、缓存、熔断等组件的统计写入日志
+    startStatsReporter()
+    config = loadYmlFile(getAbsolutePath("../Config/config.yml"))
+    #默认使用grpc.aio服务，thread模式作为备选
+    if config.get("grpc", {}).get("mode", "aio") == "thread":
+        serve()
+    else:
+        asyncio.run(serveAsync())
\ No newline at end of file